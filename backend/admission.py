@@ -0,0 +1,133 @@
+# admission.py
+# -*- coding: utf-8 -*-
+"""
+Admission control for browser sessions.
+
+Each admitted session holds one LiveConnect session upstream, so a spike of
+browsers turns straight into a burst of `live.connect` calls that run into
+the API's quota together. `AdmissionController` caps the sessions running at
+once at `limit`. Sessions over the cap wait in a FIFO queue of at most
+`max_queue`; beyond that they are turned away at once instead of piling up.
+A waiting session is told its queue position whenever it changes, and gives
+up after `max_wait` seconds. On shutdown `close()` turns away everyone
+still waiting and every later arrival.
+
+The cap is per process; with --workers each worker admits up to `limit`.
+"""
+import asyncio
+import time
+from collections import deque
+
+
+class AdmissionRejected(Exception):
+    """The queue is full, or the wait ran out."""
+
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class _Waiter:
+    __slots__ = ('admitted', 'wake')
+
+    def __init__(self):
+        self.admitted = False
+        self.wake     = asyncio.Event()   # admitted, or moved up the queue
+
+
+class AdmissionController:
+    def __init__(self, limit=0, max_queue=0, max_wait=60.0):
+        self.limit     = limit        # concurrent sessions; 0 = no limit
+        self.max_queue = max_queue
+        self.max_wait  = max_wait
+        self.active    = 0
+        self.closed    = None         # reason, once the server is shutting down
+        self._queue    = deque()
+
+        self.admitted  = 0
+        self.queued    = 0
+        self.rejected  = 0
+        self.timeouts  = 0
+
+    def _has_room(self):
+        return not self.limit or self.active < self.limit
+
+    async def acquire(self, notify=None):
+        """
+        Wait for a slot; returns the seconds spent queued. `notify(position)`
+        is awaited with the 1-based queue position each time it changes.
+        Raises AdmissionRejected when the queue is full or `max_wait` passes.
+        The caller must `release()` once admitted.
+        """
+        if self.closed:
+            self.rejected += 1
+            raise AdmissionRejected(self.closed)
+        if self._has_room() and not self._queue:
+            self.active   += 1
+            self.admitted += 1
+            return 0.0
+        if len(self._queue) >= self.max_queue:
+            self.rejected += 1
+            raise AdmissionRejected('queue full')
+
+        waiter = _Waiter()
+        self._queue.append(waiter)
+        self.queued += 1
+        t0 = time.monotonic()
+        try:
+            async with asyncio.timeout(self.max_wait or None):
+                told = None
+                while not waiter.admitted:
+                    if self.closed:
+                        self.rejected += 1
+                        raise AdmissionRejected(self.closed)
+                    waiter.wake.clear()
+                    position = self._queue.index(waiter) + 1
+                    if notify and position != told:
+                        told = position
+                        await notify(position)
+                    await waiter.wake.wait()
+        except TimeoutError:
+            if not waiter.admitted:
+                self.timeouts += 1
+                raise AdmissionRejected('timed out waiting') from None
+        except BaseException:
+            if waiter.admitted:
+                # admitted just as the client went away: pass the slot on
+                self.release()
+            raise
+        finally:
+            if not waiter.admitted:
+                # gave up or the client went away: let the others move up
+                self._queue.remove(waiter)
+                self._wake_all()
+        return time.monotonic() - t0
+
+    def release(self):
+        """A session admitted by `acquire()` ended."""
+        self.active -= 1
+        while self._queue and self._has_room():
+            waiter = self._queue.popleft()
+            waiter.admitted = True
+            self.active   += 1
+            self.admitted += 1
+            waiter.wake.set()
+        self._wake_all()
+
+    def close(self, reason='shutting down'):
+        """Admit no one else: waiting and later sessions get AdmissionRejected(reason)."""
+        self.closed = reason
+        self._wake_all()
+
+    def _wake_all(self):
+        for waiter in self._queue:
+            waiter.wake.set()
+
+    def stats(self):
+        return {
+            'admission_active':   self.active,
+            'admission_waiting':  len(self._queue),
+            'admission_queued':   self.queued,
+            'admission_rejected': self.rejected,
+            'admission_timeouts': self.timeouts,
+        }
@@ -1,206 +1,1054 @@
 # app.py
 # -*- coding: utf-8 -*-
+import os
 import json
+import time
+import signal
 import asyncio
+import argparse
+import functools
 import traceback
-import wave
 import websockets
-import pyaudio
+from websockets.exceptions import ConnectionClosed
 from google import genai
 from google.genai import types
-from websockets.exceptions import ConnectionClosedError
+from recorder import RecordingWriter, SessionRecording, new_session_id
+from segments import SegmentRecording, pick_codec
+from workers import HAS_REUSEPORT, WorkerSupervisor
+from coalesce import ChunkCoalescer
+from ingest import IngestRing
+from pacer import DownstreamPacer
+from framing import FRAME_VERSION, FrameHeader, pack, tag, unpack
+from audio_codec import PcmCodec, available_codecs, negotiate
+from commands import (Audio, Clock, Codec, CommandDispatcher, CommandError, Frames, Lesson, Ping,
+                      Played, Text, parse_command)
+from resample import Resampler
+from metrics import Registry, serve_metrics
+from vad import VoiceGate
+from latency import ClockSync, FrameTracker
+from session_pool import SessionPool
+from lessons import LessonRegistry
+from transcripts import TranscriptLog
+from opening_cache import OpeningCache, opening_key
+from admission import AdmissionController, AdmissionRejected
+from drain import SessionDrain
+from handoff import inherited_socket, notify_ready, start_successor
+from loopmon import SESSION_ID, LoopMonitor, StageProfiler, format_report
+from liveloop import LiveEngine
 
-# Audio & file constants
-FORMAT    = pyaudio.paInt16
-CHANNELS  = 1
+# Audio & file constants (mono Int16 both ways)
+SAMPWIDTH = 2
 SEND_SR   = 16000
 RECV_SR   = 24000
 
-INPUT_WAV    = '/Users/seung/Desktop/user_input.wav'
-RESPONSE_WAV = '/Users/seung/Desktop/response.wav'
+# Recording, written in batches off the event loop (see recorder.py):
+# 'segments' = one compressed segment per turn plus a seekable index
+# (<session>.seg/.idx, see segments.py), 'wav' = a continuous
+# <session>_user_input.wav / <session>_response.wav pair, or 'off'
+RECORD_MODE       = os.environ.get('RECORD_MODE', 'segments')
+RECORD_DIR        = os.environ.get('RECORD_DIR', 'recordings')
+RECORD_CODEC      = os.environ.get('RECORD_CODEC', 'zlib')     # segments: zlib, flac (needs soundfile) or pcm
+RECORD_SEGMENT_MAX_S = float(os.environ.get('RECORD_SEGMENT_MAX_S', 60))
+RECORD_FLUSH_MS   = float(os.environ.get('RECORD_FLUSH_MS', 500))
+RECORD_FLUSH_KB   = int(os.environ.get('RECORD_FLUSH_KB', 256))
+RECORD_BUFFER_KB  = int(os.environ.get('RECORD_BUFFER_KB', 8192))
 
-# Initialize PyAudio and GenAI client
-audio_engine = pyaudio.PyAudio()
-client       = genai.Client()  # Make sure GOOGLE_API_KEY is set
+# Mic ingest buffer between the websocket reader and Gemini (see ingest.py):
+# INGEST_BUFFER_MS of audio, and when upstream falls behind either 'block' the
+# reader, 'drop-oldest' audio, or keep to the 'live-edge' by also dropping
+# audio older than INGEST_MAX_AGE_MS
+INGEST_BUFFER_MS  = float(os.environ.get('INGEST_BUFFER_MS', 2000))
+INGEST_POLICY     = os.environ.get('INGEST_POLICY', 'live-edge')
+INGEST_MAX_AGE_MS = float(os.environ.get('INGEST_MAX_AGE_MS', 1000))
 
-PROMPT = """You are an approachable, patient English tutor specializing in beginner Korean speakers. Today’s lesson is a simulated airport check-in at John F. Kennedy International Airport (JFK) where you play the role of Delta Air Lines staff helping a passenger check in for their flight. Make sure you speak very slowly for a beginner to understand what you say. Give a one- to two-second pause between sentences.
+# Upstream coalescing: merge queued mic chunks into one send_realtime_input
+# call, holding audio at most COALESCE_MS (0 = off)
+COALESCE_MS       = float(os.environ.get('COALESCE_MS', 0))
+COALESCE_MAX_KB   = int(os.environ.get('COALESCE_MAX_KB', 32))
 
-1. Set the scene
-– Describe the setting: “You’ve arrived at the departure hall of JFK in Queens, New York. You’re standing at the Delta Air Lines check-in counter in Terminal 2.”
+# Downstream pacing: re-frame model PCM into DOWN_FRAME_MS frames sent at most
+# DOWN_LEAD_MS ahead of browser playback (0 = forward chunks as they arrive)
+DOWN_FRAME_MS     = float(os.environ.get('DOWN_FRAME_MS', 0))
+DOWN_LEAD_MS      = float(os.environ.get('DOWN_LEAD_MS', 300))
 
-2. Model key phrases
-– Introduce essential expressions in context:
- - Staff: “Good morning! Welcome to Delta Air Lines. May I see your passport and confirmation code?”
- - Staff: “How many bags will you be checking today?”
- - Staff: “Would you like an aisle seat or a window seat with an ocean view?”
- - Staff: “Here’s your boarding pass. Your gate is C3, and boarding begins at 3:45 PM.”
+# Codecs the browser may negotiate for the websocket audio (see audio_codec.py);
+# raw PCM is used until it asks for another. Codecs this process can't run
+# (Opus without opuslib/libopus) are left out of what it offers
+CODECS            = os.environ.get('CODECS', 'opus,mulaw,pcm').split(',')
+if 'CODECS' in os.environ and set(CODECS) - set(available_codecs()):
+    print(f'[Warning] CODECS: {", ".join(sorted(set(CODECS) - set(available_codecs())))} '
+          f'not available here; not offering them')
+CODECS            = [c for c in CODECS if c in available_codecs()]
 
-3. Elicit learner speech
-– Prompt the student to respond step by step:
- - Tutor: “What would you say in English if you want to change your seat?”
- - Tutor: “Now ask if there’s a fee for extra baggage.”
+# Timestamped audio frames (see framing.py and latency.py): browsers that ask
+# for header version 1 get sequence numbers and capture/send times on every
+# frame, for one-way delay, lost frames and mouth-to-ear latency. The clock
+# offset is taken from the best of the last CLOCK_WINDOW ping round trips
+FRAME_HEADER      = os.environ.get('FRAME_HEADER', '1') != '0'
+CLOCK_WINDOW      = int(os.environ.get('CLOCK_WINDOW', 8))
 
-4. Expand and vary
-– After each learner attempt, offer synonyms and alternatives:
+# Sample rates the browser may declare with {"cmd": "audio", "rate": N,
+# "output_rate": M}; its PCM is resampled to SEND_SR on the way in and model
+# audio from RECV_SR on the way out (see resample.py)
+CLIENT_RATE_MIN   = 8000
+CLIENT_RATE_MAX   = 192000
 
-5. Correct and reinforce
-– Gently correct any pronunciation or grammar issues, then have the learner repeat the improved phrase.
+# Session pool: idle sessions older than POOL_MAX_IDLE_S, or with less than
+# POOL_MIN_REMAINING_S left of the server's session limit, are evicted
+POOL_SIZE            = int(os.environ.get('POOL_SIZE', 0))
+POOL_MAX_IDLE_S      = float(os.environ.get('POOL_MAX_IDLE_S', 120))
+POOL_MIN_REMAINING_S = float(os.environ.get('POOL_MIN_REMAINING_S', 300))
+LIVE_SESSION_LIMIT_S = float(os.environ.get('LIVE_SESSION_LIMIT_S', 600))
 
-6. Role-play reversal
-– Swap roles: the student becomes the staff and asks you, the passenger, for information (e.g., “How many bags will you be checking?”).
+# Admission control (see admission.py): at most SESSION_LIMIT sessions per
+# process (0 = no limit); up to SESSION_QUEUE more wait in line, told their
+# position, for at most SESSION_QUEUE_WAIT_S; anyone beyond is turned away
+SESSION_LIMIT        = int(os.environ.get('SESSION_LIMIT', 0))
+SESSION_QUEUE        = int(os.environ.get('SESSION_QUEUE', 50))
+SESSION_QUEUE_WAIT_S = float(os.environ.get('SESSION_QUEUE_WAIT_S', 60))
 
-7. Wrap up and review
-– Summarize the key phrases learned and encourage a final mini role-play combining all steps: checking in, choosing a seat, and confirming the boarding details.
+# Graceful drain on SIGTERM (see drain.py): stop accepting, tell the
+# browsers, let replies in progress finish for up to DRAIN_TIMEOUT_S (a reply
+# counts as finished once the model has been quiet for DRAIN_QUIET_S), then
+# close with 1012 and flush the recordings. On SIGHUP the listening socket
+# is first handed to a fresh copy of the server, which gets HANDOFF_WAIT_S to
+# warm up and report ready (see handoff.py)
+DRAIN_TIMEOUT_S     = float(os.environ.get('DRAIN_TIMEOUT_S', 30))
+DRAIN_QUIET_S       = float(os.environ.get('DRAIN_QUIET_S', 2))
+HANDOFF_WAIT_S      = float(os.environ.get('HANDOFF_WAIT_S', 30))
 
-Goal: Provide step-by-step guidance through realistic interactions at a Delta Air Lines check-in counter at JFK, building confidence with authentic travel-related English expressions."""
+# Reconnect to Gemini with a session-resumption handle when the LiveConnect
+# connection drops, replaying up to RESUME_REPLAY_S of unacknowledged mic audio
+LIVE_RESUME         = os.environ.get('LIVE_RESUME', '1') != '0'
+RESUME_REPLAY_S     = float(os.environ.get('RESUME_REPLAY_S', 5))
+RESUME_ATTEMPTS     = int(os.environ.get('RESUME_ATTEMPTS', 3))
 
-# Gemini LiveConnect configuration
-MODEL  = 'gemini-2.5-flash-preview-native-audio-dialog'
-# MODEL  = 'gemini-live-2.5-flash-preview'
-CONFIG = types.LiveConnectConfig(
-    response_modalities=['AUDIO'],
-    media_resolution='MEDIA_RESOLUTION_LOW',
-    speech_config=types.SpeechConfig(
-        voice_config=types.VoiceConfig(
-            prebuilt_voice_config=types.PrebuiltVoiceConfig(voice_name='Zephyr')
-        )
-    ),
-    context_window_compression=types.ContextWindowCompressionConfig(
-        trigger_tokens=25600,
-        sliding_window=types.SlidingWindow(target_tokens=12800),
-    ),
-    system_instruction=types.Content(
-        parts=[types.Part.from_text(
-            text=PROMPT
-        )],
-        role='user'
-    ),
+# Transcription of the learner's and the tutor's audio: fragments go to the
+# browser as {"transcript": {...}} frames and, with TRANSCRIPT_LOG, to
+# RECORD_DIR/<session>.transcript.jsonl through the recording writer thread
+TRANSCRIBE        = os.environ.get('TRANSCRIBE', '0') != '0'
+TRANSCRIPT_LOG    = os.environ.get('TRANSCRIPT_LOG', '1') != '0'
+
+# Cache of opening turns (see opening_cache.py): the tutor's reply to the
+# browser's first text turn is stored once per model/voice/prompt/text and
+# played from OPENING_CACHE_DIR (at most OPENING_CACHE_MB) to later sessions
+# while their LiveConnect session connects. Needs the model's transcript, so
+# it turns on output transcription
+OPENING_CACHE     = os.environ.get('OPENING_CACHE', '0') != '0'
+OPENING_CACHE_DIR = os.environ.get('OPENING_CACHE_DIR', 'opening_cache')
+OPENING_CACHE_MB  = float(os.environ.get('OPENING_CACHE_MB', 200))
+OPENING_CHUNK_MS  = 100   # cached PCM is handed to the sink in pieces this long
+
+# Lesson scenarios (see lessons.py): the built-ins plus any in LESSONS_FILE.
+# The browser picks one with {"cmd": "lesson", "name": ...} as its first
+# message (waiting up to LESSON_WAIT_S for it), otherwise it gets LESSON_DEFAULT.
+# The session pool keeps sessions warm for POOL_LESSONS (default: the default)
+LESSONS_FILE      = os.environ.get('LESSONS_FILE', '')
+LESSON_DEFAULT    = os.environ.get('LESSON_DEFAULT', 'jfk-checkin')
+LESSON_WAIT_S     = float(os.environ.get('LESSON_WAIT_S', 2))
+POOL_LESSONS      = [n for n in os.environ.get('POOL_LESSONS', '').split(',') if n]
+
+# Prometheus-style metrics endpoint (see metrics.py); local only by default
+METRICS_HOST      = os.environ.get('METRICS_HOST', '127.0.0.1')
+METRICS_PORT      = int(os.environ.get('METRICS_PORT', 9100))
+
+# Event-loop health (see loopmon.py): lag sampled every LOOP_LAG_INTERVAL_MS
+# into event_loop_lag_seconds, and callbacks holding the loop longer than
+# SLOW_CALLBACK_MS logged with their coroutine and session (0 = off; the
+# callbacks are then only timed while the profiler runs).
+# The stage profiler samples every PROFILE_INTERVAL_MS and prints the
+# PROFILE_TOP busiest sessions every PROFILE_REPORT_S while on. It starts
+# with PROFILE=1 or --profile; SIGUSR1 or GET /profile?start|stop|reset on
+# the metrics port switch it at runtime, and GET /profile returns the report
+LOOP_LAG_INTERVAL_MS = float(os.environ.get('LOOP_LAG_INTERVAL_MS', 100))
+SLOW_CALLBACK_MS     = float(os.environ.get('SLOW_CALLBACK_MS', 100))
+PROFILE              = os.environ.get('PROFILE', '0') != '0'
+PROFILE_INTERVAL_MS  = float(os.environ.get('PROFILE_INTERVAL_MS', 5))
+PROFILE_REPORT_S     = float(os.environ.get('PROFILE_REPORT_S', 30))
+PROFILE_TOP          = int(os.environ.get('PROFILE_TOP', 5))
+
+# Voice activity gating of mic audio before it reaches Gemini (see vad.py):
+# 'off', 'suppress' (drop silence) or 'thin' (forward 1 in VAD_THIN_KEEP)
+VAD_MODE          = os.environ.get('VAD_MODE', 'off')
+VAD_THRESHOLD_DB  = float(os.environ.get('VAD_THRESHOLD_DB', -45))
+VAD_HANGOVER_MS   = float(os.environ.get('VAD_HANGOVER_MS', 600))
+VAD_PREROLL_MS    = float(os.environ.get('VAD_PREROLL_MS', 300))
+VAD_THIN_KEEP     = int(os.environ.get('VAD_THIN_KEEP', 8))
+
+# Initialize the GenAI client
+if os.environ.get('LIVE_FAKE'):
+    # local stand-in for load tests; see fake_live.py
+    from fake_live import FakeClient
+    client = FakeClient()
+else:
+    client = genai.Client()  # Make sure GOOGLE_API_KEY is set
+
+# Pre-connected LiveConnect sessions, so handlers skip the connect handshake
+# (POOL_SIZE idle sessions per model/config; 0 = connect on demand)
+session_pool = SessionPool(
+    client.aio.live.connect,
+    size=POOL_SIZE,
+    max_idle=POOL_MAX_IDLE_S,
+    session_limit=LIVE_SESSION_LIMIT_S,
+    min_remaining=POOL_MIN_REMAINING_S,
+)
+
+admission = AdmissionController(SESSION_LIMIT, SESSION_QUEUE, SESSION_QUEUE_WAIT_S)
+
+# Running sessions, wound down together on shutdown
+sessions = SessionDrain(DRAIN_TIMEOUT_S)
+
+opening_cache = None
+if OPENING_CACHE:
+    opening_cache = OpeningCache(OPENING_CACHE_DIR, int(OPENING_CACHE_MB * 1024 * 1024), rate=RECV_SR)
+
+# segment codec id, resolved (and any FLAC fallback warned about) once per process
+record_codec = pick_codec(RECORD_CODEC) if RECORD_MODE == 'segments' else None
+
+recording_writer = RecordingWriter(
+    flush_interval=RECORD_FLUSH_MS / 1000,
+    flush_bytes=RECORD_FLUSH_KB * 1024,
+    max_buffer=RECORD_BUFFER_KB * 1024,
 )
 
-class AudioLoop:
-    def __init__(self, ws):
+# Every lesson's LiveConnect config, built once (with resumption handles
+# requested when LIVE_RESUME is on, and transcription with TRANSCRIBE)
+LESSONS = LessonRegistry.load(
+    LESSONS_FILE, LESSON_DEFAULT, resume=LIVE_RESUME,
+    transcribe=('user', 'model') if TRANSCRIBE else ('model',) if OPENING_CACHE else (),
+)
+if set(POOL_LESSONS) - set(LESSONS.names()):
+    raise SystemExit(f'POOL_LESSONS: unknown lessons {sorted(set(POOL_LESSONS) - set(LESSONS.names()))}')
+
+# Process-wide counters; summed across processes in --workers mode
+STATS = {
+    'sessions_active': 0,
+    'sessions_total':  0,
+    'session_errors':  0,
+    'upstream_chunks': 0,
+    'upstream_calls':  0,
+    'upstream_calls_saved': 0,
+    'ingest_dropped_bytes': 0,
+    'ingest_late_bytes':    0,
+    'ingest_blocked':       0,
+    'vad_in_bytes':        0,
+    'vad_forwarded_bytes': 0,
+    'vad_onsets':          0,
+    'downstream_chunks':   0,
+    'downstream_frames':   0,
+    'downstream_dropped':  0,
+    'live_reconnects':         0,
+    'live_reconnect_failures': 0,
+    'transcript_lines':        0,
+    'commands_inline':         0,
+    'commands_queued':         0,
+    'command_errors':          0,
+    'frames_lost':             0,
+    'frames_reordered':        0,
+    'frames_malformed':        0,
+}
+
+# Latency histograms, served with STATS on the local /metrics endpoint
+METRICS = Registry()
+CONNECT_SECONDS = METRICS.histogram(
+    'live_connect_seconds', 'Time to open a LiveConnect session')
+RESPONSE_SECONDS = METRICS.histogram(
+    'turn_response_seconds', 'Last user speech (or text turn) to first model audio byte')
+FIRST_SEND_SECONDS = METRICS.histogram(
+    'turn_first_send_seconds', 'Last user speech (or text turn) to first audio frame sent to the browser')
+TURN_SECONDS = METRICS.histogram(
+    'turn_duration_seconds', 'First model audio byte to turn complete or interruption',
+    buckets=(0.5, 1, 2, 5, 10, 20, 30, 60))
+QUEUE_DEPTH = METRICS.histogram(
+    'audio_ingest_buffered_seconds', 'Mic audio queued for Gemini, seen by each incoming chunk',
+    buckets=(0, 0.05, 0.1, 0.25, 0.5, 1, 2))
+BARGE_IN_SECONDS = METRICS.histogram(
+    'barge_in_seconds', 'User speech onset during a reply to the interruption notice sent to the browser')
+ADMISSION_WAIT_SECONDS = METRICS.histogram(
+    'admission_wait_seconds', 'Time a session waited in the admission queue',
+    buckets=(0, 0.1, 0.5, 1, 2, 5, 10, 30, 60))
+LOOP_LAG_SECONDS = METRICS.histogram(
+    'event_loop_lag_seconds', 'How late the event loop woke up from a short sleep',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1))
+UPLINK_SECONDS = METRICS.histogram(
+    'frame_uplink_seconds', 'Capture of a mic frame in the browser to its arrival here (one way)')
+DOWNLINK_SECONDS = METRICS.histogram(
+    'frame_downlink_seconds', "Sending a reply's first frame to its arrival in the browser (one way)")
+MOUTH_TO_EAR_SECONDS = METRICS.histogram(
+    'turn_mouth_to_ear_seconds', 'Capture of the last user speech to the reply playing in the browser',
+    buckets=(0.25, 0.5, 0.75, 1, 1.5, 2, 3, 5, 10))
+RECONNECT_SECONDS = METRICS.histogram(
+    'live_reconnect_seconds', 'Time to resume a dropped LiveConnect session')
+INTERRUPTIONS = METRICS.counter(
+    'turn_interruptions_total', 'Model turns cut off by user barge-in')
+for _key in STATS:
+    METRICS.gauge(f'app_{_key}', _key.replace('_', ' '), functools.partial(STATS.get, _key))
+METRICS.gauge('app_recording_dropped_bytes', 'recording dropped bytes',
+              lambda: recording_writer.dropped_bytes)
+for _key in session_pool.stats():
+    METRICS.gauge(f'app_{_key}', _key.replace('_', ' '),
+                  functools.partial(lambda k: session_pool.stats()[k], _key))
+for _key in admission.stats():
+    METRICS.gauge(f'app_{_key}', _key.replace('_', ' '),
+                  functools.partial(lambda k: admission.stats()[k], _key))
+
+loop_monitor = LoopMonitor(SLOW_CALLBACK_MS / 1000, LOOP_LAG_INTERVAL_MS / 1000,
+                           on_lag=LOOP_LAG_SECONDS.observe)
+profiler = StageProfiler(loop_monitor, PROFILE_INTERVAL_MS / 1000)
+for _key in loop_monitor.stats():
+    METRICS.gauge(f'app_{_key}', _key.replace('_', ' '),
+                  functools.partial(lambda k: loop_monitor.stats()[k], _key))
+if opening_cache:
+    for _key in opening_cache.stats():
+        METRICS.gauge(f'app_{_key}', _key.replace('_', ' '),
+                      functools.partial(lambda k: opening_cache.stats()[k], _key))
+
+class AudioLoop(LiveEngine):
+    """
+    Websocket driver for `LiveEngine`: reads the browser's audio and control
+    frames as the source and serves as the sink for model audio.
+    """
+
+    def __init__(self, ws, lesson):
+        session_id = new_session_id()
+        # — INPUT (what we send *to* Gemini) and RESPONSE (what we get *from* Gemini) —
+        if RECORD_MODE == 'segments':
+            self.recording = SegmentRecording(
+                recording_writer, session_id, RECORD_DIR, SEND_SR, RECV_SR,
+                codec=record_codec, max_segment_s=RECORD_SEGMENT_MAX_S,
+            )
+        else:
+            self.recording = SessionRecording(
+                recording_writer, session_id, RECORD_DIR, SEND_SR, RECV_SR,
+                sampwidth=SAMPWIDTH, enabled=RECORD_MODE != 'off',
+            )
+        self.transcript_log = None
+        if TRANSCRIBE and TRANSCRIPT_LOG:
+            os.makedirs(RECORD_DIR, exist_ok=True)
+            self.transcript_log = recording_writer.add(TranscriptLog(
+                recording_writer, os.path.join(RECORD_DIR, session_id + '.transcript.jsonl')))
+        coalescer = None
+        if COALESCE_MS > 0:
+            coalescer = ChunkCoalescer(COALESCE_MS, COALESCE_MAX_KB * 1024, sample_rate=SEND_SR)
+        super().__init__(
+            session_pool.acquire, lesson.model, lesson.config, sink=self, session_id=session_id,
+            ingest=IngestRing(INGEST_BUFFER_MS, INGEST_POLICY, INGEST_MAX_AGE_MS,
+                              sample_rate=SEND_SR),
+            coalescer=coalescer,
+            wav_in=self.recording.user_in, wav_out=self.recording.response,
+            resume=LIVE_RESUME, replay_s=RESUME_REPLAY_S, resume_attempts=RESUME_ATTEMPTS,
+            send_sr=SEND_SR,
+        )
         self.ws          = ws
-        self.session     = None
-        self.audio_out_q = asyncio.Queue(maxsize=5)
-
-        # — INPUT WAV (what we send *to* Gemini) —
-        self.wav_in = wave.open(INPUT_WAV, 'wb')
-        self.wav_in.setnchannels(CHANNELS)
-        self.wav_in.setsampwidth(audio_engine.get_sample_size(FORMAT))
-        self.wav_in.setframerate(SEND_SR)
-
-        # — RESPONSE WAV (what we get *from* Gemini) —
-        self.wav_out = wave.open(RESPONSE_WAV, 'wb')
-        self.wav_out.setnchannels(CHANNELS)
-        self.wav_out.setsampwidth(audio_engine.get_sample_size(FORMAT))
-        self.wav_out.setframerate(RECV_SR)
-
-    async def ws_reader(self):
+        self.lesson      = lesson
+        self.codec       = PcmCodec(RECV_SR, SEND_SR)
+        self.resample_in  = None   # browser capture rate -> SEND_SR
+        self.resample_out = None   # RECV_SR -> browser playback rate
+        self.pacer       = None
+        if DOWN_FRAME_MS > 0:
+            self.pacer = DownstreamPacer(self.ws_out, DOWN_FRAME_MS, DOWN_LEAD_MS,
+                                         sample_rate=RECV_SR, flush=self.flush_audio)
+        self.vad         = None
+        if VAD_MODE != 'off':
+            self.vad = VoiceGate(
+                sample_rate=SEND_SR, threshold_db=VAD_THRESHOLD_DB,
+                hangover_ms=VAD_HANGOVER_MS, preroll_ms=VAD_PREROLL_MS,
+                mode=VAD_MODE, thin_keep=VAD_THIN_KEEP,
+            )
+        # without gating, still tell speech from silence for the latency metrics
+        self.speech_probe = self.vad or VoiceGate(sample_rate=SEND_SR, threshold_db=VAD_THRESHOLD_DB)
+
+        # — per-turn timing (time.monotonic) —
+        self.last_user_audio = None   # last voiced mic chunk or text turn
+        self.first_send_ref  = None   # last_user_audio awaiting the first frame sent
+        self.speech_onset    = None   # first voiced mic chunk of the latest utterance
+        self.response_times  = []
+
+        # — opening turn cache —
+        self.opening_done    = not opening_cache   # first text turn handled
+        self.opening_capture = None   # (key, text, turn, pcm, transcript) of an uncached opening
+        self.seed_task       = None
+
+        self.draining        = False   # server shutting down; mic audio is dropped
+
+        # — timestamped frames (see framing.py, latency.py) —
+        self.frame_version   = 0
+        self.clock           = ClockSync(CLOCK_WINDOW)
+        self.frames_in       = FrameTracker(self.clock, SEND_SR)
+        self.down_seq        = 0
+        self.speech_captured = None   # browser time of the last voiced mic frame
+        self.turn_cues       = {}     # generation -> speech_captured when the turn began
+        self.mouth_to_ear    = []
+
+        # — control frames (see commands.py) —
+        self.commands = CommandDispatcher()
+        self.commands.on(Text, self.on_text)
+        self.commands.on(Codec, self.on_codec)
+        self.commands.on(Audio, self.on_audio)
+        self.commands.on(Lesson, self.on_lesson)
+        self.commands.on(Ping, self.on_ping)
+        self.commands.on(Frames, self.on_frames)
+        self.commands.on(Clock, self.on_clock)
+        self.commands.on(Played, self.on_played)
+
+    async def messages(self, first=None):
+        """The browser's frames, starting with `first` if the handler already read it."""
+        if first is not None:
+            yield first
+        try:
+            async for msg in self.ws:
+                yield msg
+        except ConnectionClosed:
+            if not self.draining:
+                raise
+
+    async def ws_reader(self, first=None):
+        """
+        Read the browser's frames: audio is recorded and enqueued for Gemini,
+        commands that wait on Gemini run on the control lane task.
+        """
+        async with asyncio.TaskGroup() as tg:
+            lane = tg.create_task(self.commands.run())
+            await self.read_frames(first)
+            lane.cancel()
+
+    async def read_frames(self, first=None):
         """
         Read raw PCM from the browser, record it, and enqueue for Gemini.
         """
-        async for msg in self.ws:
+        async for msg in self.messages(first):
             # 1) JSON control frames
             if isinstance(msg, str):
                 try:
-                    ctrl = json.loads(msg)
-                except json.JSONDecodeError:
-                    continue
+                    await self.commands.dispatch(msg)
+                except CommandError as e:
+                    await self.control({'error': str(e)})
+                continue
 
-                if ctrl.get('cmd') == 'text' and 'text' in ctrl:
-                    # send a text turn immediately, marking it as complete
-                    await self.session.send_client_content(
-                        turns={'role': 'user',
-                               'parts': [{'text': ctrl['text']}]},
-                        turn_complete=True
-                    )
+            # 2) binary = one audio frame in the negotiated codec
+            #    decode to Int16 PCM @16kHz, record it and enqueue for Gemini
+            if self.draining:
+                # no new turns once the server is shutting down
+                continue
+            captured = None
+            if self.frame_version:
+                try:
+                    header, msg = unpack(msg)
+                except ValueError:
+                    self.frames_in.malformed += 1
+                    continue
+                captured, delay = self.frames_in.received(header, time.time())
+                if delay is not None:
+                    UPLINK_SECONDS.observe(delay)
+                msg = bytes(msg)
+            msg = self.codec.decode(msg)
+            if self.resample_in and self.codec.resampled:
+                msg = self.resample_in.process(msg)
+                if not msg:
                     continue
+            QUEUE_DEPTH.observe(self.audio_out_q.buffered_seconds)
+            if self.vad is None:
+                self.note_speech(bool(self.speech_probe.speech_frames(msg).any()), captured)
+                await self.feed(msg)
+                continue
 
-            # 2) binary = raw PCM chunk
-            #    record it and enqueue for streaming to Gemini
-            # chunk is bytes of Int16 PCM @16kHz
-            self.wav_in.writeframes(msg)
-            await self.audio_out_q.put({'data': msg, 'mime_type': 'audio/pcm'})
+            # 3) gated: only speech (plus pre-roll and hangover) goes upstream
+            self.wav_in.write(msg)
+            chunks, closed = self.vad.process(msg)
+            self.note_speech(self.vad.last_speech, captured)
+            for chunk in chunks:
+                await self.audio_out_q.put({'data': chunk, 'mime_type': 'audio/pcm'})
+            if closed:
+                # mic is effectively paused; let Gemini flush what it buffered
+                await self.end_audio()
 
-    async def send_realtime(self):
-        """
-        Pull queued mic chunks and send them into Gemini LiveConnect.
-        """
-        while True:
-            pkt = await self.audio_out_q.get()
-            await self.session.send_realtime_input(audio=pkt)
+    # — commands —
+
+    async def on_text(self, cmd):
+        # send a text turn immediately, marking it as complete
+        self.last_user_audio = time.monotonic()
+        self.speech_captured = None   # the reply answers the text, not the mic
+        if not self.opening_done:
+            self.opening_done = True
+            await self.open_lesson(cmd.text)
+        else:
+            await self.send_text(cmd.text)
+
+    async def on_codec(self, cmd):
+        # browser offers codecs in preference order; answer with ours
+        self.codec = negotiate(cmd.offer, CODECS, RECV_SR, SEND_SR)
+        await self.control({'codec': self.codec.name})
+
+    async def on_audio(self, cmd):
+        # browser captures/plays at its native rate
+        await self.control({'audio': self.set_rates(cmd.rate, cmd.output_rate)})
+
+    async def on_lesson(self, cmd):
+        # the session already runs with a lesson's prompt
+        await self.control({'lesson': self.lesson.name,
+                            'error': 'choose the lesson before anything else'})
+
+    async def on_ping(self, cmd):
+        # straight to the socket, ahead of any paced audio
+        await self.ws.send(json.dumps({'pong': {'id': cmd.id, 't': cmd.t,
+                                                'server_t': round(time.time(), 6)}}))
 
-    async def receive_and_forward(self):
+    async def on_frames(self, cmd):
+        # browser's newest header version; answer with the one now in effect.
+        # Sent before any audio, like the codec offer
+        self.frame_version = max(0, min(cmd.version, FRAME_VERSION)) if FRAME_HEADER else 0
+        await self.control({'frames': self.frame_version})
+
+    async def on_clock(self, cmd):
+        self.clock.sample(cmd.t0, cmd.server_t, cmd.t1)
+
+    async def on_played(self, cmd):
+        # the first frame of a reply reached the browser and is scheduled
+        cue = self.turn_cues.pop(cmd.generation, None)
+        for generation in [g for g in self.turn_cues if g < cmd.generation]:
+            del self.turn_cues[generation]   # interrupted before they were heard
+        if self.clock.synced:
+            DOWNLINK_SECONDS.observe(cmd.received + self.clock.offset - cmd.sent)
+        if cue is not None:
+            MOUTH_TO_EAR_SECONDS.observe(cmd.played - cue)
+            self.mouth_to_ear.append(cmd.played - cue)
+
+    async def open_lesson(self, text):
         """
-        Read Gemini’s audio replies, record them to response.wav
-        and forward the raw PCM back to the browser.
+        First text turn of the session. If its reply is cached, play that now
+        and tell Gemini it has been said; otherwise have Gemini say it and
+        keep a copy of the turn for the next session.
         """
-        try:
-            while True:
-                turn = self.session.receive()
-                async for response in turn:
-                    # Detect server‐side VAD interruption
-                    if getattr(response, "server_content", None):
-                        if response.server_content.interrupted:
-                            # Notify client to flush playback
-                            await self.ws.send(json.dumps({"interrupted": True}))
-                            # skip any further data in this turn
-                            break
-
-                    if response.data:
-                        # record to response.wav
-                        self.wav_out.writeframes(response.data)
-                        try:
-                        # forward to client
-                            await self.ws.send(response.data)
-                        except ConnectionClosedOK:
-                            # Client closed the WebSocket (1005); stop sending
-                            return
-        except ConnectionClosedError as e:
-            # transient internal error from Gemini Live API; swallow and let handler clean up
-            print(f"[Warning] LiveConnect connection closed: {e}")
-        except Exception as e:
-            # any other unexpected exception
-            traceback.print_exception(e)
-        # finally:
-        #     # WAV files are closed in the handler’s cleanup
-        #     pass
+        lesson = self.lesson
+        key = opening_key(lesson.model, lesson.voice, lesson.prompt, text)
+        hit = None
+        if not self.turns:
+            # too late once the model has spoken (e.g. replying to earlier audio)
+            hit = await asyncio.to_thread(opening_cache.get, key)
+        if hit is None:
+            self.opening_capture = (key, text, self.generation + 1, bytearray(), [])
+            await self.send_text(text)
+            return
+        pcm, meta = hit
+        self.start_turn()
+        step = RECV_SR * SAMPWIDTH * OPENING_CHUNK_MS // 1000
+        for i in range(0, len(pcm), step):
+            self.wav_out.write(pcm[i:i + step])
+            await self.audio(pcm[i:i + step], self.generation)
+        self.end_turn()
+        await self.turn_complete(self.generation)
+        # once connected, put the exchange into the session's history without
+        # asking for a reply; meanwhile keep reading the mic
+        self.seed_task = asyncio.create_task(self.seed_opening(text, meta['transcript']))
 
-    def close(self):
-        """Close both WAV files once all tasks are done."""
+    async def seed_opening(self, text, transcript):
         try:
-            self.wav_in.close()
-        except Exception:
+            await self.with_session(lambda session: session.send_client_content(
+                turns=[{'role': 'user', 'parts': [{'text': text}]},
+                       {'role': 'model', 'parts': [{'text': transcript}]}],
+                turn_complete=False,
+            ))
+        except ConnectionClosed:
             pass
+
+    async def store_opening(self):
+        """The captured opening turn is complete: cache it off the event loop."""
+        key, text, turn, pcm, transcript = self.opening_capture
+        self.opening_capture = None
+        transcript = ''.join(transcript).strip()
+        if not pcm or not transcript:
+            # no transcript to hand the next session in place of the audio
+            return
+        meta = {'model': self.lesson.model, 'voice': self.lesson.voice,
+                'lesson': self.lesson.name, 'text': text, 'transcript': transcript}
         try:
-            self.wav_out.close()
-        except Exception:
+            await asyncio.to_thread(opening_cache.put, key, bytes(pcm), meta)
+        except OSError as e:
+            print(f'[Warning] opening cache: {e}')
+
+    async def drain(self, timeout):
+        """
+        The server is shutting down: tell the browser, stop taking its audio,
+        let the reply in progress finish (for up to `timeout`) and close.
+        """
+        self.draining = True
+        try:
+            async with asyncio.timeout(timeout):
+                await self.control({'draining': {'timeout': round(timeout, 1)}})
+                # answer what the learner already said
+                await self.end_audio()
+                await self.settle(DRAIN_QUIET_S)
+                if self.pacer:
+                    await self.pacer.wait_sent()
+        except TimeoutError:
             pass
+        except ConnectionClosed:
+            return
+        await self.ws.close(1012, 'server restarting')
 
-async def handler(ws):
-    loop = AudioLoop(ws)
+    def set_rates(self, rate, output_rate):
+        """Apply the sample rates declared by the browser; returns the ones in effect."""
+        def valid(rate):
+            return isinstance(rate, int) and CLIENT_RATE_MIN <= rate <= CLIENT_RATE_MAX
+
+        if valid(rate):
+            self.resample_in = Resampler(rate, SEND_SR) if rate != SEND_SR else None
+            self.frames_in.rate = rate
+        elif rate is not None:
+            print(f'[Warning] ignoring capture rate {rate!r}')
+        if valid(output_rate):
+            self.resample_out = Resampler(RECV_SR, output_rate) if output_rate != RECV_SR else None
+        elif output_rate is not None:
+            print(f'[Warning] ignoring playback rate {output_rate!r}')
+        return {
+            'rate':        self.resample_in.in_rate if self.resample_in else SEND_SR,
+            'output_rate': self.resample_out.out_rate if self.resample_out else RECV_SR,
+        }
+
+    def note_speech(self, voiced, captured=None):
+        """
+        Track the last voiced mic chunk and where the current utterance began;
+        `captured` is the chunk's capture time in the browser, if its frame had one.
+        """
+        if not voiced:
+            return
+        if captured is not None:
+            self.speech_captured = captured
+        now = time.monotonic()
+        if self.last_user_audio is None or now - self.last_user_audio > VAD_HANGOVER_MS / 1000:
+            # pauses shorter than the VAD hangover don't start a new utterance
+            self.speech_onset = now
+        self.last_user_audio = now
+
+    # — sink: model output to the browser —
+
+    async def ws_out(self, item, generation=None):
+        """
+        Send a JSON control frame (str) or model PCM (bytes) to the browser,
+        tagging audio with its generation (see framing.py).
+        """
+        if isinstance(item, str):
+            await self.ws.send(item)
+            return
+        if self.first_send_ref is not None:
+            FIRST_SEND_SECONDS.observe(time.monotonic() - self.first_send_ref)
+            self.first_send_ref = None
+        if generation is None:
+            generation = self.generation
+        if self.resample_out and self.codec.resampled:
+            item = self.resample_out.process(item)
+            if not item:
+                return
+        for frame in self.codec.encode(item):
+            await self.ws.send(self.frame(generation, frame))
+
+    async def flush_audio(self, generation=None):
+        """Send whatever the codec still buffers at the end of a turn."""
+        if generation is None:
+            generation = self.generation
+        if self.resample_out:
+            # next turn starts from silence, not this one's filter tail
+            self.resample_out.reset()
+        for frame in self.codec.flush():
+            await self.ws.send(self.frame(generation, frame))
+
+    def frame(self, generation, payload):
+        """One downstream audio frame, with the header version in effect (see framing.py)."""
+        if not self.frame_version:
+            return tag(generation, payload)
+        header = FrameHeader(generation, self.down_seq, self.codec.samples(payload), time.time())
+        self.down_seq += 1
+        return pack(header, payload)
+
+    async def audio(self, pcm, generation):
+        if self.opening_capture and self.opening_capture[2] == generation:
+            self.opening_capture[3].extend(pcm)
+        if self.pacer:
+            # framed and sent by the pacer task
+            self.pacer.push(pcm, generation)
+        else:
+            await self.ws_out(pcm, generation)
+
+    async def text(self, text):
+        pass
+
+    async def transcript(self, role, text, turn, finished):
+        if role == 'model' and self.opening_capture and self.opening_capture[2] == turn:
+            self.opening_capture[4].append(text)
+        if not TRANSCRIBE:
+            # only on for the opening cache
+            return
+        if self.transcript_log:
+            self.transcript_log.append(role, text, turn, finished)
+        await self.control({'transcript': {'role': role, 'text': text, 'turn': turn,
+                                           'final': finished}})
+
+    async def interrupted(self, generation):
+        """Tell the browser to flush playback and drop frames below `generation`."""
+        notice = json.dumps({"interrupted": True, "generation": generation})
+        # a cut-off opening isn't worth caching
+        self.opening_capture = None
+        self.codec.reset()
+        if self.resample_out:
+            self.resample_out.reset()
+        if self.pacer:
+            # drop paced audio not yet sent
+            self.pacer.interrupt(notice)
+        else:
+            await self.ws.send(notice)
+
+    async def turn_complete(self, generation):
+        if self.opening_capture and self.opening_capture[2] == generation:
+            await self.store_opening()
+        # turn over: send the partial last frame now
+        if self.pacer:
+            self.pacer.end_turn()
+        else:
+            await self.flush_audio(generation)
+
+    async def control(self, obj):
+        msg = json.dumps(obj)
+        if self.pacer:
+            # keep control frames in order with paced audio
+            self.pacer.control(msg)
+        else:
+            await self.ws.send(msg)
+
+    async def output(self):
+        if self.pacer:
+            await self.pacer.run()
+        else:
+            await asyncio.get_running_loop().create_future()
+
+    # — engine hooks: metrics —
+
+    def on_connected(self):
+        CONNECT_SECONDS.observe(self.connect_s)
+
+    def on_turn_start(self):
+        self.recording.turn_started(self.generation)
+        if self.last_user_audio is not None:
+            RESPONSE_SECONDS.observe(self.turn_start - self.last_user_audio)
+            self.response_times.append(self.turn_start - self.last_user_audio)
+            self.first_send_ref = self.last_user_audio
+        if self.speech_captured is not None:
+            # mouth-to-ear runs to when the browser reports this turn played
+            self.turn_cues[self.generation] = self.speech_captured
+            self.speech_captured = None
+
+    def on_turn_end(self, duration):
+        self.recording.turn_ended()
+        TURN_SECONDS.observe(duration)
+        self.first_send_ref = None
+
+    def on_interrupted(self, started):
+        INTERRUPTIONS.inc()
+        if started is not None and self.speech_onset is not None \
+                and self.speech_onset >= started:
+            # the user started talking over this reply
+            BARGE_IN_SECONDS.observe(time.monotonic() - self.speech_onset)
+
+    def on_reconnected(self, seconds):
+        RECONNECT_SECONDS.observe(seconds)
+        STATS['live_reconnects'] += 1
+
+    def on_reconnect_failed(self):
+        STATS['live_reconnect_failures'] += 1
+
+    def close(self):
+        """Hand the recording to the writer thread for a final flush."""
+        if self.seed_task:
+            self.seed_task.cancel()
+        self.recording.close()
+        if self.transcript_log:
+            self.transcript_log.close()
+            STATS['transcript_lines'] += self.transcript_log.lines
+        if self.connect_s is not None:
+            times  = sorted(self.response_times)
+            median = f'{times[len(times) // 2]:.2f}s' if times else 'n/a'
+            print(f'[{self.session_id}] {self.lesson.name}: connect {self.connect_s:.2f}s, '
+                  f'{self.turns} turns, median response {median}, '
+                  f'{self.interruptions} interruptions')
+        for key, value in self.commands.stats().items():
+            STATS[key] += value
+        if self.frame_version:
+            frames = self.frames_in
+            for key, value in frames.stats().items():
+                STATS[key] += value
+            heard  = sorted(self.mouth_to_ear)
+            median = f'{heard[len(heard) // 2]:.2f}s' if heard else 'n/a'
+            clock  = 'clock not synced'
+            if self.clock.synced:
+                clock = (f'clock offset {self.clock.offset * 1000:+.0f} ms '
+                         f'(rtt {self.clock.rtt * 1000:.0f} ms), '
+                         f'worst one-way {frames.delay_max * 1000:.0f} ms')
+            print(f'[{self.session_id}] frames: {frames.frames} in, {frames.lost} lost, '
+                  f'{frames.reordered} reordered, {clock}, median mouth-to-ear {median}')
+        ingest = self.audio_out_q
+        for key, value in ingest.stats().items():
+            STATS[key] += value
+        if ingest.dropped_chunks or ingest.late_chunks:
+            print(f'[{self.session_id}] ingest ({ingest.policy}) dropped '
+                  f'{ingest.dropped_bytes / ingest.bytes_per_sec:.2f}s, '
+                  f'late {ingest.late_bytes / ingest.bytes_per_sec:.2f}s of mic audio')
+        if self.coalescer:
+            for key, value in self.coalescer.stats().items():
+                STATS[key] += value
+        if self.pacer:
+            for key, value in self.pacer.stats().items():
+                STATS[key] += value
+        if self.vad:
+            for key, value in self.vad.stats().items():
+                STATS[key] += value
+            print(f'[{self.session_id}] VAD suppressed {self.vad.suppressed_fraction:.1%} '
+                  f'of {self.vad.in_bytes / (2 * SEND_SR):.1f}s mic audio')
+
+async def choose_lesson(ws):
+    """
+    The lesson named by the browser's first message, or the default. If that
+    message is anything else it is returned too, for the session to handle.
+    """
+    try:
+        first = await asyncio.wait_for(ws.recv(), LESSON_WAIT_S)
+    except asyncio.TimeoutError:
+        return LESSONS.get(), None
+    try:
+        command = parse_command(first) if isinstance(first, str) else None
+    except CommandError:
+        command = None
+    if not isinstance(command, Lesson):
+        return LESSONS.get(), first
+
+    answer = {}
     try:
-        # 1) Open a LiveConnect session and launch all tasks
-        async with client.aio.live.connect(model=MODEL, config=CONFIG) as session:
-            loop.session = session
+        lesson = LESSONS.get(command.name)
+    except KeyError:
+        lesson = LESSONS.get()
+        answer['error'] = f'unknown lesson {command.name!r}'
+    await ws.send(json.dumps({'lesson': lesson.name, 'title': lesson.title, **answer}))
+    return lesson, None
 
-            # Run all three loops in parallel; cancel all if any exits/errors
-            async with asyncio.TaskGroup() as tg:
-                tg.create_task(loop.ws_reader())
-                tg.create_task(loop.send_realtime())
-                tg.create_task(loop.receive_and_forward())
+async def admit(ws):
+    """
+    Wait for a session slot, telling the browser its queue position. Sends
+    {"admitted": ...} once in, or {"rejected": reason} and closes the
+    websocket when turned away (returns False).
+    """
+    async def tell(position):
+        await ws.send(json.dumps({'queue': {'position': position}}))
 
+    try:
+        waited = await admission.acquire(tell)
+    except AdmissionRejected as e:
+        await ws.send(json.dumps({'rejected': e.reason}))
+        if admission.closed:
+            await ws.close(1012, 'server restarting')
+        else:
+            await ws.close(1013, 'try again later')
+        return False
+    ADMISSION_WAIT_SECONDS.observe(waited)
+    try:
+        await ws.send(json.dumps({'admitted': True, 'waited': round(waited, 3)}))
+    except ConnectionClosed:
+        admission.release()
+        raise
+    return True
+
+async def handler(ws):
+    try:
+        # nothing touches Gemini before the session gets a slot
+        if not await admit(ws):
+            return
+    except ConnectionClosed:
+        return
+    try:
+        await run_session(ws)
+    finally:
+        admission.release()
+
+async def run_session(ws):
+    try:
+        # no LiveConnect session until we know which lesson's prompt it needs
+        lesson, first = await choose_lesson(ws)
+    except ConnectionClosed:
+        return
+    loop = AudioLoop(ws, lesson)
+    # tags this session's tasks for the loop monitor and profiler
+    SESSION_ID.set(loop.session_id)
+    sessions.add(loop)
+    STATS['sessions_active'] += 1
+    STATS['sessions_total']  += 1
+    try:
+        # Check out a LiveConnect session (pre-connected if the pool has one)
+        # and stream until the browser or Gemini goes away
+        await loop.run(loop.ws_reader(first))
     except Exception:
+        STATS['session_errors'] += 1
         traceback.print_exc()
     finally:
+        STATS['sessions_active'] -= 1
         # Only close files once *all* tasks have finished
         loop.close()
         await ws.close()
+        sessions.discard(loop)
+
+async def report_stats(worker_id, stats_q, interval):
+    """Push this worker's counters to the supervisor."""
+    while True:
+        stats_q.put((worker_id, os.getpid(), dict(STATS, **process_stats())))
+        await asyncio.sleep(interval)
+
+def process_stats():
+    stats = dict(session_pool.stats(), recording_dropped_bytes=recording_writer.dropped_bytes)
+    stats.update(admission.stats())
+    stats.update(loop_monitor.stats())
+    if opening_cache:
+        stats.update(opening_cache.stats())
+    return stats
+
+def toggle_profile():
+    """SIGUSR1: start the stage profiler, or stop it and print its report."""
+    report = profiler.toggle()
+    print(format_report(report) if report else '[Profile] started')
+
+def profile_route(query):
+    """GET /profile[?start|stop|reset] on the metrics port; returns the report as JSON."""
+    if query == 'start':
+        profiler.start()
+    elif query == 'stop':
+        profiler.stop()
+    elif query == 'reset':
+        profiler.reset()
+    report = dict(profiler.report(PROFILE_TOP), running=profiler.running)
+    return 'application/json', json.dumps(report)
 
-async def main():
-    server = await websockets.serve(handler, '0.0.0.0', 8765)
-    print('WebSocket + Gemini server running on ws://0.0.0.0:8765')
-    await server.wait_closed()
+async def report_profile(interval):
+    """Print the profiler's report every `interval` seconds while it runs."""
+    while True:
+        await asyncio.sleep(interval)
+        if profiler.running:
+            print(format_report(profiler.report(PROFILE_TOP)))
+
+async def serve(host, port, reuse_port=False, worker_id=None, stats_q=None, metrics_port=0,
+                handoff=False, profile=False):
+    """
+    Serve until SIGTERM, or with `handoff` until SIGHUP has passed the
+    listening socket to a successor; then drain the running sessions.
+    """
+    loop = asyncio.get_running_loop()
+    signals = asyncio.Queue()
+    loop.add_signal_handler(signal.SIGTERM, signals.put_nowait, signal.SIGTERM)
+    if handoff:
+        loop.add_signal_handler(signal.SIGHUP, signals.put_nowait, signal.SIGHUP)
+    loop.add_signal_handler(signal.SIGUSR1, toggle_profile)
+    if loop_monitor.slow:
+        loop_monitor.install()
+    if profile:
+        profiler.start()
+    background = [asyncio.create_task(loop_monitor.run()),
+                  asyncio.create_task(report_profile(PROFILE_REPORT_S))]
+    tag = '' if worker_id is None else f' (worker {worker_id})'
+
+    def start_metrics():
+        # one metrics port per worker process
+        mport = metrics_port + (worker_id or 0)
+        print(f'Metrics on http://{METRICS_HOST}:{mport}/metrics{tag}')
+        return asyncio.create_task(serve_metrics(METRICS, METRICS_HOST, mport,
+                                                 routes={'/profile': profile_route}))
+
+    # a predecessor's socket when started by a SIGHUP handoff
+    listen = inherited_socket()
+    where  = {'sock': listen} if listen else {'host': host, 'port': port, 'reuse_port': reuse_port}
+    async with websockets.serve(handler, **where) as server:
+        source = ' (inherited socket)' if listen else ''
+        print(f'WebSocket + Gemini server running on ws://{host}:{port}{tag}{source}')
+        if stats_q is not None:
+            background.append(asyncio.create_task(report_stats(worker_id, stats_q, 2.0)))
+        if POOL_SIZE:
+            for name in POOL_LESSONS or [LESSONS.default]:
+                lesson = LESSONS.get(name)
+                session_pool.warm(lesson.model, lesson.config)
+            background.append(asyncio.create_task(session_pool.run()))
+        metrics = start_metrics() if metrics_port else None
+        if listen is not None and POOL_SIZE:
+            # the predecessor keeps accepting until we're warm
+            await session_pool.warmed(HANDOFF_WAIT_S)
+        notify_ready()
+
+        while await signals.get() == signal.SIGHUP:
+            if metrics:
+                # the successor binds the metrics port
+                metrics.cancel()
+                await asyncio.gather(metrics, return_exceptions=True)
+            successor = None
+            if len(server.sockets) == 1:
+                successor = await start_successor(server.sockets[0], HANDOFF_WAIT_S)
+            else:
+                print('[Warning] socket handoff needs exactly one listening socket')
+            if successor:
+                print(f'Handed the listening socket to pid {successor.pid}{tag}')
+                break
+            print(f'[Warning] restart failed; still serving{tag}')
+            metrics = start_metrics() if metrics_port else None
+
+        # stop accepting; running sessions finish their replies and close
+        server.server.close()
+        admission.close('server restarting')
+        for t in background + [metrics]:
+            if t:
+                t.cancel()
+        print(f'Draining {len(sessions.sessions)} sessions (up to {DRAIN_TIMEOUT_S:.0f}s){tag}')
+        if not await sessions.run():
+            print(f'[Warning] {len(sessions.sessions)} sessions still open after '
+                  f'{DRAIN_TIMEOUT_S:.0f}s; closing them{tag}')
+        server.close(code=1012, reason='server restarting')
+        if profiler.running:
+            profiler.stop()
+            print(format_report(profiler.report(PROFILE_TOP)))
+        loop_monitor.uninstall()
+
+def run_worker(worker_id, stats_q, host, port, metrics_port, profile):
+    """Entry point of one --workers process."""
+    # Ctrl-C and SIGHUP go to the whole process group; let the supervisor decide
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    try:
+        asyncio.run(serve(host, port, reuse_port=True, worker_id=worker_id, stats_q=stats_q,
+                          metrics_port=metrics_port, profile=profile))
+    finally:
+        recording_writer.stop(timeout=5)
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description='WebSocket <-> Gemini LiveConnect bridge')
+    p.add_argument('--host', default='0.0.0.0')
+    p.add_argument('--port', type=int, default=8765)
+    p.add_argument('--workers', type=int, default=1,
+                   help='number of server processes sharing the port (SO_REUSEPORT)')
+    p.add_argument('--stats-interval', type=float, default=30.0,
+                   help='seconds between combined worker stats reports')
+    p.add_argument('--metrics-port', type=int, default=METRICS_PORT,
+                   help='local port for GET /metrics (worker N uses port + N; 0 = off)')
+    p.add_argument('--profile', action='store_true', default=PROFILE,
+                   help='run the stage profiler from the start (toggle with SIGUSR1)')
+    args = p.parse_args(argv)
+
+    if args.workers > 1:
+        if not HAS_REUSEPORT:
+            p.error('--workers needs SO_REUSEPORT, which this platform lacks')
+        target = functools.partial(run_worker, host=args.host, port=args.port,
+                                   metrics_port=args.metrics_port, profile=args.profile)
+        WorkerSupervisor(target, args.workers, stats_interval=args.stats_interval,
+                         stop_timeout=DRAIN_TIMEOUT_S + 10).run()
+        return
+
+    try:
+        asyncio.run(serve(args.host, args.port, metrics_port=args.metrics_port, handoff=True,
+                          profile=args.profile))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # finalize WAV headers of any sessions still open
+        recording_writer.stop(timeout=5)
 
 if __name__ == '__main__':
-    asyncio.run(main())
+    main()
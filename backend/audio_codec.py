@@ -0,0 +1,139 @@
+# audio_codec.py
+# -*- coding: utf-8 -*-
+"""
+Codecs for audio on the browser <-> backend websocket.
+
+Everything past the websocket (recording, VAD, Gemini) works on Int16 PCM,
+so a codec only has to turn incoming frames into PCM (`decode`) and outgoing
+PCM into zero or more frames (`encode`). Raw PCM stays the default; the
+browser can negotiate a cheaper one with `{"cmd": "codec", "offer": [...]}`.
+
+- pcm:   raw Int16, no work
+- mulaw: G.711 mu-law, 2:1, table lookups in NumPy
+- opus:  ~10-20:1, needs the optional `opuslib` package and libopus
+"""
+import numpy as np
+
+try:
+    import opuslib
+except Exception:   # package missing, or libopus not found
+    opuslib = None
+
+
+class PcmCodec:
+    name = 'pcm'
+    # frames carry PCM at the browser's own rate, resampled by the server
+    # (see resample.py); Opus instead decodes and encodes at the server rates
+    resampled = True
+
+    def __init__(self, recv_sr, send_sr):
+        pass
+
+    def decode(self, frame):
+        return frame
+
+    def encode(self, pcm):
+        return [pcm]
+
+    def samples(self, frame):
+        """Samples carried by one encoded frame."""
+        return len(frame) // 2
+
+    def flush(self):
+        return []
+
+    def reset(self):
+        pass
+
+
+def _mulaw_tables():
+    # decode: the 256 G.711 code words -> Int16
+    u = ~np.arange(256, dtype=np.int32) & 0xFF
+    exp  = (u >> 4) & 0x07
+    mant = u & 0x0F
+    mag  = (((mant << 3) + 0x84) << exp) - 0x84
+    dec  = np.where(u & 0x80, -mag, mag).astype(np.int16)
+
+    # encode: every Int16 value -> code word, indexed by the uint16 bit pattern
+    # (ITU G.711 reference algorithm on the top 14 bits)
+    x    = np.arange(65536, dtype=np.uint16).view(np.int16).astype(np.int32) >> 2
+    neg  = x < 0
+    mag  = np.minimum(np.where(neg, -x, x), 8159) + 0x21
+    seg  = np.searchsorted(np.array([0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF, 0x1FFF]), mag)
+    code = np.where(seg > 7, 0x7F, (seg << 4) | ((mag >> (seg + 1)) & 0x0F))
+    enc  = (code ^ np.where(neg, 0x7F, 0xFF)).astype(np.uint8)
+    return dec, enc
+
+
+_MULAW_DEC, _MULAW_ENC = _mulaw_tables()
+
+
+class MulawCodec(PcmCodec):
+    name = 'mulaw'
+
+    def decode(self, frame):
+        return _MULAW_DEC[np.frombuffer(frame, dtype=np.uint8)].tobytes()
+
+    def encode(self, pcm):
+        return [_MULAW_ENC[np.frombuffer(pcm, dtype=np.uint16)].tobytes()]
+
+    def samples(self, frame):
+        return len(frame)
+
+
+class OpusCodec(PcmCodec):
+    """One websocket frame carries one Opus packet (20 ms) in either direction."""
+
+    name      = 'opus'
+    resampled = False
+    FRAME_MS  = 20
+    MAX_FRAME = 120   # ms, largest packet the browser may send
+
+    def __init__(self, recv_sr, send_sr):
+        self.encoder = opuslib.Encoder(recv_sr, 1, 'voip')
+        self.decoder = opuslib.Decoder(send_sr, 1)
+        self.enc_frame   = recv_sr * self.FRAME_MS // 1000          # samples
+        self.dec_max     = send_sr * self.MAX_FRAME // 1000         # samples
+        self._pending    = bytearray()
+
+    def decode(self, frame):
+        return self.decoder.decode(bytes(frame), self.dec_max)
+
+    def encode(self, pcm):
+        self._pending += pcm
+        step = self.enc_frame * 2
+        packets = []
+        while len(self._pending) >= step:
+            packets.append(self.encoder.encode(bytes(self._pending[:step]), self.enc_frame))
+            del self._pending[:step]
+        return packets
+
+    def samples(self, frame):
+        return self.enc_frame
+
+    def flush(self):
+        """Pad and encode the last partial frame of a turn."""
+        if not self._pending:
+            return []
+        self._pending += bytes(self.enc_frame * 2 - len(self._pending))
+        return self.encode(b'')
+
+    def reset(self):
+        self._pending.clear()
+
+
+CODECS = {c.name: c for c in (PcmCodec, MulawCodec, OpusCodec)}
+
+
+def available_codecs():
+    """Codec names this process can serve, in server preference order."""
+    return [name for name in ('opus', 'mulaw', 'pcm') if name != 'opus' or opuslib is not None]
+
+
+def negotiate(offer, allowed, recv_sr, send_sr):
+    """Pick the first codec in the client's `offer` that is also `allowed` here."""
+    usable = set(allowed) & set(available_codecs())
+    for name in offer:
+        if name in usable:
+            return CODECS[name](recv_sr, send_sr)
+    return PcmCodec(recv_sr, send_sr)
@@ -0,0 +1,91 @@
+# coalesce.py
+# -*- coding: utf-8 -*-
+"""
+Upstream chunk coalescing between `audio_out_q` and `send_realtime_input`.
+
+Under load the queue backs up with many small mic chunks, and each one costs a
+full `send_realtime_input` call. `ChunkCoalescer` merges queued PCM into one
+payload, copying into a preallocated bytearray through a memoryview instead of
+concatenating `bytes`. It never holds audio longer than the latency budget: a
+chunk that already carries `budget_ms` of audio goes out at once together with
+whatever is queued behind it, and a shorter one waits at most `budget_ms` for
+company.
+"""
+import asyncio
+
+
+class ChunkCoalescer:
+    def __init__(self, budget_ms=40.0, max_bytes=32 * 1024, sample_rate=16000, sampwidth=2):
+        self.budget       = budget_ms / 1000
+        self.target_bytes = int(sample_rate * sampwidth * budget_ms / 1000)
+        self.max_bytes    = max_bytes
+        self._buf         = bytearray(max_bytes)
+        self._view        = memoryview(self._buf)
+        self._pending     = None   # packet held back from the previous payload
+
+        self.chunks_in = 0
+        self.calls_out = 0
+
+    @property
+    def calls_saved(self):
+        return self.chunks_in - self.calls_out
+
+    async def _next_pkt(self, q):
+        if self._pending is not None:
+            pkt, self._pending = self._pending, None
+            return pkt
+        pkt = await q.get()
+        if 'data' in pkt:
+            self.chunks_in += 1
+        return pkt
+
+    async def next_payload(self, q):
+        """
+        Return the next packet to send: PCM merged from one or more queued
+        chunks, or a control packet (e.g. audio_stream_end) passed through.
+        """
+        first = await self._next_pkt(q)
+        if 'data' not in first:
+            return first
+        n = len(first['data'])
+        if n >= self.max_bytes or (n >= self.target_bytes and q.empty()):
+            # nothing to merge with: pass the chunk through without copying
+            self.calls_out += 1
+            return first
+
+        view = self._view
+        view[:n] = first['data']
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.budget
+        while n < self.max_bytes:
+            try:
+                pkt = q.get_nowait()
+            except asyncio.QueueEmpty:
+                remaining = deadline - loop.time()
+                if n >= self.target_bytes or remaining <= 0:
+                    break
+                try:
+                    pkt = await asyncio.wait_for(q.get(), remaining)
+                except TimeoutError:
+                    break
+            data = pkt.get('data')
+            if data is None:
+                # control packets keep their place in the stream
+                self._pending = pkt
+                break
+            self.chunks_in += 1
+            if n + len(data) > self.max_bytes:
+                self._pending = pkt
+                break
+            view[n:n + len(data)] = data
+            n += len(data)
+
+        self.calls_out += 1
+        return {'data': bytes(view[:n]), 'mime_type': first['mime_type']}
+
+    def stats(self):
+        return {
+            'upstream_chunks':      self.chunks_in,
+            'upstream_calls':       self.calls_out,
+            'upstream_calls_saved': self.calls_saved,
+        }
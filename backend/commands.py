@@ -0,0 +1,186 @@
+# commands.py
+# -*- coding: utf-8 -*-
+"""
+Typed control commands from the browser and their dispatch.
+
+Every text frame the browser sends is a command, `{"cmd": <name>, ...}`.
+`parse_command` turns one into the matching dataclass, checking the fields
+against their annotations, or raises CommandError. `CommandDispatcher` runs
+each command's handler in one of two lanes:
+
+- 'inline': cheap commands that change how the audio frames after them are
+  read (codec, audio rates, frame header) or only answer or take note (ping,
+  clock, played, lesson). They run in the websocket reader at once, in order
+  with the audio.
+- 'queued': commands that wait on Gemini (text turns). They go onto the
+  control lane, a queue served by its own task in arrival order, so a slow
+  `send_client_content` never stops the reader from taking mic audio.
+
+A new command is a frozen dataclass with `cmd` and `lane`, listed in
+COMMANDS, plus a handler registered with `dispatcher.on(kind, handler)`.
+"""
+import asyncio
+import json
+import types
+from dataclasses import dataclass, fields
+from typing import ClassVar
+
+
+class CommandError(ValueError):
+    """A text frame that isn't a valid command."""
+
+
+@dataclass(frozen=True)
+class Text:
+    """A complete text turn for the model."""
+    cmd:  ClassVar[str] = 'text'
+    lane: ClassVar[str] = 'queued'
+    text: str
+
+
+@dataclass(frozen=True)
+class Codec:
+    """Codecs the browser can use, in preference order."""
+    cmd:  ClassVar[str] = 'codec'
+    lane: ClassVar[str] = 'inline'
+    offer: list[str] = ()
+
+
+@dataclass(frozen=True)
+class Audio:
+    """Sample rates the browser captures and plays at."""
+    cmd:  ClassVar[str] = 'audio'
+    lane: ClassVar[str] = 'inline'
+    rate: int | None        = None
+    output_rate: int | None = None
+
+
+@dataclass(frozen=True)
+class Lesson:
+    """Lesson to run; only valid as the first message."""
+    cmd:  ClassVar[str] = 'lesson'
+    lane: ClassVar[str] = 'inline'
+    name: str = ''
+
+
+@dataclass(frozen=True)
+class Ping:
+    """Round-trip probe; `t` (the browser's clock) is echoed back."""
+    cmd:  ClassVar[str] = 'ping'
+    lane: ClassVar[str] = 'inline'
+    id: int | str | None = None
+    t:  float | int | None = None
+
+
+@dataclass(frozen=True)
+class Frames:
+    """Newest audio frame header version the browser speaks (see framing.py)."""
+    cmd:  ClassVar[str] = 'frames'
+    lane: ClassVar[str] = 'inline'
+    version: int
+
+
+@dataclass(frozen=True)
+class Clock:
+    """One ping round trip: sent at t0, answered at t1 (browser clock), stamped server_t."""
+    cmd:  ClassVar[str] = 'clock'
+    lane: ClassVar[str] = 'inline'
+    t0:       float | int
+    server_t: float | int
+    t1:       float | int
+
+
+@dataclass(frozen=True)
+class Played:
+    """First frame of a reply: its send stamp, and when it arrived and will be heard (browser clock)."""
+    cmd:  ClassVar[str] = 'played'
+    lane: ClassVar[str] = 'inline'
+    generation: int
+    sent:       float | int
+    received:   float | int
+    played:     float | int
+
+
+COMMANDS = {kind.cmd: kind for kind in (Text, Codec, Audio, Lesson, Ping, Frames, Clock, Played)}
+
+
+def _is_a(value, annotation):
+    if isinstance(annotation, types.UnionType):
+        return any(_is_a(value, arg) for arg in annotation.__args__)
+    if isinstance(annotation, types.GenericAlias):
+        # list[X]: a list of X
+        (item,) = annotation.__args__
+        return isinstance(value, annotation.__origin__) and all(_is_a(v, item) for v in value)
+    if annotation is type(None):
+        return value is None
+    if annotation in (int, float) and isinstance(value, bool):
+        return False
+    return isinstance(value, annotation)
+
+
+def parse_command(msg):
+    """The command in the JSON text frame `msg`; CommandError if it isn't one."""
+    try:
+        obj = json.loads(msg)
+    except json.JSONDecodeError:
+        raise CommandError('not JSON') from None
+    if not isinstance(obj, dict):
+        raise CommandError('not a JSON object')
+    kind = COMMANDS.get(obj.get('cmd'))
+    if kind is None:
+        raise CommandError(f'unknown command {obj.get("cmd")!r}')
+    args = {}
+    for f in fields(kind):
+        if f.name in obj:
+            if not _is_a(obj[f.name], f.type):
+                raise CommandError(f'{kind.cmd}: bad {f.name} {obj[f.name]!r}')
+            args[f.name] = obj[f.name]
+    try:
+        return kind(**args)
+    except TypeError:
+        missing = [f.name for f in fields(kind) if f.name not in args]
+        raise CommandError(f'{kind.cmd}: missing {", ".join(missing)}') from None
+
+
+class CommandDispatcher:
+    def __init__(self):
+        self._handlers = {}            # command class -> coroutine function
+        self._lane     = asyncio.Queue()
+
+        self.inline = 0
+        self.queued = 0
+        self.errors = 0
+
+    def on(self, kind, handler):
+        """Run `await handler(command)` for commands of class `kind`."""
+        self._handlers[kind] = handler
+
+    async def dispatch(self, msg):
+        """Parse one text frame and run or queue its command; CommandError if invalid."""
+        try:
+            command = parse_command(msg)
+            handler = self._handlers.get(type(command))
+            if handler is None:
+                raise CommandError(f'{command.cmd}: not accepted here')
+        except CommandError:
+            self.errors += 1
+            raise
+        if command.lane == 'inline':
+            self.inline += 1
+            await handler(command)
+        else:
+            self.queued += 1
+            self._lane.put_nowait((handler, command))
+
+    async def run(self):
+        """Serve the control lane until cancelled."""
+        while True:
+            handler, command = await self._lane.get()
+            await handler(command)
+
+    def stats(self):
+        return {
+            'commands_inline': self.inline,
+            'commands_queued': self.queued,
+            'command_errors':  self.errors,
+        }
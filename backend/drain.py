@@ -0,0 +1,72 @@
+# drain.py
+# -*- coding: utf-8 -*-
+"""
+Graceful drain of the sessions running in one server process.
+
+On shutdown the server stops accepting connections and turns the admission
+queue away, then `SessionDrain.run()` asks every running session to wind
+down: each gets `drain(timeout)` with the time left until the common
+deadline. A session tells its browser, lets the reply in progress finish and
+closes on its own, which flushes its recording like any other session end.
+Sessions that start while the drain runs (admitted just before it began) are
+asked to wind down as soon as they register.
+
+Whatever is still open at the deadline is left to the caller, which closes
+the remaining connections outright.
+"""
+import asyncio
+
+
+class SessionDrain:
+    """The sessions of this process; `session.drain(timeout)` is awaited on shutdown."""
+
+    def __init__(self, timeout=30.0):
+        self.timeout  = timeout
+        self.sessions = set()
+        self.deadline = None   # loop time by which every session should be gone
+        self._idle    = asyncio.Event()
+        self._idle.set()
+        self._tasks   = set()
+
+        self.drained  = 0   # sessions that wound down before the deadline
+
+    @property
+    def draining(self):
+        return self.deadline is not None
+
+    def add(self, session):
+        self.sessions.add(session)
+        self._idle.clear()
+        if self.draining:
+            self._wind_down(session)
+
+    def discard(self, session):
+        self.sessions.discard(session)
+        if not self.sessions:
+            self._idle.set()
+
+    async def run(self):
+        """Wind every session down; True if all ended before the deadline."""
+        self.deadline = asyncio.get_running_loop().time() + self.timeout
+        for session in list(self.sessions):
+            self._wind_down(session)
+        try:
+            async with asyncio.timeout_at(self.deadline):
+                await self._idle.wait()
+            return True
+        except TimeoutError:
+            return False
+
+    def _wind_down(self, session):
+        remaining = max(0.0, self.deadline - asyncio.get_running_loop().time())
+        task = asyncio.create_task(self._drain_one(session, remaining))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _drain_one(self, session, timeout):
+        try:
+            await session.drain(timeout)
+        except Exception as e:
+            print(f'[Warning] drain of {session.session_id} failed: {e!r}')
+        else:
+            self.drained += 1
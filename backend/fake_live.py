@@ -0,0 +1,233 @@
+# fake_live.py
+# -*- coding: utf-8 -*-
+"""
+Local stand-in for Gemini LiveConnect.
+
+Speaks the part of the `client.aio.live.connect(...)` session surface that the
+backend uses (`send_realtime_input`, `send_client_content`, `receive()`) and
+streams canned 24 kHz PCM back, so the server can be load-tested without
+network access or API quota.
+
+app.py picks this up when LIVE_FAKE=1 is set. Behaviour is tuned with the
+FAKE_* environment variables (see `FakeOptions.from_env`).
+"""
+import array
+import asyncio
+import math
+import os
+import random
+import time
+import wave
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+
+from websockets.exceptions import ConnectionClosedError
+from websockets.frames import Close
+
+RECV_SR = 24000
+SEND_SR = 16000
+
+
+@dataclass
+class FakeOptions:
+    connect_ms: float     = 150.0   # handshake time for live.connect()
+    think_ms: float       = 400.0   # delay between end of user turn and first audio
+    chunk_ms: float       = 40.0    # duration of each streamed model chunk
+    reply_ms: float       = 3000.0  # total duration of one model reply
+    speed: float          = 2.0     # how much faster than real time replies stream
+    turn_after_ms: float  = 3000.0  # user audio that counts as one complete turn
+    interrupt_rate: float = 0.0     # chance a new user turn interrupts a running reply
+    pcm_wav: str          = ''      # optional 24 kHz mono Int16 WAV to play instead of a tone
+    drop_after_s: float   = 0.0     # simulate an upstream drop this long after connect (0 = never)
+
+    @classmethod
+    def from_env(cls, env=os.environ):
+        def num(name, default):
+            return float(env.get(name, default))
+        return cls(
+            connect_ms=num('FAKE_CONNECT_MS', cls.connect_ms),
+            think_ms=num('FAKE_THINK_MS', cls.think_ms),
+            chunk_ms=num('FAKE_CHUNK_MS', cls.chunk_ms),
+            reply_ms=num('FAKE_REPLY_MS', cls.reply_ms),
+            speed=num('FAKE_SPEED', cls.speed),
+            turn_after_ms=num('FAKE_TURN_AFTER_MS', cls.turn_after_ms),
+            interrupt_rate=num('FAKE_INTERRUPT_RATE', cls.interrupt_rate),
+            pcm_wav=env.get('FAKE_PCM_WAV', cls.pcm_wav),
+            drop_after_s=num('FAKE_DROP_AFTER_S', cls.drop_after_s),
+        )
+
+
+def canned_pcm(opts):
+    """Return the reply audio as Int16 PCM bytes @24kHz."""
+    if opts.pcm_wav:
+        with wave.open(opts.pcm_wav, 'rb') as w:
+            return w.readframes(w.getnframes())
+    n = int(RECV_SR * opts.reply_ms / 1000)
+    tone = array.array('h', (
+        int(6000 * math.sin(2 * math.pi * 220 * i / RECV_SR)) for i in range(n)
+    ))
+    return tone.tobytes()
+
+
+class FakeTranscription:
+    def __init__(self, text, finished=False):
+        self.text     = text
+        self.finished = finished
+
+
+class FakeServerContent:
+    def __init__(self, turn_complete=False, interrupted=False, input_transcription=None,
+                 output_transcription=None):
+        self.turn_complete = turn_complete
+        self.interrupted   = interrupted
+        self.model_turn    = None
+        self.input_transcription  = input_transcription
+        self.output_transcription = output_transcription
+
+
+class FakeResumptionUpdate:
+    def __init__(self, new_handle):
+        self.new_handle = new_handle
+        self.resumable  = True
+
+
+class FakeMessage:
+    """Mimics the attributes of `types.LiveServerMessage` the backend reads."""
+
+    def __init__(self, data=None, server_content=None, resumption=None):
+        self.data           = data
+        self.text           = None
+        self.server_content = server_content
+        self.session_resumption_update = resumption
+        self.go_away        = None
+        self.usage_metadata = None
+
+
+class FakeLiveSession:
+    def __init__(self, opts, pcm, resumed_from=None, transcribe_in=False, transcribe_out=False):
+        self.opts   = opts
+        self.pcm    = pcm
+        self.resumed_from   = resumed_from
+        self.transcribe_in  = transcribe_in    # as asked for in the LiveConnectConfig
+        self.transcribe_out = transcribe_out
+        self._drop_at = time.monotonic() + opts.drop_after_s if opts.drop_after_s else None
+        self._handles = 0
+        self._out   = asyncio.Queue()
+        self._reply = None
+        self._heard = 0
+        self._turn_bytes  = int(SEND_SR * 2 * opts.turn_after_ms / 1000)
+        self._chunk_bytes = max(2, int(RECV_SR * opts.chunk_ms / 1000) * 2)
+
+        # counters, read by the load-test driver
+        self.audio_in_bytes = 0
+        self.replies        = 0
+        self.interruptions  = 0
+
+    def _check_drop(self):
+        if self._drop_at is not None and time.monotonic() >= self._drop_at:
+            raise ConnectionClosedError(Close(1011, 'fake upstream drop'), None)
+
+    async def send_realtime_input(self, *, audio=None, **kwargs):
+        self._check_drop()
+        if audio is None:
+            return
+        data = audio['data'] if isinstance(audio, dict) else audio.data
+        self.audio_in_bytes += len(data)
+        self._heard += len(data)
+        if self._heard >= self._turn_bytes:
+            self._heard = 0
+            if self.transcribe_in:
+                self._out.put_nowait(FakeMessage(server_content=FakeServerContent(
+                    input_transcription=FakeTranscription('(fake user turn)', finished=True))))
+            self._start_reply()
+
+    async def send_client_content(self, *, turns=None, turn_complete=True):
+        self._check_drop()
+        if turn_complete:
+            self._heard = 0
+            self._start_reply()
+
+    def _start_reply(self):
+        if self._reply and not self._reply.done():
+            if random.random() >= self.opts.interrupt_rate:
+                # model keeps talking; the user turn is ignored
+                return
+            self._reply.cancel()
+            self.interruptions += 1
+            self._out.put_nowait(FakeMessage(server_content=FakeServerContent(interrupted=True)))
+            self._out.put_nowait(FakeMessage(server_content=FakeServerContent(turn_complete=True)))
+        self._reply = asyncio.create_task(self._stream_reply())
+
+    async def _stream_reply(self):
+        await asyncio.sleep(self.opts.think_ms / 1000)
+        self.replies += 1
+        pace = self.opts.chunk_ms / 1000 / max(self.opts.speed, 1e-6)
+        step = self._chunk_bytes
+        chunks = range(0, len(self.pcm), step)
+        words  = f'This is fake reply number {self.replies}.'.split()
+        said   = 0
+        for n, i in enumerate(chunks):
+            self._out.put_nowait(FakeMessage(data=self.pcm[i:i + step]))
+            # spread the reply's words over its audio
+            while self.transcribe_out and said <= n * len(words) // len(chunks):
+                said += 1
+                self._out.put_nowait(FakeMessage(server_content=FakeServerContent(
+                    output_transcription=FakeTranscription(' ' + words[said - 1],
+                                                           finished=said == len(words)))))
+            await asyncio.sleep(pace)
+        self._handles += 1
+        self._out.put_nowait(FakeMessage(resumption=FakeResumptionUpdate(f'fake-{id(self)}-{self._handles}')))
+        self._out.put_nowait(FakeMessage(server_content=FakeServerContent(turn_complete=True)))
+
+    async def receive(self):
+        """Yield messages for one model turn, like `AsyncSession.receive()`."""
+        while True:
+            if self._drop_at is None:
+                msg = await self._out.get()
+            else:
+                try:
+                    msg = await asyncio.wait_for(self._out.get(), max(0.0, self._drop_at - time.monotonic()))
+                except TimeoutError:
+                    self._check_drop()
+                    continue
+            yield msg
+            if msg.server_content and msg.server_content.turn_complete:
+                return
+
+    async def close(self):
+        if self._reply:
+            self._reply.cancel()
+
+
+class FakeLive:
+    def __init__(self, opts):
+        self.opts = opts
+        self.pcm  = canned_pcm(opts)
+        self.sessions_opened = 0
+
+    @asynccontextmanager
+    async def connect(self, *, model, config=None):
+        await asyncio.sleep(self.opts.connect_ms / 1000)
+        self.sessions_opened += 1
+        resumption = getattr(config, 'session_resumption', None)
+        session = FakeLiveSession(
+            self.opts, self.pcm, resumed_from=getattr(resumption, 'handle', None),
+            transcribe_in=getattr(config, 'input_audio_transcription', None) is not None,
+            transcribe_out=getattr(config, 'output_audio_transcription', None) is not None,
+        )
+        try:
+            yield session
+        finally:
+            await session.close()
+
+
+class FakeAio:
+    def __init__(self, opts):
+        self.live = FakeLive(opts)
+
+
+class FakeClient:
+    """Drop-in for `genai.Client()` exposing only `client.aio.live.connect`."""
+
+    def __init__(self, opts=None):
+        self.aio = FakeAio(opts or FakeOptions.from_env())
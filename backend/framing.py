@@ -0,0 +1,71 @@
+# framing.py
+# -*- coding: utf-8 -*-
+"""
+Binary framing of audio on the websocket.
+
+Version 0 (what a client gets unless it asks for more): every downstream
+audio frame starts with a 4-byte little-endian generation number, followed
+by the payload in the negotiated codec; upstream frames are bare payload.
+The generation goes up with every model turn. On barge-in the server sends
+`{"interrupted": true, "generation": N}` and the browser discards any frame
+tagged below N, so audio already in flight (socket buffers, the network,
+the decoder) from the interrupted turn is never played.
+
+Version 1, negotiated with `{"cmd": "frames", "version": 1}`, puts a
+24-byte header on every audio frame in both directions:
+
+    offset  bytes
+    0       1      version (1)
+    1       3      reserved, zero
+    4       4      generation (uint32; 0 upstream)
+    8       4      sequence number (uint32, counted per direction from 0)
+    12      4      samples in the frame, at the sender's rate
+    16      8      timestamp (float64, unix seconds on the sender's clock):
+                   upstream the capture time of the first sample,
+                   downstream the time the frame was sent
+
+All fields are little-endian. Together with the clock handshake (see
+latency.py) this lets the server measure one-way delay, lost and reordered
+frames, and mouth-to-ear latency.
+"""
+import struct
+from typing import NamedTuple
+
+GENERATION = struct.Struct('<I')
+HEADER_SIZE = GENERATION.size
+
+FRAME_VERSION = 1    # newest header version this side speaks
+HEADER_V1     = struct.Struct('<B3xIIId')
+
+
+class FrameHeader(NamedTuple):
+    generation: int
+    seq:        int
+    samples:    int
+    timestamp:  float
+
+
+def tag(generation, payload):
+    """Prefix `payload` with its generation number."""
+    return GENERATION.pack(generation & 0xFFFFFFFF) + payload
+
+
+def untag(frame):
+    """Split a downstream frame into (generation, payload)."""
+    return GENERATION.unpack_from(frame)[0], memoryview(frame)[HEADER_SIZE:]
+
+
+def pack(header, payload):
+    """Prefix `payload` with a version 1 header."""
+    return HEADER_V1.pack(FRAME_VERSION, header.generation & 0xFFFFFFFF,
+                          header.seq & 0xFFFFFFFF, header.samples, header.timestamp) + payload
+
+
+def unpack(frame):
+    """Split a version 1 frame into (FrameHeader, payload); ValueError if it isn't one."""
+    if len(frame) < HEADER_V1.size:
+        raise ValueError(f'frame of {len(frame)} bytes is shorter than its header')
+    version, generation, seq, samples, timestamp = HEADER_V1.unpack_from(frame)
+    if version != FRAME_VERSION:
+        raise ValueError(f'frame header version {version}, expected {FRAME_VERSION}')
+    return FrameHeader(generation, seq, samples, timestamp), memoryview(frame)[HEADER_V1.size:]
@@ -0,0 +1,75 @@
+# handoff.py
+# -*- coding: utf-8 -*-
+"""
+Zero-downtime restart by handing the listening socket to a fresh process.
+
+On SIGHUP the running server starts a copy of itself (same interpreter,
+arguments and environment) that inherits the listening socket, named by
+LISTEN_FD, instead of binding the port. The copy warms up, then reports
+ready by writing to a pipe (READY_FD); only then does the old process stop
+accepting and drain its sessions. The socket stays open throughout, so
+connections arriving mid-restart wait in its backlog instead of being
+refused, and browsers leaving the old process reconnect into a warm one.
+
+If the copy exits or isn't ready within the timeout it is killed, and the
+old process keeps serving. The copy is a child of the old process and
+outlives it; under a process manager, make sure stopping the old process
+doesn't take its children down too (e.g. systemd's KillMode=process).
+"""
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+
+
+def inherited_socket():
+    """The listening socket handed down by a predecessor, or None."""
+    fd = os.environ.pop('LISTEN_FD', None)
+    if fd is None:
+        return None
+    return socket.socket(fileno=int(fd))
+
+
+def notify_ready():
+    """Tell the predecessor, if there is one, that this process is serving."""
+    fd = os.environ.pop('READY_FD', None)
+    if fd is not None:
+        os.write(int(fd), b'1')
+        os.close(int(fd))
+
+
+async def start_successor(sock, timeout=30.0):
+    """
+    Start a copy of this process serving on `sock`. Returns its Popen once
+    it is ready, or None if it exited or didn't get ready within `timeout`.
+    """
+    ready_r, ready_w = os.pipe()
+    env = dict(os.environ, LISTEN_FD=str(sock.fileno()), READY_FD=str(ready_w))
+    try:
+        proc = subprocess.Popen([sys.executable] + sys.argv, env=env,
+                                pass_fds=(sock.fileno(), ready_w))
+    except OSError as e:
+        os.close(ready_r)
+        print(f'[Warning] could not start a successor: {e}')
+        return None
+    finally:
+        # the child holds the write end now; EOF here means it exited
+        os.close(ready_w)
+
+    loop = asyncio.get_running_loop()
+    readable = loop.create_future()
+    loop.add_reader(ready_r, lambda: readable.done() or readable.set_result(None))
+    try:
+        await asyncio.wait_for(readable, timeout)
+        ready = os.read(ready_r, 1) == b'1'
+    except TimeoutError:
+        ready = False
+    finally:
+        loop.remove_reader(ready_r)
+        os.close(ready_r)
+    if not ready:
+        proc.kill()
+        await asyncio.to_thread(proc.wait)
+        return None
+    return proc
@@ -0,0 +1,189 @@
+# ingest.py
+# -*- coding: utf-8 -*-
+"""
+Bounded ingest buffer between `ws_reader` and `send_realtime`.
+
+Replaces `asyncio.Queue(maxsize=5)`. With a plain queue a slow upstream
+blocks `ws_reader`, the browser websocket stops being read and the backlog
+moves into kernel buffers where it grows without bound. `IngestRing` holds
+mic PCM in one preallocated bytearray (chunks are copied in through a
+memoryview, no per-chunk buffers) and applies an explicit policy when it is
+full or the audio is too old:
+
+    block      put() waits for room (the old behaviour, but bounded in bytes)
+    drop-oldest  the oldest queued audio is discarded to make room
+    live-edge  as drop-oldest, and audio older than `max_age_ms` is discarded
+               when it reaches the head, so upstream stays close to real time
+
+Control packets (no 'data', e.g. audio_stream_end) are never dropped and
+keep their place in the stream. The get/get_nowait/empty/qsize surface
+matches asyncio.Queue, so `ChunkCoalescer` works on top of it unchanged.
+"""
+import asyncio
+import time
+from collections import deque
+
+POLICIES = ('block', 'drop-oldest', 'live-edge')
+
+
+class IngestRing:
+    def __init__(self, capacity_ms=2000.0, policy='live-edge', max_age_ms=1000.0,
+                 sample_rate=16000, sampwidth=2, mime_type='audio/pcm'):
+        if policy not in POLICIES:
+            raise ValueError(f'unknown ingest policy {policy!r}; expected one of {POLICIES}')
+        self.policy        = policy
+        self.max_age       = max_age_ms / 1000
+        self.bytes_per_sec = sample_rate * sampwidth
+        self.capacity      = int(capacity_ms / 1000 * self.bytes_per_sec)
+        self.mime_type     = mime_type
+        self._buf          = bytearray(self.capacity)
+        self._view         = memoryview(self._buf)
+        self._entries      = deque()   # (offset, length, enqueued_at) or (None, pkt, enqueued_at)
+        self._tail         = 0         # next write offset
+        self._used         = 0         # audio bytes queued
+        self._readable     = asyncio.Event()
+        self._writable     = asyncio.Event()
+        self._writable.set()
+
+        self.dropped_chunks = 0   # discarded to make room
+        self.dropped_bytes  = 0
+        self.late_chunks    = 0   # discarded for being older than max_age
+        self.late_bytes     = 0
+        self.blocked        = 0   # put() calls that had to wait
+
+    # — producer side —
+
+    async def put(self, pkt):
+        data = pkt.get('data')
+        if data is None:
+            self._push_control(pkt)
+            return
+        if self.policy == 'block':
+            n = min(len(data), self.capacity)
+            if self._alloc(n) is None:
+                self.blocked += 1
+                while self._alloc(n) is None:
+                    self._writable.clear()
+                    await self._writable.wait()
+        self.put_nowait(pkt)
+
+    def put_nowait(self, pkt):
+        """Queue a packet without waiting, dropping old audio if it doesn't fit."""
+        data = pkt.get('data')
+        if data is None:
+            self._push_control(pkt)
+            return
+        if len(data) > self.capacity:
+            # keep the newest audio that fits
+            self._drop(len(data) - self.capacity, late=False)
+            data = memoryview(data)[-self.capacity:]
+        n = len(data)
+        offset = self._alloc(n)
+        while offset is None:
+            self._drop_oldest()
+            offset = self._alloc(n)
+        self._view[offset:offset + n] = data
+        self._tail = offset + n
+        self._used += n
+        self._entries.append((offset, n, time.monotonic()))
+        self._readable.set()
+
+    # — consumer side —
+
+    async def get(self):
+        while True:
+            try:
+                return self.get_nowait()
+            except asyncio.QueueEmpty:
+                self._readable.clear()
+                await self._readable.wait()
+
+    def get_nowait(self):
+        if self.policy == 'live-edge':
+            self._expire()
+        if not self._entries:
+            raise asyncio.QueueEmpty
+        offset, n, _ = self._entries.popleft()
+        if offset is None:
+            return n
+        data = bytes(self._view[offset:offset + n])
+        self._release(n)
+        return {'data': data, 'mime_type': self.mime_type}
+
+    def empty(self):
+        return not self._entries
+
+    def qsize(self):
+        return len(self._entries)
+
+    @property
+    def buffered_seconds(self):
+        return self._used / self.bytes_per_sec
+
+    def stats(self):
+        return {
+            'ingest_dropped_bytes': self.dropped_bytes,
+            'ingest_late_bytes':    self.late_bytes,
+            'ingest_blocked':       self.blocked,
+        }
+
+    # — internals —
+
+    def _push_control(self, pkt):
+        self._entries.append((None, pkt, time.monotonic()))
+        self._readable.set()
+
+    def _head(self):
+        """Offset of the oldest queued audio, or None."""
+        for offset, _, _ in self._entries:
+            if offset is not None:
+                return offset
+        return None
+
+    def _alloc(self, n):
+        """Offset where `n` contiguous bytes fit, or None when full."""
+        head = self._head()
+        if head is None:
+            self._tail = 0
+            return 0 if n <= self.capacity else None
+        if self._tail > head or (self._tail == head and self._used == 0):
+            if self.capacity - self._tail >= n:
+                return self._tail
+            # wrap; the unused end of the buffer is skipped
+            return 0 if head >= n else None
+        return self._tail if head - self._tail >= n else None
+
+    def _release(self, n):
+        self._used -= n
+        if self._used == 0:
+            self._tail = 0
+        self._writable.set()
+
+    def _drop_oldest(self):
+        for i, (offset, n, _) in enumerate(self._entries):
+            if offset is not None:
+                del self._entries[i]
+                self.dropped_chunks += 1
+                self.dropped_bytes  += n
+                self._release(n)
+                return
+        raise RuntimeError('ingest buffer full of control packets')
+
+    def _drop(self, n, late):
+        if late:
+            self.late_chunks += 1
+            self.late_bytes  += n
+        else:
+            self.dropped_chunks += 1
+            self.dropped_bytes  += n
+
+    def _expire(self):
+        """Discard audio at the head that is older than max_age."""
+        cutoff = time.monotonic() - self.max_age
+        while self._entries:
+            offset, n, enqueued_at = self._entries[0]
+            if offset is None or enqueued_at >= cutoff:
+                return
+            self._entries.popleft()
+            self._drop(n, late=True)
+            self._release(n)
@@ -0,0 +1,90 @@
+# latency.py
+# -*- coding: utf-8 -*-
+"""
+End-to-end timing from timestamped audio frames (framing.py, version 1).
+
+Clock handshake: the browser pings with its clock (`{"cmd": "ping", "t"}`),
+the server answers with its own (`{"pong": {..., "server_t"}}`), and the
+browser reports the whole round trip back as `{"cmd": "clock", "t0",
+"server_t", "t1"}`, t1 being when the pong arrived. As in NTP the offset is
+`server_t - (t0 + t1) / 2`, off by at most half the round trip, so
+`ClockSync` keeps the sample with the shortest round trip of the last few.
+The browser repeats the handshake now and then to follow clock drift.
+
+`FrameTracker` follows the sequence numbers of the browser's frames and,
+once the clock is synced, their one-way delay: arrival time minus the
+capture time of the frame's last sample, moved to the server's clock.
+Mouth-to-ear latency needs no offset at all: the browser reports when it
+played the first frame of each reply, and app.py compares that with the
+capture time of the last speech frame before the reply, both browser time.
+"""
+from collections import deque
+
+
+class ClockSync:
+    """Offset of the server's clock from the browser's, from ping round trips."""
+
+    def __init__(self, window=8):
+        self.samples = deque(maxlen=window)   # (round trip, offset)
+
+    def sample(self, t0, server_t, t1):
+        """One round trip: sent at t0 and answered at t1 (browser), stamped server_t."""
+        if t1 < t0:
+            return
+        self.samples.append((t1 - t0, server_t - (t0 + t1) / 2))
+
+    @property
+    def synced(self):
+        return bool(self.samples)
+
+    @property
+    def offset(self):
+        """Seconds to add to a browser time to get server time."""
+        return min(self.samples)[1]
+
+    @property
+    def rtt(self):
+        return min(self.samples)[0]
+
+
+class FrameTracker:
+    """Sequence gaps and one-way delay of the browser's audio frames."""
+
+    def __init__(self, clock, rate=16000):
+        self.clock    = clock
+        self.rate     = rate    # the browser's capture rate, which `samples` counts in
+        self.expected = 0       # next sequence number
+
+        self.frames    = 0
+        self.lost      = 0
+        self.reordered = 0
+        self.malformed = 0
+        self.delay_max = 0.0
+
+    def received(self, header, at):
+        """
+        Note a frame that arrived at server time `at`. Returns the capture
+        time of its last sample (browser clock) and its one-way delay, or
+        None for the delay before the clock is synced.
+        """
+        self.frames += 1
+        if header.seq >= self.expected:
+            self.lost    += header.seq - self.expected
+            self.expected = header.seq + 1
+        else:
+            # overtaken by a later frame, which counted this one as lost
+            self.reordered += 1
+            self.lost       = max(0, self.lost - 1)
+        captured = header.timestamp + header.samples / self.rate
+        if not self.clock.synced:
+            return captured, None
+        delay = at - (captured + self.clock.offset)
+        self.delay_max = max(self.delay_max, delay)
+        return captured, delay
+
+    def stats(self):
+        return {
+            'frames_lost':      self.lost,
+            'frames_reordered': self.reordered,
+            'frames_malformed': self.malformed,
+        }
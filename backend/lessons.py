@@ -0,0 +1,167 @@
+# lessons.py
+# -*- coding: utf-8 -*-
+"""
+Registry of lesson scenarios, each with its own ready-built LiveConnectConfig.
+
+A lesson is a prompt plus the session settings that go with it (voice,
+context-window compression, model). The registry is loaded once at startup
+and builds every lesson's `LiveConnectConfig` then, so a connection only
+looks its lesson up by name; no config is built or copied per session. The
+configs are shared between sessions and must not be mutated
+(`resume.resumption_config` copies before adding a handle). The session
+pool keys idle sessions by model and config, so it keeps warm sessions per
+lesson.
+
+The built-in lessons can be replaced or extended with a JSON file
+(LESSONS_FILE in app.py), a list of objects with the `Lesson` fields below;
+`prompt_file` may be given instead of `prompt`, relative to the JSON file:
+
+    [{"name": "hotel", "title": "Hotel check-in", "prompt_file": "hotel.txt",
+      "voice": "Puck"}]
+
+The browser picks a lesson with `{"cmd": "lesson", "name": "hotel"}` as its
+first message; otherwise it gets the registry's default.
+"""
+import json
+import os
+from dataclasses import dataclass, field, fields, replace
+
+from google.genai import types
+
+from resume import resumption_config
+
+DEFAULT_MODEL = 'gemini-2.5-flash-preview-native-audio-dialog'
+
+JFK_CHECKIN_PROMPT = """You are an approachable, patient English tutor specializing in beginner Korean speakers. Today’s lesson is a simulated airport check-in at John F. Kennedy International Airport (JFK) where you play the role of Delta Air Lines staff helping a passenger check in for their flight. Make sure you speak very slowly for a beginner to understand what you say. Give a one- to two-second pause between sentences.
+
+1. Set the scene
+– Describe the setting: “You’ve arrived at the departure hall of JFK in Queens, New York. You’re standing at the Delta Air Lines check-in counter in Terminal 2.”
+
+2. Model key phrases
+– Introduce essential expressions in context:
+ - Staff: “Good morning! Welcome to Delta Air Lines. May I see your passport and confirmation code?”
+ - Staff: “How many bags will you be checking today?”
+ - Staff: “Would you like an aisle seat or a window seat with an ocean view?”
+ - Staff: “Here’s your boarding pass. Your gate is C3, and boarding begins at 3:45 PM.”
+
+3. Elicit learner speech
+– Prompt the student to respond step by step:
+ - Tutor: “What would you say in English if you want to change your seat?”
+ - Tutor: “Now ask if there’s a fee for extra baggage.”
+
+4. Expand and vary
+– After each learner attempt, offer synonyms and alternatives:
+
+5. Correct and reinforce
+– Gently correct any pronunciation or grammar issues, then have the learner repeat the improved phrase.
+
+6. Role-play reversal
+– Swap roles: the student becomes the staff and asks you, the passenger, for information (e.g., “How many bags will you be checking?”).
+
+7. Wrap up and review
+– Summarize the key phrases learned and encourage a final mini role-play combining all steps: checking in, choosing a seat, and confirming the boarding details.
+
+Goal: Provide step-by-step guidance through realistic interactions at a Delta Air Lines check-in counter at JFK, building confidence with authentic travel-related English expressions."""
+
+RESTAURANT_PROMPT = "You are a friendly English teacher. Practice ordering food at a restaurant with a Korean learner."
+
+
+@dataclass(frozen=True)
+class Lesson:
+    name: str
+    title: str
+    prompt: str
+    voice: str          = 'Zephyr'
+    model: str          = DEFAULT_MODEL
+    trigger_tokens: int = 25600     # context-window compression starts here...
+    target_tokens: int  = 12800     # ...and slides the window down to this
+    config: types.LiveConnectConfig = field(default=None, compare=False, repr=False)
+
+    def build(self, resume=False, transcribe=()):
+        """This lesson with its LiveConnectConfig built (once, at load time)."""
+        config = types.LiveConnectConfig(
+            response_modalities=['AUDIO'],
+            media_resolution='MEDIA_RESOLUTION_LOW',
+            speech_config=types.SpeechConfig(
+                voice_config=types.VoiceConfig(
+                    prebuilt_voice_config=types.PrebuiltVoiceConfig(voice_name=self.voice)
+                )
+            ),
+            context_window_compression=types.ContextWindowCompressionConfig(
+                trigger_tokens=self.trigger_tokens,
+                sliding_window=types.SlidingWindow(target_tokens=self.target_tokens),
+            ),
+            system_instruction=types.Content(
+                parts=[types.Part.from_text(text=self.prompt)],
+                role='user'
+            ),
+            # text of the 'user' and/or 'model' audio, streamed alongside it
+            input_audio_transcription=types.AudioTranscriptionConfig() if 'user' in transcribe else None,
+            output_audio_transcription=types.AudioTranscriptionConfig() if 'model' in transcribe else None,
+        )
+        if resume:
+            # ask Gemini for resumption handles
+            config = resumption_config(config)
+        return replace(self, config=config)
+
+
+BUILTIN_LESSONS = (
+    Lesson('jfk-checkin', 'Airport check-in at JFK', JFK_CHECKIN_PROMPT),
+    Lesson('restaurant', 'Ordering at a restaurant', RESTAURANT_PROMPT),
+)
+
+
+def read_lessons(path):
+    """Lessons described by the JSON file at `path`."""
+    with open(path, encoding='utf-8') as f:
+        entries = json.load(f)
+    known   = {f.name for f in fields(Lesson)} - {'config'}
+    lessons = []
+    for entry in entries:
+        entry = dict(entry)
+        if 'prompt_file' in entry:
+            prompt_path = os.path.join(os.path.dirname(path), entry.pop('prompt_file'))
+            with open(prompt_path, encoding='utf-8') as f:
+                entry['prompt'] = f.read().strip()
+        unknown = set(entry) - known
+        if unknown:
+            raise ValueError(f'{path}: unknown lesson fields {sorted(unknown)}')
+        entry.setdefault('title', entry.get('name', ''))
+        lessons.append(Lesson(**entry))
+    return lessons
+
+
+class LessonRegistry:
+    """Lessons by name, each with its config built once; `default` serves clients that don't pick."""
+
+    def __init__(self, lessons, default=None, resume=False, transcribe=()):
+        self._lessons = {}
+        for lesson in lessons:
+            # later entries (e.g. from a file) replace built-ins of the same name
+            self._lessons[lesson.name] = lesson.build(resume, transcribe)
+        if not self._lessons:
+            raise ValueError('no lessons')
+        self.default = default or next(iter(self._lessons))
+        if self.default not in self._lessons:
+            raise ValueError(f'default lesson {self.default!r} is not defined')
+
+    @classmethod
+    def load(cls, path='', default=None, resume=False, transcribe=()):
+        """The built-in lessons, plus or overridden by those in the JSON file `path`."""
+        lessons = list(BUILTIN_LESSONS)
+        if path:
+            lessons += read_lessons(path)
+        return cls(lessons, default, resume, transcribe)
+
+    def get(self, name=None):
+        """The lesson called `name` (the default if empty); KeyError if unknown."""
+        return self._lessons[name or self.default]
+
+    def names(self):
+        return list(self._lessons)
+
+    def __iter__(self):
+        return iter(self._lessons.values())
+
+    def __len__(self):
+        return len(self._lessons)
@@ -0,0 +1,25 @@
+# __init__.py
+# -*- coding: utf-8 -*-
+"""
+Headless LiveConnect audio loop shared by the websocket server (app.py), the
+microphone scripts at the repo root and file-driven runs (`python -m liveloop`).
+
+`LiveEngine` owns one session; sources and sinks in drivers.py plug in the
+audio I/O: PyAudio mic and speaker, replay of WAV files and segmented
+recordings, a counting null sink and a capturing sink for replay reports.
+"""
+from .drivers import (CaptureSink, MicSource, NullSink, SegmentSource, Sink, SpeakerSink,
+                      WavSource, pyaudio_engine)
+from .engine import LiveEngine
+
+__all__ = [
+    'CaptureSink',
+    'LiveEngine',
+    'MicSource',
+    'NullSink',
+    'SegmentSource',
+    'Sink',
+    'SpeakerSink',
+    'WavSource',
+    'pyaudio_engine',
+]
@@ -0,0 +1,149 @@
+# __main__.py
+# -*- coding: utf-8 -*-
+"""
+Drive one LiveConnect session from a WAV file, without a browser or a mic:
+
+    LIVE_FAKE=1 python -m liveloop --input ../user_input.wav --speed 0
+
+With LIVE_FAKE set (or --fake) the reply comes from fake_live.py, which makes
+the run deterministic and suitable for benchmarking the engine itself.
+--input also takes a segmented session recording (`recordings/<sid>`, see
+segments.py), replaying what the learner said in that session.
+
+As a regression check (see report.py), save a baseline once and compare
+later runs against it; the exit status is 1 on a regression:
+
+    python -m liveloop --fake --input ../user_input.wav --report base.json
+    python -m liveloop --fake --input ../user_input.wav --baseline base.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+from ingest import IngestRing
+from session_pool import SessionPool
+
+from .drivers import CaptureSink, NullSink, SegmentSource, SpeakerSink, WavSource
+from .engine import LiveEngine
+from .report import InputTracker, build_report, compare, format_report
+
+
+def make_client(fake=False):
+    if fake or os.environ.get('LIVE_FAKE'):
+        from fake_live import FakeClient
+        return FakeClient()
+    from google import genai
+    return genai.Client()  # Make sure GOOGLE_API_KEY is set
+
+
+def session_config(args):
+    """(model, config): a lesson's from lessons.py, or a bare audio session."""
+    if args.lesson:
+        from lessons import LessonRegistry
+        lesson = LessonRegistry.load(args.lessons_file).get(args.lesson)
+        return args.model or lesson.model, lesson.config
+    from google.genai import types
+    from lessons import DEFAULT_MODEL
+    return args.model or DEFAULT_MODEL, types.LiveConnectConfig(response_modalities=['AUDIO'])
+
+
+def open_source(args):
+    kind = WavSource if args.input.lower().endswith('.wav') else SegmentSource
+    return kind(args.input, chunk=args.chunk, speed=args.speed)
+
+
+def wants_report(args):
+    return bool(args.save_audio or args.report or args.baseline)
+
+
+async def replay(args):
+    """Run the session; the report dict when one was asked for, else None."""
+    pool   = SessionPool(make_client(args.fake).aio.live.connect)   # connect on demand
+    if args.output == 'speaker':
+        sink = SpeakerSink()
+    else:
+        sink = CaptureSink() if wants_report(args) else NullSink()
+    model, config = session_config(args)
+    engine = LiveEngine(pool.acquire, model, config, sink=sink,
+                        session_id='replay',
+                        # a file can't fall behind real time: never drop its audio
+                        ingest=IngestRing(policy='block'))
+    sending = []    # the text turn's task, kept until the run ends
+    if args.text:
+        # sent as soon as the session is up, ahead of the file's audio
+        def send_text():
+            if not sending:
+                sending.append(asyncio.create_task(engine.send_text(args.text)))
+        engine.on_connected = send_text
+    source = open_source(args)
+    if isinstance(sink, CaptureSink):
+        source = InputTracker(source)
+    t0 = time.monotonic()
+    try:
+        await engine.run(engine.pump(source, linger=args.linger))
+    finally:
+        for task in sending:
+            task.cancel()   # no-op once it is done
+        failed = [r for r in await asyncio.gather(*sending, return_exceptions=True)
+                  if isinstance(r, Exception)]
+    if failed:
+        raise failed[0]
+    wall = time.monotonic() - t0
+    print(f'connect {engine.connect_s:.2f}s, {engine.turns} turns, '
+          f'{engine.interruptions} interruptions, {wall:.2f}s wall')
+    if isinstance(sink, NullSink):
+        first = 'n/a' if sink.first_audio is None else f'{sink.first_audio - t0:.2f}s'
+        print(f'{sink.bytes / 48000:.2f}s model audio in {sink.chunks} chunks, first after {first}')
+    if isinstance(sink, CaptureSink):
+        if args.save_audio:
+            sink.write_wav(args.save_audio)
+        return build_report(source, sink, engine, t0, wall, args.speed, args.input)
+    return None
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument('--input',  required=True,
+                   help='16 kHz mono Int16 WAV to send, or a segmented recording (recordings/<sid>)')
+    p.add_argument('--output', default='null', choices=['null', 'speaker'])
+    p.add_argument('--speed',  type=float, default=1.0,
+                   help='times real time to send the file at (0 = unthrottled)')
+    p.add_argument('--chunk',  type=int, default=4096, help='samples per chunk')
+    p.add_argument('--linger', type=float, default=2.0,
+                   help='seconds of model silence to wait for after the file ends')
+    p.add_argument('--text',   default='', help='text turn to send first')
+    p.add_argument('--lesson', default='', help='lesson (see lessons.py) to set up the session with')
+    p.add_argument('--lessons-file', default='', help='JSON file with more lessons')
+    p.add_argument('--model',  default='', help="model (default: the lesson's)")
+    p.add_argument('--fake',   action='store_true', help='answer with fake_live.py (as LIVE_FAKE=1)')
+    p.add_argument('--save-audio', default='', help="write the model's audio to this WAV")
+    p.add_argument('--report', default='', help='write per-turn timings to this JSON file')
+    p.add_argument('--baseline', default='', help='report JSON to compare this run against')
+    p.add_argument('--tolerance', type=float, default=0.2,
+                   help='fraction latencies and model audio may deviate from the baseline')
+    args = p.parse_args(argv)
+    if args.output == 'speaker' and wants_report(args):
+        p.error('--save-audio, --report and --baseline need --output null')
+    report = asyncio.run(replay(args))
+    if report is None:
+        return 0
+    print(format_report(report))
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures = compare(report, json.load(f), args.tolerance)
+        for failure in failures:
+            print(f'[Regression] {failure}')
+        if failures:
+            return 1
+        print(f'matches baseline {args.baseline} (tolerance {args.tolerance:.0%})')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,338 @@
+# drivers.py
+# -*- coding: utf-8 -*-
+"""
+Input and output drivers for `LiveEngine`.
+
+Sources are async iterables of Int16 mono PCM chunks at the send rate
+(16 kHz). Sinks receive model audio and turn events; see `Sink` for the
+interface. PyAudio is imported only when a mic or speaker driver is opened,
+so headless users (the websocket server, file replay) don't need PortAudio.
+The mic and speaker run PyAudio in callback mode over fixed-size rings
+(ring.py) instead of a blocking read/write per chunk on a worker thread.
+"""
+import asyncio
+import time
+import wave
+
+from .ring import PcmRing
+
+SAMPWIDTH = 2   # Int16
+
+_pyaudio = None
+
+
+def pyaudio_engine():
+    """Process-wide PyAudio instance, created on first use."""
+    global _pyaudio
+    if _pyaudio is None:
+        import pyaudio
+        _pyaudio = pyaudio.PyAudio()
+    return _pyaudio
+
+
+# — sources —
+
+class MicSource:
+    """
+    Default input device in PyAudio callback mode. The PortAudio thread
+    writes into a `buffer_ms` ring and wakes the event loop once a full
+    `chunk` is waiting; no thread-pool hop per read. If the engine falls
+    behind and the ring fills up, new audio is dropped and counted.
+    """
+
+    def __init__(self, rate=16000, chunk=4096, device=None, frames_per_buffer=320,
+                 buffer_ms=2000.0):
+        self.rate   = rate
+        self.chunk  = chunk
+        self.device = device
+        self.frames_per_buffer = frames_per_buffer
+        self.ring   = PcmRing(max(chunk * SAMPWIDTH, int(rate * SAMPWIDTH * buffer_ms / 1000)))
+        self.stream = None
+        self.overrun_bytes = 0
+
+    async def __aiter__(self):
+        import pyaudio
+        pya   = pyaudio_engine()
+        loop  = asyncio.get_running_loop()
+        ready = asyncio.Event()
+        want  = self.chunk * SAMPWIDTH
+
+        def callback(in_data, frame_count, time_info, status):
+            taken = self.ring.write(in_data)
+            self.overrun_bytes += len(in_data) - taken
+            if self.ring.readable() >= want:
+                loop.call_soon_threadsafe(ready.set)
+            return None, pyaudio.paContinue
+
+        device = self.device
+        if device is None:
+            device = pya.get_default_input_device_info()['index']
+        self.stream = await asyncio.to_thread(
+            pya.open,
+            format=pyaudio.paInt16,
+            channels=1,
+            rate=self.rate,
+            input=True,
+            input_device_index=device,
+            frames_per_buffer=self.frames_per_buffer,
+            stream_callback=callback,
+        )
+        try:
+            while True:
+                while self.ring.readable() < want:
+                    ready.clear()
+                    await ready.wait()
+                yield self.ring.read(want)
+        finally:
+            self.stream.close()
+            if self.overrun_bytes:
+                print(f'[Warning] mic ring overran; dropped '
+                      f'{self.overrun_bytes / SAMPWIDTH / self.rate:.2f}s of audio')
+
+
+class WavSource:
+    """
+    Replay a 16-bit mono WAV in `chunk`-sample blocks, `speed` times faster
+    than real time (1 = real time, 0 = as fast as the engine takes them).
+    """
+
+    def __init__(self, path, rate=16000, chunk=4096, speed=1.0):
+        self.path  = path
+        self.rate  = rate
+        self.chunk = chunk
+        self.speed = speed
+
+    def load(self):
+        """The whole recording as Int16 PCM."""
+        with wave.open(self.path, 'rb') as w:
+            if (w.getframerate(), w.getnchannels(), w.getsampwidth()) != (self.rate, 1, SAMPWIDTH):
+                raise ValueError(f'{self.path}: expected {self.rate} Hz mono Int16, got '
+                                 f'{w.getframerate()} Hz x{w.getnchannels()} '
+                                 f'{8 * w.getsampwidth()}-bit')
+            return w.readframes(w.getnframes())
+
+    async def __aiter__(self):
+        pcm   = self.load()
+        step  = self.chunk * SAMPWIDTH
+        start = time.perf_counter()
+        for i in range(0, len(pcm), step):
+            if self.speed:
+                # schedule against the absolute clock so pacing doesn't drift
+                due = start + i / SAMPWIDTH / self.rate / self.speed
+                await asyncio.sleep(max(0.0, due - time.perf_counter()))
+            yield pcm[i:i + step]
+
+
+class SegmentSource(WavSource):
+    """
+    Replay the learner's side of a segmented recording (`<sid>.seg/.idx`,
+    see segments.py) like a WAV: the user segments in order, with the pauses
+    between them (from their start times) filled with silence.
+    """
+
+    def load(self):
+        from segments import USER, SegmentStore
+        store = SegmentStore(self.path)
+        index = store.index
+        hits  = [i for i in range(len(store)) if index[i]['speaker'] == USER]
+        if not hits:
+            raise ValueError(f'{self.path}: no user audio')
+        rates = {int(index[i]['rate']) for i in hits}
+        if rates != {self.rate}:
+            raise ValueError(f'{self.path}: expected {self.rate} Hz user audio, got {sorted(rates)}')
+        t0  = float(index[hits[0]]['start'])
+        pcm = bytearray()
+        for i in sorted(hits, key=lambda i: float(index[i]['start'])):
+            at = int((float(index[i]['start']) - t0) * self.rate) * SAMPWIDTH
+            if at > len(pcm):
+                pcm += bytes(at - len(pcm))
+            pcm += store.read(i)
+        return bytes(pcm)
+
+
+# — sinks —
+
+class Sink:
+    """Discards everything. Drivers override what they need."""
+
+    async def audio(self, pcm, generation):
+        """Model PCM (24 kHz Int16) of turn `generation`."""
+
+    async def text(self, text):
+        """Text parts of a model turn."""
+
+    async def transcript(self, role, text, turn, finished):
+        """A fragment of the 'user' or 'model' audio transcript of turn `turn`."""
+
+    async def interrupted(self, generation):
+        """The user barged in; audio of turns below `generation` is stale."""
+
+    async def turn_complete(self, generation):
+        """Model turn `generation` finished."""
+
+    async def control(self, obj):
+        """Session notices, e.g. {'reconnecting': True}."""
+
+    async def output(self):
+        """Background delivery task; runs until cancelled."""
+        await asyncio.get_running_loop().create_future()
+
+
+class NullSink(Sink):
+    """Counts model output; for headless and benchmark runs."""
+
+    def __init__(self):
+        self.bytes         = 0
+        self.chunks        = 0
+        self.turns         = 0
+        self.interruptions = 0
+        self.first_audio   = None   # time.monotonic() of the first chunk
+
+    async def audio(self, pcm, generation):
+        if self.first_audio is None:
+            self.first_audio = time.monotonic()
+        self.bytes  += len(pcm)
+        self.chunks += 1
+
+    async def interrupted(self, generation):
+        self.interruptions += 1
+
+    async def turn_complete(self, generation):
+        self.turns += 1
+
+
+class CaptureSink(NullSink):
+    """
+    Keeps the model's audio and when each turn's audio started and ended
+    (time.monotonic), for replay reports; see report.py.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.pcm       = bytearray()
+        self.turn_log  = []     # {'turn', 'start', 'end', 'bytes', 'interrupted'} per model turn
+        self._current  = None
+
+    async def audio(self, pcm, generation):
+        await super().audio(pcm, generation)
+        if self._current is None or self._current['turn'] != generation:
+            self._current = {'turn': generation, 'start': time.monotonic(), 'end': None,
+                             'bytes': 0, 'interrupted': False}
+            self.turn_log.append(self._current)
+        self._current['bytes'] += len(pcm)
+        self.pcm += pcm
+
+    async def interrupted(self, generation):
+        await super().interrupted(generation)
+        if self._current is not None:
+            self._current['interrupted'] = True
+            self._end_turn()
+
+    async def turn_complete(self, generation):
+        await super().turn_complete(generation)
+        self._end_turn()
+
+    def _end_turn(self):
+        if self._current is not None:
+            self._current['end'] = time.monotonic()
+            self._current = None
+
+    def write_wav(self, path, rate=24000):
+        with wave.open(path, 'wb') as w:
+            w.setnchannels(1)
+            w.setsampwidth(SAMPWIDTH)
+            w.setframerate(rate)
+            w.writeframes(self.pcm)
+
+
+class SpeakerSink(Sink):
+    """
+    Play model audio on the default output device in PyAudio callback mode.
+    Model audio is copied into a `buffer_ms` ring that the PortAudio callback
+    drains; underruns play silence. Playback of a turn starts once
+    `prebuffer_ms` is queued, and an interruption empties the ring at the
+    next callback, i.e. within one `frames_per_buffer`.
+    """
+
+    def __init__(self, rate=24000, prebuffer_ms=0.0, log_latency=False,
+                 frames_per_buffer=480, buffer_ms=20000.0):
+        self.rate        = rate
+        self.bytes_per_sec = rate * SAMPWIDTH
+        self.prebuffer   = int(self.bytes_per_sec * prebuffer_ms / 1000)
+        self.log_latency = log_latency
+        self.frames_per_buffer = frames_per_buffer
+        self.ring        = PcmRing(int(self.bytes_per_sec * buffer_ms / 1000))
+        self._min_gen    = 0
+        # ring position to discard up to: the loop moves _flush_to, the callback _flushed
+        self._flush_to   = 0
+        self._flushed    = 0
+        self._playing    = False   # callback side: past the pre-buffer
+        self._turn_done  = False   # play a short reply without waiting for the pre-buffer
+
+        self.underrun_bytes = 0
+
+    async def audio(self, pcm, generation):
+        if generation < self._min_gen:
+            return
+        if self.log_latency:
+            # how long this chunk will wait before it is heard
+            print(f'[Latency] {self.ring.readable() / self.bytes_per_sec * 1000:.1f} ms')
+        self._turn_done = False
+        pcm = memoryview(pcm)
+        while pcm:
+            pcm = pcm[self.ring.write(pcm):]
+            if pcm:
+                # ring full: wait for playback to make room
+                await asyncio.sleep(self.frames_per_buffer / self.rate)
+
+    async def text(self, text):
+        print(text, end='')
+
+    async def interrupted(self, generation):
+        # drop everything queued: it may hold much more audio than has played yet
+        self._min_gen  = generation
+        self._flush_to = self.ring.written()
+
+    async def turn_complete(self, generation):
+        self._turn_done = True
+
+    def _callback(self, in_data, frame_count, time_info, status):
+        want = frame_count * SAMPWIDTH
+        flush_to = self._flush_to
+        if flush_to != self._flushed:
+            self._flushed = flush_to
+            self.ring.skip(flush_to)
+            self._playing = False
+        if not self._playing:
+            queued = self.ring.readable()
+            if queued == 0 or (queued < self.prebuffer and not self._turn_done):
+                return bytes(want), self._continue
+            self._playing = True
+        out = self.ring.read(want)
+        if len(out) < want:
+            # ran dry: pad with silence and pre-buffer again
+            if not self._turn_done:
+                self.underrun_bytes += want - len(out)
+            self._playing = False
+            out += bytes(want - len(out))
+        return out, self._continue
+
+    async def output(self):
+        import pyaudio
+        self._continue = pyaudio.paContinue
+        stream = await asyncio.to_thread(
+            pyaudio_engine().open,
+            format=pyaudio.paInt16,
+            channels=1,
+            rate=self.rate,
+            output=True,
+            frames_per_buffer=self.frames_per_buffer,
+            stream_callback=self._callback,
+        )
+        try:
+            await asyncio.get_running_loop().create_future()
+        finally:
+            stream.close()
+            if self.underrun_bytes:
+                print(f'[Warning] playback ran dry mid-turn for '
+                      f'{self.underrun_bytes / self.bytes_per_sec:.2f}s')
@@ -0,0 +1,366 @@
+# engine.py
+# -*- coding: utf-8 -*-
+"""
+`LiveEngine`: one LiveConnect session driven by pluggable input and output.
+
+Mic PCM handed to `feed()` goes through the bounded ingest buffer (and the
+optional coalescer) into `send_realtime_input`. Model replies are recorded
+and passed to the sink driver together with turn events. A dropped session
+is resumed in place when resumption is on (see resume.py).
+
+Subclasses hook into turn and reconnect events (`on_*` methods) for metrics;
+the websocket server's AudioLoop is one, passing itself as the sink.
+"""
+import asyncio
+import time
+import traceback
+
+from websockets.exceptions import ConnectionClosed
+
+from ingest import IngestRing
+from recorder import NullTrack
+from resume import ReplayBuffer, resumption_config
+
+from .drivers import NullSink
+
+
+class LiveEngine:
+    def __init__(self, acquire, model, config, sink=None, session_id='live',
+                 ingest=None, coalescer=None, wav_in=None, wav_out=None,
+                 resume=False, replay_s=5.0, resume_attempts=3, send_sr=16000):
+        self.acquire     = acquire      # coroutine (model, config) -> lease with .session/.release()
+        self.model       = model
+        self.config      = config
+        self.sink        = sink or NullSink()
+        self.session_id  = session_id
+        self.lease       = None         # lease owning self.session
+        self.session     = None
+        self.ready       = asyncio.Event()   # set once the first session is up
+        self.audio_out_q = ingest or IngestRing(sample_rate=send_sr)
+        self.coalescer   = coalescer
+        self.wav_in      = wav_in or NullTrack()    # what we send *to* Gemini
+        self.wav_out     = wav_out or NullTrack()   # what we get *from* Gemini
+
+        # — turn state (time.monotonic) —
+        self.connect_s     = None
+        self.turn_start    = None   # first model byte of the current turn
+        self.generation    = 0      # model turn number, handed to the sink with each chunk
+        self.turns         = 0
+        self.interruptions = 0
+        self.last_activity = None   # last model message
+
+        # — session resumption —
+        self.resume          = resume
+        self.resume_attempts = resume_attempts
+        self.resume_handle   = None
+        self.replay          = ReplayBuffer(replay_s, sample_rate=send_sr)
+        self._reconnect      = None   # in-flight resume task shared by all loops
+
+    # — input —
+
+    async def feed(self, pcm):
+        """Record one mic chunk (Int16 PCM) and queue it for Gemini."""
+        self.wav_in.write(pcm)
+        await self.audio_out_q.put({'data': pcm, 'mime_type': 'audio/pcm'})
+
+    async def end_audio(self):
+        """Mic paused: let Gemini flush what it buffered."""
+        await self.audio_out_q.put({'audio_stream_end': True})
+
+    async def send_text(self, text):
+        """Send a complete text turn."""
+        await self.with_session(lambda session: session.send_client_content(
+            turns={'role': 'user', 'parts': [{'text': text}]},
+            turn_complete=True,
+        ))
+
+    async def pump(self, source, linger=0.0):
+        """
+        Feed every chunk of the async iterable `source`. When it runs out, end
+        the audio stream and wait for the reply: until no turn is in progress
+        and the model has been quiet for `linger` seconds.
+        """
+        async for pcm in source:
+            await self.feed(pcm)
+        if not linger:
+            return
+        await self.end_audio()
+        await self.settle(linger)
+
+    async def settle(self, quiet):
+        """
+        Wait for the session to go quiet: no turn in progress and no model
+        message for `quiet` seconds (counted from connecting at the earliest).
+        """
+        await self.ready.wait()
+        quiet_since = time.monotonic()
+        while True:
+            await asyncio.sleep(min(0.1, quiet))
+            last = max(quiet_since, self.last_activity or 0)
+            if self.turn_start is None and time.monotonic() - last >= quiet:
+                return
+
+    # — session —
+
+    async def run(self, reader):
+        """
+        Check out a session and stream until `reader` (the coroutine feeding
+        input, e.g. `self.pump(source)`), the sink or the session finishes.
+        The reader and the sink start while the session is still connecting:
+        input is buffered and calls that need the session wait for it.
+        """
+        try:
+            # Run all loops in parallel; cancel all if any exits/errors
+            async with asyncio.TaskGroup() as tg:
+                tasks = [
+                    tg.create_task(reader),
+                    tg.create_task(self.sink.output()),
+                    tg.create_task(self.stream()),
+                ]
+                await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for t in tasks:
+                    t.cancel()
+        finally:
+            # may be a resumed session by now
+            if self.lease is not None:
+                self.lease.release()
+
+    async def stream(self):
+        """Connect, then send and receive until either direction finishes."""
+        t0 = time.monotonic()
+        self.lease     = await self.acquire(self.model, self.config)
+        self.session   = self.lease.session
+        self.connect_s = time.monotonic() - t0
+        self.ready.set()
+        self.on_connected()
+        async with asyncio.TaskGroup() as tg:
+            tasks = [
+                tg.create_task(self.send_realtime()),
+                tg.create_task(self.receive_and_forward()),
+            ]
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for t in tasks:
+                t.cancel()
+
+    async def send_realtime(self):
+        """
+        Pull queued mic chunks and send them into Gemini LiveConnect.
+        """
+        while True:
+            if self.coalescer:
+                pkt = await self.coalescer.next_payload(self.audio_out_q)
+            else:
+                pkt = await self.audio_out_q.get()
+            try:
+                if pkt.get('audio_stream_end'):
+                    await self.with_session(
+                        lambda session: session.send_realtime_input(audio_stream_end=True))
+                else:
+                    await self.with_session(
+                        lambda session: session.send_realtime_input(audio=pkt))
+                    self.replay.append(pkt['data'])
+            except ConnectionClosed:
+                # upstream gone for good; receive_and_forward reports it
+                return
+
+    async def with_session(self, call):
+        """Run `call(session)`, resuming once and retrying if the session dropped under it."""
+        await self.ready.wait()
+        while True:
+            session = self.session
+            try:
+                return await call(session)
+            except ConnectionClosed as e:
+                if not await self.reconnect(session, e):
+                    raise
+
+    async def reconnect(self, failed, reason):
+        """
+        Replace the dropped session `failed` with a resumed one, keeping the
+        sink attached. Returns False if the session can't be resumed.
+        """
+        if self.session is not failed:
+            # another loop already replaced it
+            return True
+        if self._reconnect is None:
+            self._reconnect = asyncio.create_task(self._resume(reason))
+        return await asyncio.shield(self._reconnect)
+
+    async def _resume(self, reason):
+        try:
+            if not self.resume or not self.resume_handle:
+                return False
+            print(f'[{self.session_id}] LiveConnect dropped ({reason}); resuming')
+            t0 = time.monotonic()
+            try:
+                await self.sink.control({'reconnecting': True})
+            except ConnectionClosed:
+                return False
+            config = resumption_config(self.config, self.resume_handle)
+            for attempt in range(self.resume_attempts):
+                try:
+                    lease = await self.acquire(self.model, config)
+                    break
+                except Exception as e:
+                    print(f'[Warning] resume attempt {attempt + 1} failed: {e}')
+                    await asyncio.sleep(0.5 * 2 ** attempt)
+            else:
+                await self._reconnect_failed()
+                return False
+
+            old, self.lease = self.lease, lease
+            self.session    = lease.session
+            old.release()
+            # audio the handle doesn't cover yet
+            try:
+                for chunk in self.replay.pending():
+                    await self.session.send_realtime_input(
+                        audio={'data': chunk, 'mime_type': 'audio/pcm'})
+            except ConnectionClosed as e:
+                print(f'[Warning] resumed session dropped during replay: {e}')
+                await self._reconnect_failed()
+                return False
+
+            self.on_reconnected(time.monotonic() - t0)
+            try:
+                await self.sink.control({'reconnected': True})
+            except ConnectionClosed:
+                pass
+            return True
+        finally:
+            self._reconnect = None
+
+    async def _reconnect_failed(self):
+        """Tell the sink, which was told {'reconnecting': True}, that it is over."""
+        self.on_reconnect_failed()
+        try:
+            await self.sink.control({'reconnect_failed': True})
+        except ConnectionClosed:
+            pass
+
+    # — output —
+
+    async def receive_and_forward(self):
+        """
+        Read Gemini's replies, record them and hand them to the sink. A
+        dropped LiveConnect session is resumed in place when possible.
+        """
+        while True:
+            session = self.session
+            try:
+                if await self.forward_turns(session) != 'go_away':
+                    # the sink went away
+                    return
+                reason = 'go_away'
+            except ConnectionClosed as e:
+                reason = e
+            except Exception as e:
+                # any other unexpected exception
+                traceback.print_exception(e)
+                return
+            if not await self.reconnect(session, reason):
+                # transient internal error from Gemini Live API; swallow and let the caller clean up
+                print(f"[Warning] LiveConnect connection closed: {reason}")
+                return
+
+    async def forward_turns(self, session):
+        """
+        Forward model turns from `session` until the sink goes away (returns
+        None) or Gemini announces it will disconnect ('go_away').
+        """
+        while True:
+            turn = session.receive()
+            async for response in turn:
+                self.last_activity = time.monotonic()
+                update = getattr(response, "session_resumption_update", None)
+                if update and update.resumable and update.new_handle:
+                    self.resume_handle = update.new_handle
+                    self.replay.mark()
+                if getattr(response, "go_away", None) is not None:
+                    # connection ends soon; resume on a fresh one now
+                    return 'go_away'
+
+                content = getattr(response, "server_content", None)
+                if content and (content.input_transcription or content.output_transcription):
+                    try:
+                        await self.forward_transcripts(content)
+                    except ConnectionClosed:
+                        return
+
+                # Detect server‐side VAD interruption
+                if content:
+                    if content.interrupted:
+                        self.interruptions += 1
+                        started = self.turn_start
+                        self.end_turn()
+                        try:
+                            # audio below the next turn's generation is stale
+                            await self.sink.interrupted(self.generation + 1)
+                        except ConnectionClosed:
+                            return
+                        self.on_interrupted(started)
+                        # skip any further data in this turn
+                        break
+
+                if response.data:
+                    if self.turn_start is None:
+                        self.start_turn()
+                    # record to the response track
+                    self.wav_out.write(response.data)
+                    try:
+                        await self.sink.audio(response.data, self.generation)
+                    except ConnectionClosed:
+                        # Client closed the WebSocket (1005); stop sending
+                        return
+                elif text := response.text:
+                    await self.sink.text(text)
+            self.end_turn()
+            try:
+                await self.sink.turn_complete(self.generation)
+            except ConnectionClosed:
+                return
+
+    async def forward_transcripts(self, content):
+        """
+        Hand transcript fragments to the sink. The user's words belong to the
+        next model turn; the model's to the current one, or the next if its
+        first audio hasn't arrived yet.
+        """
+        if (part := content.input_transcription) and part.text:
+            await self.sink.transcript('user', part.text, self.generation + 1, bool(part.finished))
+        if (part := content.output_transcription) and part.text:
+            turn = self.generation if self.turn_start is not None else self.generation + 1
+            await self.sink.transcript('model', part.text, turn, bool(part.finished))
+
+    def start_turn(self):
+        """First model byte of a turn."""
+        self.generation += 1
+        self.turns      += 1
+        self.turn_start  = time.monotonic()
+        self.on_turn_start()
+
+    def end_turn(self):
+        """Turn complete or interrupted."""
+        if self.turn_start is not None:
+            self.on_turn_end(time.monotonic() - self.turn_start)
+            self.turn_start = None
+
+    # — hooks for subclasses —
+
+    def on_connected(self):
+        pass
+
+    def on_turn_start(self):
+        pass
+
+    def on_turn_end(self, duration):
+        pass
+
+    def on_interrupted(self, started):
+        """`started` is when the interrupted turn's first audio arrived (or None)."""
+
+    def on_reconnected(self, seconds):
+        pass
+
+    def on_reconnect_failed(self):
+        pass
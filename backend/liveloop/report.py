@@ -0,0 +1,142 @@
+# report.py
+# -*- coding: utf-8 -*-
+"""
+Replay reports: per-turn timings of a file-driven run, and a comparison
+against a stored baseline for CI.
+
+`InputTracker` wraps a source and notes when each chunk went to the engine,
+where it sits in the file and whether it holds speech (vad.py's frame
+classifier). `build_report` pairs that with the turns a `CaptureSink` saw:
+a turn's response time runs from the last speech chunk sent before the
+model started talking to the model's first audio chunk.
+
+`compare` checks a report against a baseline: latencies may grow by the
+tolerance (plus a few milliseconds of scheduling slack), the amount of
+model audio may change by the tolerance either way, and the turn and
+interruption counts must match. Timings only compare between runs at the
+same speed against the same model; the fake model (LIVE_FAKE=1) makes them
+repeatable.
+"""
+import time
+
+from vad import VoiceGate
+
+from .drivers import SAMPWIDTH
+
+SLACK_MS  = 20.0    # absolute headroom on latencies, for scheduler jitter
+OUT_BYTES = 48000   # bytes per second of model audio (24 kHz Int16)
+
+
+class InputTracker:
+    """Pass a source through, noting (sent at, file position s, speech) per chunk."""
+
+    def __init__(self, source, rate=16000):
+        self.source = source
+        self.rate   = rate
+        self.chunks = []
+        self._gate  = VoiceGate(sample_rate=rate)
+
+    async def __aiter__(self):
+        pos = 0
+        async for pcm in self.source:
+            pos += len(pcm)
+            self.chunks.append((time.monotonic(), pos / SAMPWIDTH / self.rate,
+                                bool(self._gate.speech_frames(pcm).any())))
+            yield pcm
+
+    def cue(self, t):
+        """(sent at, file position) of the last speech chunk sent before `t`, or None."""
+        last = None
+        for sent, pos, speech in self.chunks:
+            if sent > t:
+                break
+            if speech:
+                last = (sent, pos)
+        return last
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def build_report(tracker, sink, engine, t0, wall, speed, input_path):
+    """JSON-ready report of one replay; `sink` is a CaptureSink, `t0` the run's start."""
+    turns = []
+    for entry in sink.turn_log:
+        cue = tracker.cue(entry['start'])
+        end = entry['end'] if entry['end'] is not None else entry['start']
+        turns.append({
+            'turn':        entry['turn'],
+            'input_s':     round(cue[1], 2) if cue else None,
+            'response_ms': round((entry['start'] - cue[0]) * 1000, 1) if cue else None,
+            'start_s':     round(entry['start'] - t0, 3),
+            'duration_s':  round(end - entry['start'], 3),
+            'audio_s':     round(entry['bytes'] / OUT_BYTES, 3),
+            'interrupted': entry['interrupted'],
+        })
+    latencies = [t['response_ms'] for t in turns if t['response_ms'] is not None]
+    return {
+        'input':  input_path,
+        'speed':  speed,
+        'summary': {
+            'turns':           len(turns),
+            'interruptions':   engine.interruptions,
+            'connect_s':       round(engine.connect_s, 3),
+            'wall_s':          round(wall, 3),
+            'model_audio_s':   round(sink.bytes / OUT_BYTES, 3),
+            'response_p50_ms': _percentile(latencies, 0.5),
+            'response_p90_ms': _percentile(latencies, 0.9),
+            'response_max_ms': max(latencies) if latencies else None,
+        },
+        'turns': turns,
+    }
+
+
+def _slower(value, base, tolerance):
+    return value is not None and base is not None and value > base * (1 + tolerance) + SLACK_MS
+
+
+def _changed(value, base, tolerance):
+    return abs(value - base) > abs(base) * tolerance
+
+
+def compare(report, baseline, tolerance=0.2):
+    """Regressions of `report` against `baseline`, as a list of messages (empty = pass)."""
+    failures = []
+    if report['speed'] != baseline['speed']:
+        failures.append(f'speed {report["speed"]} vs baseline {baseline["speed"]}: not comparable')
+        return failures
+    now, base = report['summary'], baseline['summary']
+    for key in ('turns', 'interruptions'):
+        if now[key] != base[key]:
+            failures.append(f'{key}: {now[key]} (baseline {base[key]})')
+    for key in ('response_p50_ms', 'response_p90_ms', 'response_max_ms'):
+        if _slower(now[key], base[key], tolerance):
+            failures.append(f'{key}: {now[key]} ms (baseline {base[key]} ms)')
+    if _changed(now['model_audio_s'], base['model_audio_s'], tolerance):
+        failures.append(f'model_audio_s: {now["model_audio_s"]} (baseline {base["model_audio_s"]})')
+    for turn, old in zip(report['turns'], baseline['turns']):
+        if _slower(turn['response_ms'], old['response_ms'], tolerance):
+            failures.append(f'turn {turn["turn"]} response: {turn["response_ms"]} ms '
+                            f'(baseline {old["response_ms"]} ms)')
+    return failures
+
+
+def format_report(report):
+    """The report as a table of turns plus a summary line."""
+    lines = [f'{"turn":>4} {"input s":>8} {"response ms":>12} {"audio s":>8} {"took s":>7}']
+    for t in report['turns']:
+        input_s  = '-' if t['input_s'] is None else f'{t["input_s"]:.2f}'
+        response = '-' if t['response_ms'] is None else f'{t["response_ms"]:.0f}'
+        mark     = '  (interrupted)' if t['interrupted'] else ''
+        lines.append(f'{t["turn"]:>4} {input_s:>8} {response:>12} {t["audio_s"]:>8.2f} '
+                     f'{t["duration_s"]:>7.2f}{mark}')
+    s = report['summary']
+    p50 = 'n/a' if s['response_p50_ms'] is None else f'{s["response_p50_ms"]:.0f} ms'
+    p90 = 'n/a' if s['response_p90_ms'] is None else f'{s["response_p90_ms"]:.0f} ms'
+    lines.append(f'{s["turns"]} turns, {s["interruptions"]} interruptions, response p50 {p50}, '
+                 f'p90 {p90}, {s["model_audio_s"]:.2f}s model audio, {s["wall_s"]:.2f}s wall')
+    return '\n'.join(lines)
@@ -0,0 +1,59 @@
+# ring.py
+# -*- coding: utf-8 -*-
+"""
+Fixed-size byte ring shared between the event loop and a PortAudio callback.
+
+One side only ever writes and the other only ever reads. Each side advances
+its own running byte counter, and a plain int assignment is atomic under the
+GIL, so no lock is needed and neither side ever waits on the other.
+"""
+
+
+class PcmRing:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._buf     = bytearray(capacity)
+        self._view    = memoryview(self._buf)
+        self._r       = 0   # total bytes read; only the reader moves it
+        self._w       = 0   # total bytes written; only the writer moves it
+
+    def readable(self):
+        return self._w - self._r
+
+    def writable(self):
+        return self.capacity - (self._w - self._r)
+
+    # — writer side —
+
+    def write(self, data):
+        """Copy as much of `data` as fits; returns the number of bytes taken."""
+        data = memoryview(data)
+        n = min(len(data), self.writable())
+        if n:
+            pos  = self._w % self.capacity
+            head = min(n, self.capacity - pos)
+            self._view[pos:pos + head] = data[:head]
+            if n > head:
+                self._view[:n - head] = data[head:n]
+            self._w += n
+        return n
+
+    # — reader side —
+
+    def read(self, n):
+        """Up to `n` bytes, oldest first."""
+        n = min(n, self.readable())
+        pos  = self._r % self.capacity
+        head = min(n, self.capacity - pos)
+        out  = bytes(self._view[pos:pos + head])
+        if n > head:
+            out += self._view[:n - head]
+        self._r += n
+        return out
+
+    def written(self):
+        return self._w
+
+    def skip(self, upto=None):
+        """Discard what was written before the writer reached `upto` (default: everything)."""
+        self._r = self._w if upto is None else max(self._r, min(upto, self._w))
@@ -0,0 +1,382 @@
+# loadtest.py
+# -*- coding: utf-8 -*-
+"""
+Concurrent-session load test for the websocket server in app.py.
+
+Opens N browser-like websocket clients, sends the same "Let's begin!" text
+turn as frontend/app.js, then pushes 16 kHz Int16 frames at real-time pace
+(alternating speech and silence; --rate sends native-rate PCM, e.g. 48000,
+for the server to resample). Like the browser, clients ask for timestamped
+frames (framing.py, version 1) and report clock samples and when replies
+arrive, so the server's one-way delay and mouth-to-ear metrics see load too
+(--frames 0 sends bare frames). Reports first-audio latency, event-loop lag,
+throughput and memory per session.
+
+By default the server is started in-process (on its own thread and event
+loop) against the fake LiveConnect session from fake_live.py, so no API key
+or network is needed:
+
+    python loadtest.py --sessions 50 --duration 30
+
+Point it at an already running server instead with --url (event-loop lag and
+memory are then not available). Use --json to get a machine-readable report
+for regression checks.
+"""
+import argparse
+import array
+import asyncio
+import json
+import math
+import os
+import resource
+import sys
+import threading
+import time
+
+import websockets
+from websockets.exceptions import ConnectionClosed
+
+from audio_codec import available_codecs
+from framing import FRAME_VERSION, FrameHeader, pack, unpack, untag
+
+SEND_SR    = 16000
+FRAME_SIZE = 4096   # samples per frame, matches the ScriptProcessor buffer in app.js
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[idx]
+
+
+def rss_bytes():
+    """Current resident set size of this process."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        # ru_maxrss is a high-water mark (KiB on Linux, bytes on macOS)
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def make_frames(frame_size, rate=SEND_SR):
+    """One speech-like frame (tone) and one silent frame of Int16 PCM."""
+    tone = array.array('h', (
+        int(8000 * math.sin(2 * math.pi * 180 * i / rate)) for i in range(frame_size)
+    ))
+    return tone.tobytes(), bytes(frame_size * 2)
+
+
+class LagSampler:
+    """Measures how late the event loop wakes up from a short sleep."""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.samples  = []
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            t0 = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - t0 - self.interval))
+
+
+class InProcessServer:
+    """Runs app.handler on a dedicated thread with its own event loop."""
+
+    def __init__(self, host, port):
+        self.host    = host
+        self.port    = port
+        self.lag     = LagSampler()
+        self._ready  = threading.Event()
+        self._loop   = None
+        self._stop   = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        os.environ.setdefault('LIVE_FAKE', '1')
+        self._thread.start()
+        self._ready.wait()
+
+    def stop(self):
+        self._loop.call_soon_threadsafe(self._stop.set)
+        self._thread.join()
+
+    def _run(self):
+        asyncio.run(self._serve())
+
+    async def _serve(self):
+        import app  # imported here so LIVE_FAKE is seen at import time
+
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        lag_task   = asyncio.create_task(self.lag.run())
+        async with websockets.serve(app.handler, self.host, self.port):
+            self._ready.set()
+            await self._stop.wait()
+        lag_task.cancel()
+
+
+class ClientStats:
+    def __init__(self):
+        self.first_audio = None   # seconds from text turn to first PCM frame
+        self.bytes_up    = 0
+        self.bytes_down  = 0
+        self.frames_up   = 0
+        self.frames_down = 0
+        self.interrupted = 0
+        self.stale       = 0      # frames from an interrupted generation
+        self.queued      = False  # had to wait for a session slot
+        self.wait        = None   # seconds in the admission queue
+        self.rejected    = None   # why the server turned us away
+        self.drained     = False  # closed by a server shutdown (1012)
+        self.pings       = []     # round trips of ping commands, seconds
+        self.error       = None
+
+
+def encode_frames(codec_name, frames):
+    """
+    Pre-encode the canned frames; each becomes a list of websocket messages,
+    as (payload, samples) pairs.
+    """
+    if codec_name == 'pcm':
+        return [[(f, len(f) // 2)] for f in frames]
+    from audio_codec import CODECS
+    # client side of the link: the encoder runs at the mic rate
+    codec = CODECS[codec_name](SEND_SR, 24000)
+    return [[(m, codec.samples(m)) for m in codec.encode(f) + codec.flush()] for f in frames]
+
+
+async def run_client(url, duration, frame_size, talk_s, listen_s, codec, rate, lesson, ping_s,
+                     frames, stats):
+    speech, silence = encode_frames(codec, make_frames(frame_size, rate))
+    period = frame_size / rate
+    try:
+        async with websockets.connect(url, max_size=None) as ws:
+            # wait for a session slot; the server may queue or reject us
+            while True:
+                ctrl = json.loads(await ws.recv())
+                if 'queue' in ctrl:
+                    stats.queued = True
+                elif 'rejected' in ctrl:
+                    stats.rejected = ctrl['rejected']
+                    return
+                elif ctrl.get('admitted'):
+                    stats.wait = ctrl.get('waited', 0.0)
+                    break
+            if lesson:
+                await ws.send(json.dumps({'cmd': 'lesson', 'name': lesson}))
+                answer = json.loads(await ws.recv())
+                if answer.get('error'):
+                    raise RuntimeError(answer['error'])
+            if codec != 'pcm':
+                await ws.send(json.dumps({'cmd': 'codec', 'offer': [codec]}))
+                answer = json.loads(await ws.recv())
+                if answer.get('codec') != codec:
+                    raise RuntimeError(f'server answered codec {answer.get("codec")!r}')
+            version = 0
+            if frames:
+                await ws.send(json.dumps({'cmd': 'frames', 'version': FRAME_VERSION}))
+                version = json.loads(await ws.recv()).get('frames', 0)
+            if rate != SEND_SR:
+                await ws.send(json.dumps({'cmd': 'audio', 'rate': rate}))
+            t_text = time.perf_counter()
+            await ws.send(json.dumps({'cmd': 'text', 'text': "Let's begin!"}))
+
+            async def reader():
+                min_generation = 0
+                heard = 0       # newest generation reported as played
+                async for msg in ws:
+                    if isinstance(msg, str):
+                        try:
+                            ctrl = json.loads(msg)
+                        except json.JSONDecodeError:
+                            continue
+                        if ctrl.get('draining'):
+                            stats.drained = True
+                        if 'pong' in ctrl:
+                            pong = ctrl['pong']
+                            now  = time.time()
+                            stats.pings.append(now - pong['t'])
+                            if version:
+                                await ws.send(json.dumps({'cmd': 'clock', 't0': pong['t'],
+                                                          'server_t': pong['server_t'], 't1': now}))
+                        if ctrl.get('interrupted'):
+                            stats.interrupted += 1
+                            min_generation = max(min_generation, ctrl.get('generation', 0))
+                        continue
+                    if version:
+                        header, _ = unpack(msg)
+                        generation = header.generation
+                    else:
+                        generation = untag(msg)[0]
+                    if generation < min_generation:
+                        stats.stale += 1
+                        continue
+                    if version and generation > heard:
+                        # no playout buffer here: heard as soon as it arrives
+                        heard = generation
+                        now   = time.time()
+                        await ws.send(json.dumps({'cmd': 'played', 'generation': generation,
+                                                  'sent': header.timestamp,
+                                                  'received': now, 'played': now}))
+                    if stats.first_audio is None:
+                        stats.first_audio = time.perf_counter() - t_text
+                    stats.frames_down += 1
+                    stats.bytes_down  += len(msg)
+
+            read_task = asyncio.create_task(reader())
+            # a close ends the reader with an error; the sender reports it
+            read_task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            start = time.perf_counter()
+            cycle = talk_s + listen_s
+            i = 0
+            seq = 0
+            next_ping = start + ping_s
+            while (elapsed := time.perf_counter() - start) < duration:
+                if ping_s and time.perf_counter() >= next_ping:
+                    # control traffic shouldn't wait behind the audio
+                    await ws.send(json.dumps({'cmd': 'ping', 'id': i, 't': time.time()}))
+                    next_ping += ping_s
+                # the frame's first sample was captured one period ago
+                captured = time.time() - period
+                for frame, samples in (speech if (elapsed % cycle) < talk_s else silence):
+                    if version:
+                        frame = pack(FrameHeader(0, seq, samples, captured), frame)
+                        seq  += 1
+                        captured += samples / rate
+                    await ws.send(frame)
+                    stats.frames_up += 1
+                    stats.bytes_up  += len(frame)
+                i += 1
+                # schedule against the absolute clock so pacing doesn't drift
+                await asyncio.sleep(max(0.0, start + i * period - time.perf_counter()))
+            read_task.cancel()
+    except ConnectionClosed as e:
+        if e.rcvd and e.rcvd.code == 1012:
+            # the server shut down and closed us after its drain
+            stats.drained = True
+        else:
+            stats.error = repr(e)
+    except Exception as e:
+        stats.error = repr(e)
+
+
+async def run_load(args):
+    server = None
+    url    = args.url
+    if not url:
+        server = InProcessServer(args.host, args.port)
+        server.start()
+        url = f'ws://{args.host}:{args.port}'
+
+    rss_before = rss_bytes()
+    stats = [ClientStats() for _ in range(args.sessions)]
+    tasks = []
+    t0 = time.perf_counter()
+    for s in stats:
+        tasks.append(asyncio.create_task(run_client(
+            url, args.duration, args.frame_size, args.talk, args.listen, args.codec, args.rate,
+            args.lesson, args.ping, args.frames, s)))
+        if args.ramp:
+            await asyncio.sleep(args.ramp / args.sessions)
+
+    # sample memory once every client is streaming
+    await asyncio.sleep(min(args.duration / 2, 5.0))
+    rss_during = rss_bytes()
+    await asyncio.gather(*tasks)
+    wall = time.perf_counter() - t0
+
+    lag = server.lag.samples if server else []
+    if server:
+        server.stop()
+    return build_report(args, stats, wall, lag, rss_during - rss_before, in_process=server is not None)
+
+
+def ms(value):
+    return None if value is None else round(value * 1000, 2)
+
+
+def build_report(args, stats, wall, lag, rss_delta, in_process):
+    first = [s.first_audio for s in stats if s.first_audio is not None]
+    waits = [s.wait for s in stats if s.wait is not None]
+    pings = [rtt for s in stats for rtt in s.pings]
+    report = {
+        'sessions':         args.sessions,
+        'duration_s':       round(wall, 2),
+        'errors':           sum(1 for s in stats if s.error),
+        'rejected':         sum(1 for s in stats if s.rejected),
+        'queued':           sum(1 for s in stats if s.queued),
+        'drained':          sum(1 for s in stats if s.drained),
+        'no_audio':         sum(1 for s in stats if s.first_audio is None and not s.rejected),
+        'admission_wait_p99_ms': ms(percentile(waits, 99)),
+        'first_audio_p50_ms': ms(percentile(first, 50)),
+        'first_audio_p99_ms': ms(percentile(first, 99)),
+        'ping_rtt_p50_ms':  ms(percentile(pings, 50)),
+        'ping_rtt_p99_ms':  ms(percentile(pings, 99)),
+        'loop_lag_p50_ms':  ms(percentile(lag, 50)),
+        'loop_lag_p99_ms':  ms(percentile(lag, 99)),
+        'loop_lag_max_ms':  ms(max(lag)) if lag else None,
+        'up_kbps':          round(sum(s.bytes_up for s in stats) / wall / 1024, 1),
+        'down_kbps':        round(sum(s.bytes_down for s in stats) / wall / 1024, 1),
+        'frames_up_per_s':  round(sum(s.frames_up for s in stats) / wall, 1),
+        'frames_down_per_s': round(sum(s.frames_down for s in stats) / wall, 1),
+        'interruptions':    sum(s.interrupted for s in stats),
+        'stale_frames':     sum(s.stale for s in stats),
+        # in-process mode counts client and server; treat as an upper bound
+        'rss_per_session_kb': round(rss_delta / args.sessions / 1024, 1) if in_process else None,
+    }
+    errors = [s.error for s in stats if s.error]
+    if errors:
+        report['first_error'] = errors[0]
+    return report
+
+
+def print_report(report):
+    width = max(len(k) for k in report)
+    for key, value in report.items():
+        print(f'{key:<{width}}  {value}')
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument('--sessions',   type=int,   default=50)
+    p.add_argument('--duration',   type=float, default=30.0, help='seconds each client streams')
+    p.add_argument('--ramp',       type=float, default=2.0,  help='seconds over which clients connect')
+    p.add_argument('--frame-size', type=int,   default=FRAME_SIZE, help='samples per websocket frame')
+    p.add_argument('--talk',       type=float, default=3.0,  help='seconds of speech per cycle')
+    p.add_argument('--listen',     type=float, default=4.0,  help='seconds of silence per cycle')
+    p.add_argument('--codec',      default='pcm', choices=['pcm', 'mulaw', 'opus'],
+                   help='websocket audio codec to negotiate')
+    p.add_argument('--rate',       type=int,   default=SEND_SR,
+                   help='capture rate of the pcm/mulaw frames; the server resamples to 16 kHz')
+    p.add_argument('--lesson',     default='', help='lesson to ask for (default: the server\'s)')
+    p.add_argument('--ping',       type=float, default=1.0,  help='seconds between ping commands (0 = none)')
+    p.add_argument('--frames',     type=int,   default=FRAME_VERSION, choices=[0, FRAME_VERSION],
+                   help='audio frame header version to ask for (0 = bare frames)')
+    p.add_argument('--url',        default='', help='target an existing server instead of in-process')
+    p.add_argument('--host',       default='127.0.0.1')
+    p.add_argument('--port',       type=int,   default=8799)
+    p.add_argument('--json',       action='store_true', help='print the report as JSON')
+    args = p.parse_args(argv)
+    if args.codec not in available_codecs():
+        # the clients encode with it, and an in-process server couldn't offer it
+        p.error(f'--codec {args.codec} is not available here '
+                f'(have {", ".join(available_codecs())}; Opus needs opuslib and libopus)')
+    if args.codec == 'opus' and args.rate != SEND_SR:
+        p.error('--rate applies to pcm and mulaw; Opus frames are encoded at 16 kHz')
+
+    report = asyncio.run(run_load(args))
+    if args.json:
+        print(json.dumps(report))
+    else:
+        print_report(report)
+    return 0 if not report['errors'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
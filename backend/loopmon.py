@@ -0,0 +1,272 @@
+# loopmon.py
+# -*- coding: utf-8 -*-
+"""
+Event-loop health: lag sampling, slow-callback logging and a stage profiler.
+
+Every session's reader, sender and receiver run on the one event loop of
+the process, so a stall in any of them delays all the others.
+
+- `LoopMonitor.run()` measures how late the loop wakes up from a short sleep,
+  continuously, and hands each sample to `on_lag` (a histogram in app.py).
+- `LoopMonitor.install()` times every callback the loop runs by wrapping
+  `asyncio.Handle._run`; that is a pair of clock reads and a Python frame
+  per callback, so it is only installed while something needs it: slow
+  callback reports (`slow` > 0) or a running `StageProfiler`, and removed
+  again with `uninstall()`. A callback holding the loop for more than `slow`
+  seconds is reported with the coroutine it stepped and the session it ran
+  for. The session comes from the `SESSION_ID` context variable, which each
+  connection sets and its tasks inherit.
+- `StageProfiler` is a sampling profiler that can be switched on and off at
+  runtime. A thread looks at the loop thread's stack every `interval` and
+  charges the sample to the running callback's session and to a stage,
+  picked from the outermost frame in a known package: JSON parsing, the
+  recording tracks, audio processing, websocket sends and receives, or the
+  GenAI SDK. It costs nothing while off.
+"""
+import asyncio
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+
+import websockets
+
+SESSION_ID = contextvars.ContextVar('session_id', default=None)
+
+
+def describe(handle):
+    """The coroutine a task step runs, or the callback's name."""
+    callback = handle._callback
+    task = getattr(callback, '__self__', None)
+    if isinstance(task, asyncio.Task):
+        coro = task.get_coro()
+        return getattr(coro, '__qualname__', repr(coro))
+    return getattr(callback, '__qualname__', repr(callback))
+
+
+class LoopMonitor:
+    def __init__(self, slow=0.1, interval=0.1, on_lag=None):
+        self.slow     = slow        # seconds a callback may hold the loop; 0 = don't report
+        self.interval = interval    # between lag samples
+        self.on_lag   = on_lag      # fn(seconds) per lag sample
+
+        # callback now running on the loop thread; read by StageProfiler
+        self.busy     = False
+        self.session  = None
+
+        self.lag_max        = 0.0
+        self.slow_callbacks = 0
+
+        self._original = None    # Handle._run while ours is installed
+
+    @property
+    def installed(self):
+        return self._original is not None
+
+    def install(self):
+        """Time every callback of every event loop in this process."""
+        if self.installed:
+            return
+        original = self._original = asyncio.events.Handle._run
+        monitor  = self
+
+        def _run(handle):
+            monitor.session = handle._context.get(SESSION_ID)
+            monitor.busy    = True
+            t0 = time.perf_counter()
+            try:
+                original(handle)
+            finally:
+                elapsed = time.perf_counter() - t0
+                monitor.busy    = False
+                monitor.session = None
+            if monitor.slow and elapsed >= monitor.slow:
+                monitor.slow_callback(handle, elapsed)
+
+        asyncio.events.Handle._run = _run
+
+    def uninstall(self):
+        """Put the original `Handle._run` back."""
+        if self.installed:
+            asyncio.events.Handle._run = self._original
+            self._original = None
+            self.busy      = False
+            self.session   = None
+
+    def slow_callback(self, handle, elapsed):
+        self.slow_callbacks += 1
+        session = handle._context.get(SESSION_ID)
+        print(f'[{session or "Warning"}] slow callback: {describe(handle)} held the loop '
+              f'for {elapsed * 1000:.0f} ms')
+
+    async def run(self):
+        """Sample event-loop lag until cancelled."""
+        loop = asyncio.get_running_loop()
+        while True:
+            t0 = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - t0 - self.interval)
+            self.lag_max = max(self.lag_max, lag)
+            if self.on_lag:
+                self.on_lag(lag)
+
+    def stats(self):
+        return {
+            'loop_lag_max_ms':     round(self.lag_max * 1000, 1),
+            'loop_slow_callbacks': self.slow_callbacks,
+        }
+
+
+def _package_dir(module):
+    return os.path.dirname(module.__file__) + os.sep
+
+
+_HERE = os.path.dirname(os.path.abspath(__file__)) + os.sep
+
+# (stage, filename prefix); the outermost frame in one of these names the stage
+STAGE_PATHS = [
+    ('json',      _package_dir(json)),
+    ('websocket', _package_dir(websockets)),
+    ('recording', _HERE + 'recorder.py'),
+    ('recording', _HERE + 'segments.py'),
+    ('recording', _HERE + 'transcripts.py'),
+    ('audio',     _HERE + 'audio_codec.py'),
+    ('audio',     _HERE + 'resample.py'),
+    ('audio',     _HERE + 'vad.py'),
+]
+try:
+    from google import genai
+    STAGE_PATHS.append(('sdk', _package_dir(genai)))
+except Exception:
+    pass
+
+
+class StageProfiler:
+    """Samples the loop thread's stack; time per session and stage, while on."""
+
+    def __init__(self, monitor, interval=0.005):
+        self.monitor  = monitor
+        self.interval = interval
+
+        self.samples  = defaultdict(lambda: defaultdict(int))   # session -> stage -> count
+        self.idle     = 0
+        self.started  = None
+        self.elapsed  = 0.0     # seconds sampled in earlier runs
+
+        self._stages  = {}      # code object -> stage or None
+        self._lock    = threading.Lock()
+        self._thread  = None
+        self._stop    = threading.Event()
+        self._loop_thread = None
+        self._hooked  = False   # installed the monitor's hook for this run
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self):
+        """Start sampling the calling thread, which must run the event loop."""
+        if self.running:
+            return
+        self._loop_thread = threading.get_ident()
+        # the samples need the monitor's view of the running callback
+        self._hooked = not self.monitor.installed
+        self.monitor.install()
+        self._stop.clear()
+        self.started = time.monotonic()
+        self._thread = threading.Thread(target=self._sample, name='stage-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if not self.running:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread  = None
+        if self._hooked:
+            self.monitor.uninstall()
+            self._hooked = False
+        self.elapsed += time.monotonic() - self.started
+        self.started  = None
+
+    def reset(self):
+        with self._lock:
+            self.samples.clear()
+            self.idle = 0
+        self.elapsed = 0.0
+        if self.started is not None:
+            self.started = time.monotonic()
+
+    def toggle(self):
+        """Stop if running (returning the report), else start afresh."""
+        if self.running:
+            self.stop()
+            return self.report()
+        self.reset()
+        self.start()
+        return None
+
+    def _sample(self):
+        monitor = self.monitor
+        while not self._stop.wait(self.interval):
+            if not monitor.busy:
+                with self._lock:
+                    self.idle += 1
+                continue
+            session = monitor.session
+            frame   = sys._current_frames().get(self._loop_thread)
+            stage   = 'other'
+            while frame is not None:
+                code = frame.f_code
+                if code not in self._stages:
+                    self._stages[code] = self._classify(code)
+                stage = self._stages[code] or stage
+                frame = frame.f_back
+            with self._lock:
+                self.samples[session or '-'][stage] += 1
+
+    @staticmethod
+    def _classify(code):
+        for stage, prefix in STAGE_PATHS:
+            if code.co_filename.startswith(prefix):
+                if stage == 'websocket':
+                    return 'ws_send' if code.co_name == 'send' else 'ws_recv'
+                return stage
+        return None
+
+    def report(self, top=5):
+        """Sampled time per stage (seconds) for the `top` busiest sessions."""
+        elapsed = self.elapsed + (time.monotonic() - self.started if self.started else 0.0)
+        with self._lock:
+            samples = {s: dict(stages) for s, stages in self.samples.items()}
+            idle    = self.idle
+        busy  = {s: sum(stages.values()) for s, stages in samples.items()}
+        total = sum(busy.values()) + idle
+        sessions = []
+        for session in sorted(busy, key=busy.get, reverse=True)[:top]:
+            stages = samples[session]
+            sessions.append({
+                'session': session,
+                'busy_s':  round(busy[session] * self.interval, 3),
+                'stages':  {stage: round(n * self.interval, 3)
+                            for stage, n in sorted(stages.items(), key=lambda kv: -kv[1])},
+            })
+        return {
+            'sampled_s':     round(elapsed, 1),
+            'loop_busy':     round(sum(busy.values()) / total, 3) if total else 0.0,
+            'sessions_seen': len(busy),
+            'busiest':       sessions,
+        }
+
+
+def format_report(report):
+    """The profiler report as log lines."""
+    lines = [f'[Profile] {report["sampled_s"]}s sampled, loop busy {report["loop_busy"]:.0%}, '
+             f'{report["sessions_seen"]} sessions']
+    for entry in report['busiest']:
+        stages = '  '.join(f'{stage} {s * 1000:.0f}ms' for stage, s in entry['stages'].items())
+        lines.append(f'[Profile]   {entry["session"]}: {entry["busy_s"] * 1000:.0f}ms  ({stages})')
+    return '\n'.join(lines)
@@ -0,0 +1,144 @@
+# metrics.py
+# -*- coding: utf-8 -*-
+"""
+Minimal Prometheus-style metrics: counters, gauges and histograms rendered in
+the text exposition format, served over plain HTTP on a local port next to the
+websocket server (`GET /metrics`). Other local endpoints can be served
+alongside it through `routes`.
+
+Everything is updated from the event loop thread, so no locking is needed.
+"""
+import asyncio
+from bisect import bisect_left
+
+# seconds; covers sub-frame sends up to slow cold connects
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.5, 5.0, 10.0)
+
+
+def _fmt(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help):
+        self.name  = name
+        self.help  = help
+        self.value = 0
+
+    def inc(self, n=1):
+        self.value += n
+
+    def samples(self):
+        yield self.name, '', self.value
+
+
+class Gauge:
+    """A gauge read from `fn()` at scrape time."""
+
+    kind = 'gauge'
+
+    def __init__(self, name, help, fn):
+        self.name = name
+        self.help = help
+        self.fn   = fn
+
+    def samples(self):
+        yield self.name, '', self.fn()
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS):
+        self.name    = name
+        self.help    = help
+        self.buckets = tuple(sorted(buckets))
+        self.counts  = [0] * (len(self.buckets) + 1)   # last one is +Inf
+        self.sum     = 0.0
+        self.count   = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum   += value
+        self.count += 1
+
+    def samples(self):
+        cumulative = 0
+        for le, n in zip(self.buckets + (float('inf'),), self.counts):
+            cumulative += n
+            yield self.name + '_bucket', f'{{le="{_fmt(le)}"}}', cumulative
+        yield self.name + '_sum', '', self.sum
+        yield self.name + '_count', '', self.count
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name, help):
+        return self._add(Counter(name, help))
+
+    def gauge(self, name, help, fn):
+        return self._add(Gauge(name, help, fn))
+
+    def histogram(self, name, help, buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, help, buckets))
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for m in self.metrics:
+            lines.append(f'# HELP {m.name} {m.help}')
+            lines.append(f'# TYPE {m.name} {m.kind}')
+            for name, labels, value in m.samples():
+                lines.append(f'{name}{labels} {_fmt(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+async def serve_metrics(registry, host='127.0.0.1', port=9100, routes=None):
+    """
+    Serve `GET /metrics` until cancelled. `routes` maps further paths to
+    functions of the query string returning (content type, body text).
+    """
+    routes = routes or {}
+
+    async def handle(reader, writer):
+        try:
+            request = await reader.readline()
+            # skip the headers
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+            parts = request.decode('latin-1').split()
+            path, _, query = parts[1].partition('?') if len(parts) >= 2 else ('', '', '')
+            ctype = 'text/plain; version=0.0.4; charset=utf-8'
+            if len(parts) < 2 or parts[0] != 'GET':
+                status, body = '404 Not Found', b'not found\n'
+            elif path == '/metrics':
+                status, body = '200 OK', registry.render().encode()
+            elif path in routes:
+                ctype, text = routes[path](query)
+                status, body = '200 OK', text.encode()
+            else:
+                status, body = '404 Not Found', b'not found\n'
+            writer.write(
+                f'HTTP/1.1 {status}\r\n'
+                f'Content-Type: {ctype}\r\n'
+                f'Content-Length: {len(body)}\r\n'
+                f'Connection: close\r\n\r\n'.encode() + body
+            )
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    async with server:
+        await server.serve_forever()
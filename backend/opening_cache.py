@@ -0,0 +1,169 @@
+# opening_cache.py
+# -*- coding: utf-8 -*-
+"""
+Content-addressed, on-disk LRU cache of opening turns.
+
+Every session of a lesson opens the same way: the same system prompt, voice
+and model, and the browser's same "Let's begin!" text turn. The tutor's
+scene-setting intro that follows is stored here the first time Gemini
+generates it, keyed by
+
+    sha256(model, voice, sha256(system prompt), opening text)
+
+Later sessions play the stored PCM straight away, while their LiveConnect
+session is still connecting, and tell the session what was said instead of
+waiting for it to generate the intro again (see AudioLoop.open_lesson in
+app.py). An entry is `<key>.wav` (24 kHz mono Int16) plus `<key>.json` with
+the intro's transcript, which is what the session is told.
+
+The cache holds at most `max_bytes` of audio; the least recently used
+entries are deleted first. Recency is the file modification time, touched
+on every hit, so the order survives restarts. Worker processes share the
+directory: a lookup that misses in this process's index checks the disk for
+an entry another worker stored. Lookups and stores do file I/O and are meant
+to run off the event loop (`asyncio.to_thread`).
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import wave
+from collections import OrderedDict
+
+
+def opening_key(model, voice, prompt, text):
+    """Cache key of the opening turn that `text` gets under this prompt, voice and model."""
+    prompt_hash = hashlib.sha256(prompt.encode()).hexdigest()
+    body = json.dumps([model, voice, prompt_hash, text], ensure_ascii=False)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+class OpeningCache:
+    def __init__(self, directory, max_bytes=200 * 1024 * 1024, rate=24000):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.rate      = rate
+
+        self.hits      = 0
+        self.misses    = 0
+        self.stores    = 0
+        self.evictions = 0
+
+        self._lock  = threading.Lock()
+        self._sizes = OrderedDict()   # key -> bytes on disk, least recently used first
+        self._storing = set()         # keys with a put() in progress
+        os.makedirs(directory, exist_ok=True)
+        entries = []
+        for name in os.listdir(directory):
+            if name.endswith('.wav'):
+                path = os.path.join(directory, name)
+                st   = os.stat(path)
+                entries.append((st.st_mtime, name[:-4], st.st_size))
+        for _, key, size in sorted(entries):
+            self._sizes[key] = size
+
+    def _path(self, key, ext):
+        return os.path.join(self.directory, key + ext)
+
+    def get(self, key):
+        """(pcm, meta) of a cached opening, or None."""
+        with self._lock:
+            known = key in self._sizes
+        if not known:
+            # stored by another worker after this one listed the directory
+            try:
+                size = os.path.getsize(self._path(key, '.wav'))
+            except OSError:
+                pass
+            else:
+                with self._lock:
+                    self._sizes.setdefault(key, size)
+                known = True
+        if known:
+            try:
+                with open(self._path(key, '.json'), encoding='utf-8') as f:
+                    meta = json.load(f)
+                with wave.open(self._path(key, '.wav'), 'rb') as w:
+                    pcm = w.readframes(w.getnframes())
+                os.utime(self._path(key, '.wav'))
+            except (OSError, ValueError, EOFError, wave.Error):
+                # evicted by another worker, or half-written
+                with self._lock:
+                    self._sizes.pop(key, None)
+            else:
+                with self._lock:
+                    if key in self._sizes:
+                        self._sizes.move_to_end(key)
+                    self.hits += 1
+                return pcm, meta
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, pcm, meta):
+        """
+        Store an opening turn and evict least recently used entries over
+        `max_bytes`. Skipped (returns False) if the key is already cached or
+        being stored, e.g. by sessions that all missed it right after startup.
+        """
+        with self._lock:
+            if key in self._sizes or key in self._storing \
+                    or os.path.exists(self._path(key, '.wav')):
+                return False
+            self._storing.add(key)
+        try:
+            self._write(key, pcm, meta)
+        finally:
+            with self._lock:
+                self._storing.discard(key)
+        return True
+
+    def _write(self, key, pcm, meta):
+        # temp names unique per call: other workers may store the same key
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=key + '.', suffix='.tmp')
+        os.close(fd)
+        fd, tmp_meta = tempfile.mkstemp(dir=self.directory, prefix=key + '.', suffix='.tmp')
+        os.close(fd)
+        try:
+            with wave.open(tmp, 'wb') as w:
+                w.setnchannels(1)
+                w.setsampwidth(2)
+                w.setframerate(self.rate)
+                w.writeframes(pcm)
+            with open(tmp_meta, 'w', encoding='utf-8') as f:
+                json.dump(dict(meta, created=time.time()), f, ensure_ascii=False)
+            # metadata first: an entry counts as present once its .wav exists
+            os.replace(tmp_meta, self._path(key, '.json'))
+            os.replace(tmp, self._path(key, '.wav'))
+        finally:
+            for path in (tmp, tmp_meta):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass   # renamed into place
+        with self._lock:
+            self._sizes[key] = os.path.getsize(self._path(key, '.wav'))
+            self._sizes.move_to_end(key)
+            self.stores += 1
+            evict = []
+            while sum(self._sizes.values()) > self.max_bytes and len(self._sizes) > 1:
+                evict.append(self._sizes.popitem(last=False)[0])
+            self.evictions += len(evict)
+        for old in evict:
+            for ext in ('.wav', '.json'):
+                try:
+                    os.remove(self._path(old, ext))
+                except OSError:
+                    pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                'opening_cache_hits':      self.hits,
+                'opening_cache_misses':    self.misses,
+                'opening_cache_stores':    self.stores,
+                'opening_cache_evictions': self.evictions,
+                'opening_cache_bytes':     sum(self._sizes.values()),
+            }
@@ -0,0 +1,137 @@
+# pacer.py
+# -*- coding: utf-8 -*-
+"""
+Downstream framing and pacing of model audio sent to the browser.
+
+Gemini streams reply PCM in irregular chunks, often much faster than real
+time. Forwarding each one as its own websocket message costs a send per chunk
+on the server and one AudioBufferSource per chunk in the browser.
+`DownstreamPacer` re-frames the PCM into fixed `frame_ms` frames and sends
+them from its own task, staying at most `lead_ms` ahead of the browser's
+playback clock. The first frame of a turn goes out as soon as any audio
+arrives, the remainder is flushed at turn end, and an interruption drops
+everything not yet sent, including a frame waiting for its send slot.
+
+Frames keep the generation (model turn) they were pushed with and are handed
+to `send(frame, generation)`, so the caller can tag them for the browser.
+"""
+import asyncio
+
+from websockets.exceptions import ConnectionClosed
+
+TURN_END = object()   # queue marker: run `flush(generation)` once the turn's frames are sent
+
+
+class DownstreamPacer:
+    def __init__(self, send, frame_ms=40.0, lead_ms=300.0, sample_rate=24000, sampwidth=2,
+                 flush=None):
+        self.send          = send                      # coroutine: (frame, generation) or JSON (str)
+        self.flush         = flush                     # optional coroutine run after each turn
+        self.bytes_per_sec = sample_rate * sampwidth
+        self.frame_bytes   = int(self.bytes_per_sec * frame_ms / 1000) // sampwidth * sampwidth
+        self.lead          = lead_ms / 1000
+
+        self._buf      = bytearray()
+        self._q        = asyncio.Queue()
+        self._gen      = 0         # bumped on interruption; stale frames are dropped
+        self._wake     = asyncio.Event()   # cuts a pacing sleep short on interruption
+        self._turn     = 0         # generation of the audio being pushed
+        self._first    = True      # next frame starts a turn
+        self._play_end = 0.0       # loop time at which the browser runs out of audio
+        self._busy     = False     # an item is off the queue but not yet sent
+
+        self.chunks_in  = 0
+        self.frames_out = 0
+        self.dropped    = 0
+
+    def push(self, data, generation=0):
+        """Add model PCM. Called from receive_and_forward; never blocks."""
+        self.chunks_in += 1
+        self._turn = generation
+        self._buf += data
+        if self._first:
+            # don't make the start of a reply wait for a full frame
+            self._first = False
+            self._emit(len(self._buf))
+            return
+        while len(self._buf) >= self.frame_bytes:
+            self._emit(self.frame_bytes)
+
+    def end_turn(self):
+        """Flush the partial frame at the end of a model turn."""
+        if self._buf:
+            self._emit(len(self._buf))
+        self._first = True
+        if self.flush:
+            self._q.put_nowait((self._turn, TURN_END))
+
+    def interrupt(self, notice):
+        """Drop all unsent audio, then queue the JSON `notice` for the browser."""
+        self._gen += 1
+        self._buf.clear()
+        controls = []
+        while not self._q.empty():
+            item = self._q.get_nowait()
+            if isinstance(item, str):
+                controls.append(item)
+            elif item[1] is not TURN_END:
+                self.dropped += 1
+        for msg in controls + [notice]:
+            self._q.put_nowait(msg)
+        self._first = True
+        self._play_end = 0.0   # the browser flushes its playback queue too
+        self._wake.set()
+
+    async def wait_sent(self):
+        """Return once everything pushed so far has gone out."""
+        while self._buf or self._busy or not self._q.empty():
+            await asyncio.sleep(0.05)
+
+    def control(self, msg):
+        """Queue a JSON control frame, in order with the audio."""
+        self._q.put_nowait(msg)
+
+    def _emit(self, n):
+        self._q.put_nowait((self._turn, bytes(self._buf[:n])))
+        del self._buf[:n]
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                self._busy = False
+                item = await self._q.get()
+                self._busy = True
+                if isinstance(item, str):
+                    await self.send(item)
+                    continue
+                generation, frame = item
+                if frame is TURN_END:
+                    await self.flush(generation)
+                    continue
+
+                gen   = self._gen
+                ahead = self._play_end - loop.time()
+                if ahead > self.lead:
+                    self._wake.clear()
+                    try:
+                        await asyncio.wait_for(self._wake.wait(), ahead - self.lead)
+                    except TimeoutError:
+                        pass
+                    if gen != self._gen:
+                        # interrupted while waiting
+                        self.dropped += 1
+                        continue
+                await self.send(frame, generation)
+                self.frames_out += 1
+                self._play_end = max(self._play_end, loop.time()) + len(frame) / self.bytes_per_sec
+        except ConnectionClosed:
+            # client closed or dropped the WebSocket; stop sending
+            return
+
+    def stats(self):
+        return {
+            'downstream_chunks':  self.chunks_in,
+            'downstream_frames':  self.frames_out,
+            'downstream_dropped': self.dropped,
+        }
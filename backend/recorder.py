@@ -0,0 +1,200 @@
+# recorder.py
+# -*- coding: utf-8 -*-
+"""
+Per-session WAV recording that never touches the disk from the event loop.
+
+The event loop only appends PCM to an in-memory buffer per track. A single
+writer thread swaps those buffers out and writes them in large batches, either
+every `flush_interval` seconds or as soon as a track holds `flush_bytes`.
+Buffers are bounded: if the disk stalls long enough for a track to reach
+`max_buffer` bytes, new audio for that track is dropped (and counted) rather
+than delaying audio to or from Gemini.
+"""
+import os
+import threading
+import time
+import uuid
+import wave
+
+
+def new_session_id():
+    """Sortable, collision-free id used to name a session's recordings."""
+    return time.strftime('%Y%m%d-%H%M%S') + '-' + uuid.uuid4().hex[:8]
+
+
+class WavTrack:
+    """One WAV file fed from the event loop and written by the writer thread."""
+
+    def __init__(self, writer, path, rate, channels=1, sampwidth=2):
+        self.writer    = writer
+        self.path      = path
+        self.rate      = rate
+        self.channels  = channels
+        self.sampwidth = sampwidth
+        self.closed    = False
+
+        self.buffered_bytes = 0
+        self.written_bytes  = 0
+        self.dropped_bytes  = 0
+
+        self._buf  = bytearray()
+        self._lock = threading.Lock()
+        self._wav  = None   # opened lazily on the writer thread
+
+    def write(self, data):
+        """Queue PCM for writing. Called from the event loop; never blocks on I/O."""
+        with self._lock:
+            if self.closed:
+                return
+            if len(self._buf) + len(data) > self.writer.max_buffer:
+                self.dropped_bytes += len(data)
+                self.writer.dropped_bytes += len(data)
+                return
+            self._buf += data
+            self.buffered_bytes += len(data)
+            full = len(self._buf) >= self.writer.flush_bytes
+        if full:
+            self.writer.wake()
+
+    def close(self):
+        """Stop accepting audio; the writer flushes the rest and finalizes the header."""
+        with self._lock:
+            self.closed = True
+        self.writer.wake()
+
+    # — writer-thread side —
+
+    def _drain(self):
+        with self._lock:
+            if not self._buf:
+                return
+            data, self._buf = self._buf, bytearray()
+        if self._wav is None:
+            self._wav = wave.open(self.path, 'wb')
+            self._wav.setnchannels(self.channels)
+            self._wav.setsampwidth(self.sampwidth)
+            self._wav.setframerate(self.rate)
+        self._wav.writeframes(data)
+        self.written_bytes += len(data)
+
+    def _finish(self):
+        if self._wav is not None:
+            self._wav.close()
+            self._wav = None
+
+
+class NullTrack:
+    """Track used when recording is off."""
+
+    path = None
+    buffered_bytes = written_bytes = dropped_bytes = 0
+
+    def write(self, data):
+        pass
+
+    def close(self):
+        pass
+
+
+class RecordingWriter:
+    """Owns the writer thread shared by every session's tracks."""
+
+    def __init__(self, flush_interval=0.5, flush_bytes=256 * 1024, max_buffer=8 * 1024 * 1024):
+        self.flush_interval = flush_interval
+        self.flush_bytes    = flush_bytes
+        self.max_buffer     = max_buffer
+        self.dropped_bytes  = 0
+
+        self._tracks   = []
+        self._lock     = threading.Lock()
+        self._wakeup   = threading.Event()
+        self._stopping = False
+        self._thread   = None
+
+    def track(self, path, rate, channels=1, sampwidth=2):
+        return self.add(WavTrack(self, path, rate, channels, sampwidth))
+
+    def add(self, t):
+        """Register a track (anything with close/_drain/_finish) with the writer thread."""
+        with self._lock:
+            self._tracks.append(t)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='wav-writer', daemon=True)
+                self._thread.start()
+        return t
+
+    def wake(self):
+        self._wakeup.set()
+
+    def stop(self, timeout=None):
+        """Flush every open track, close the files and stop the thread."""
+        self._stopping = True
+        self.wake()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            with self._lock:
+                tracks = list(self._tracks)
+            for t in tracks:
+                done = False
+                try:
+                    t._drain()
+                    done = t.closed or self._stopping
+                    if done:
+                        t._drain()
+                except Exception as e:
+                    print(f'[Warning] recording {t.path}: {e}')
+                    done = True
+                finally:
+                    if done:
+                        self._retire(t)
+            if self._stopping:
+                with self._lock:
+                    if not self._tracks:
+                        self._thread = None
+                        return
+
+    def _retire(self, t):
+        """Finalize `t` (the WAV header, the file handle) even after a failed drain, and drop it."""
+        try:
+            t._finish()
+        except Exception as e:
+            print(f'[Warning] recording {t.path}: {e}')
+        with self._lock:
+            if t in self._tracks:
+                self._tracks.remove(t)
+
+
+class SessionRecording:
+    """The user-input and response tracks of one browser session."""
+
+    def __init__(self, writer, session_id, directory, send_sr, recv_sr, sampwidth=2, enabled=True):
+        self.session_id = session_id
+        if enabled:
+            os.makedirs(directory, exist_ok=True)
+            base = os.path.join(directory, session_id)
+            self.user_in  = writer.track(base + '_user_input.wav', send_sr, sampwidth=sampwidth)
+            self.response = writer.track(base + '_response.wav', recv_sr, sampwidth=sampwidth)
+        else:
+            self.user_in  = NullTrack()
+            self.response = NullTrack()
+
+    def turn_started(self, generation):
+        pass
+
+    def turn_ended(self):
+        pass
+
+    def close(self):
+        self.user_in.close()
+        self.response.close()
+
+    def stats(self):
+        return {
+            'written_bytes': self.user_in.written_bytes + self.response.written_bytes,
+            'dropped_bytes': self.user_in.dropped_bytes + self.response.dropped_bytes,
+        }
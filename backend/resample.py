@@ -0,0 +1,77 @@
+# resample.py
+# -*- coding: utf-8 -*-
+"""
+Streaming polyphase resampling of Int16 mono PCM in NumPy.
+
+Lets the browser capture (and play) at the device's native rate, typically
+44.1 or 48 kHz, instead of forcing a 16/24 kHz AudioContext that makes the
+browser resample on its audio thread. The backend converts to SEND_SR on
+the way in and, optionally, from RECV_SR on the way out.
+
+The conversion by L/M (reduced ratio) uses one Kaiser-windowed sinc lowpass
+at the virtual L-times rate, split into L phases of K taps. The filter for a
+given ratio is designed once and cached. Every output sample is a K-tap dot
+product with one phase; a whole block is computed as a single gather and
+row-wise product. The last K-1 input samples and the output position carry
+over between blocks, so chunk boundaries are seamless.
+"""
+from functools import lru_cache
+from math import gcd
+
+import numpy as np
+
+
+@lru_cache(maxsize=16)
+def polyphase_filter(up, down, zeros=10, beta=5.0):
+    """(L, K) phase matrix for resampling by up/down; read-only, shared."""
+    cutoff   = 1.0 / max(up, down)           # of the virtual rate's Nyquist
+    half_len = zeros * max(up, down)
+    t = np.arange(-half_len, half_len + 1)
+    h = cutoff * np.sinc(cutoff * t) * np.kaiser(len(t), beta) * up
+    # pad to a whole number of taps per phase
+    taps = -(-len(h) // up)
+    h = np.concatenate([h, np.zeros(taps * up - len(h))])
+    # phase p holds h[p], h[p + L], h[p + 2L], ...
+    phases = h.reshape(taps, up).T.astype(np.float32)
+    phases.setflags(write=False)
+    return phases
+
+
+class Resampler:
+    """Stateful Int16 resampler for one stream; feed it consecutive blocks."""
+
+    def __init__(self, in_rate, out_rate):
+        g = gcd(in_rate, out_rate)
+        self.in_rate  = in_rate
+        self.out_rate = out_rate
+        self.up       = out_rate // g
+        self.down     = in_rate // g
+        self.phases   = polyphase_filter(self.up, self.down)
+        self.taps     = self.phases.shape[1]
+        self._offsets = np.arange(self.taps)
+        self.reset()
+
+    def reset(self):
+        """Forget the stream so far, e.g. after an interruption."""
+        self._history = np.zeros(self.taps - 1, np.float32)
+        self._in      = 0   # input samples consumed
+        self._out     = 0   # next output sample index
+
+    def process(self, pcm):
+        """Resample the next block of Int16 PCM bytes; returns Int16 PCM bytes."""
+        if self.up == self.down:
+            return pcm
+        x   = np.frombuffer(pcm, dtype='<i2').astype(np.float32)
+        ext = np.concatenate([self._history, x])
+        total = self._in + len(x)
+        # outputs whose newest input sample has arrived: n*M // L < total
+        end = (total * self.up + self.down - 1) // self.down
+        n   = np.arange(self._out, end, dtype=np.int64)
+        pos = n * self.down
+        newest = pos // self.up - (self._in - (self.taps - 1))   # index into ext
+        window = ext[newest[:, None] - self._offsets]
+        y = np.einsum('nk,nk->n', self.phases[pos % self.up], window)
+
+        self._history = ext[len(ext) - (self.taps - 1):]
+        self._in, self._out = total, end
+        return np.clip(np.rint(y), -32768, 32767).astype('<i2').tobytes()
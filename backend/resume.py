@@ -0,0 +1,52 @@
+# resume.py
+# -*- coding: utf-8 -*-
+"""
+Helpers for resuming a dropped LiveConnect session.
+
+Gemini periodically sends `session_resumption_update` messages carrying a
+handle; connecting again with that handle restores the conversation state as
+of the update. Mic audio sent after the last update is not covered by the
+handle, so `ReplayBuffer` keeps it (bounded by duration) to be re-sent on the
+new session.
+"""
+import time
+from collections import deque
+
+from google.genai import types
+
+
+def resumption_config(config, handle=None):
+    """`config` with session resumption switched on, resuming `handle` if given."""
+    return config.model_copy(update={
+        'session_resumption': types.SessionResumptionConfig(handle=handle),
+    })
+
+
+class ReplayBuffer:
+    """Mic chunks sent since the last resumption checkpoint, newest `max_s` seconds."""
+
+    def __init__(self, max_s=5.0, sample_rate=16000, sampwidth=2):
+        self.bytes_per_sec = sample_rate * sampwidth
+        self.max_bytes = int(max_s * self.bytes_per_sec)
+        self._chunks   = deque()
+        self._bytes    = 0
+        self.marked_at = None
+
+    def append(self, data):
+        self._chunks.append(data)
+        self._bytes += len(data)
+        while self._bytes > self.max_bytes and len(self._chunks) > 1:
+            self._bytes -= len(self._chunks.popleft())
+
+    def mark(self):
+        """A new resumption handle arrived: everything sent so far is covered."""
+        self._chunks.clear()
+        self._bytes    = 0
+        self.marked_at = time.monotonic()
+
+    def pending(self):
+        return list(self._chunks)
+
+    @property
+    def pending_seconds(self):
+        return self._bytes / self.bytes_per_sec
@@ -0,0 +1,326 @@
+# segments.py
+# -*- coding: utf-8 -*-
+"""
+Turn-segmented, compressed session recordings with a seekable index.
+
+Instead of two ever-growing WAV files per session, every user turn and every
+model turn becomes its own compressed segment, appended to `<sid>.seg`. Each
+segment gets one fixed-size record in `<sid>.idx`:
+
+    turn, speaker, codec, sample rate, byte offset, byte length,
+    samples, start/end wall-clock time
+
+The index is a 16-byte header followed by packed `INDEX_DTYPE` records, so
+`np.memmap` (see `SegmentStore`) reads it without parsing and any turn of a
+long lesson can be fetched with one seek.
+
+Segments are Int16 first differences compressed with zlib by default
+(lossless, stdlib only), or FLAC on request when the optional `soundfile`
+package is installed. Encoding and file writes happen on the recorder's writer thread
+(see recorder.py); the event loop only appends PCM to the open segment.
+
+List or extract turns from the command line:
+
+    python segments.py recordings/<sid>
+    python segments.py recordings/<sid> --turn 3 --speaker model -o turn3.wav
+"""
+import argparse
+import io
+import os
+import sys
+import threading
+import time
+import wave
+import zlib
+
+import numpy as np
+
+try:
+    import soundfile
+except Exception:   # optional; libsndfile may be missing too
+    soundfile = None
+
+MAGIC   = b'LPSG'
+VERSION = 1
+HEADER  = np.dtype([('magic', 'S4'), ('version', '<u2'), ('record_size', '<u2'), ('_pad', 'V8')])
+
+USER, MODEL = 0, 1
+SPEAKERS    = {USER: 'user', MODEL: 'model'}
+
+CODEC_PCM, CODEC_FLAC, CODEC_ZLIB = 0, 1, 2
+CODEC_NAMES = {CODEC_PCM: 'pcm', CODEC_FLAC: 'flac', CODEC_ZLIB: 'zlib'}
+
+INDEX_DTYPE = np.dtype([
+    ('turn',    '<u4'),
+    ('speaker', 'u1'),
+    ('codec',   'u1'),
+    ('_pad',    '<u2'),
+    ('rate',    '<u4'),
+    ('offset',  '<u8'),   # into the .seg file
+    ('length',  '<u8'),   # compressed bytes
+    ('samples', '<u8'),
+    ('start',   '<f8'),   # unix time of the first sample
+    ('end',     '<f8'),   # unix time the segment was closed
+])
+
+
+def pick_codec(name):
+    """Codec id for `name`, falling back to zlib when FLAC isn't available."""
+    if name == 'flac' and soundfile is None:
+        print('[Warning] soundfile not installed; recording segments with zlib instead of FLAC')
+        name = 'zlib'
+    ids = {v: k for k, v in CODEC_NAMES.items()}
+    if name not in ids:
+        raise ValueError(f'unknown segment codec {name!r}')
+    return ids[name]
+
+
+def encode(codec, pcm, rate):
+    if codec == CODEC_FLAC:
+        out = io.BytesIO()
+        samples = np.frombuffer(pcm, dtype='<i2')
+        soundfile.write(out, samples, rate, format='FLAC', subtype='PCM_16')
+        return out.getvalue()
+    if codec == CODEC_ZLIB:
+        samples = np.frombuffer(pcm, dtype='<i2')
+        # neighbouring samples are close, so their (wrapping) differences compress well
+        delta = np.diff(samples, prepend=np.int16(0))
+        return zlib.compress(delta.tobytes(), 6)
+    return bytes(pcm)
+
+
+def decode(codec, data):
+    if codec == CODEC_FLAC:
+        samples, _ = soundfile.read(io.BytesIO(data), dtype='int16')
+        return samples.tobytes()
+    if codec == CODEC_ZLIB:
+        delta = np.frombuffer(zlib.decompress(data), dtype='<i2')
+        return np.cumsum(delta, dtype=np.int16).tobytes()
+    return bytes(data)
+
+
+class SegmentTrack:
+    """
+    The .seg/.idx pair of one session. Closed segments are queued here from
+    the event loop and encoded and appended by the writer thread.
+    """
+
+    def __init__(self, writer, base, codec):
+        self.writer = writer
+        self.path   = base + '.seg'
+        self.index_path = base + '.idx'
+        self.codec  = codec
+        self.closed = False
+
+        self.buffered_bytes = 0
+        self.written_bytes  = 0   # compressed
+        self.dropped_bytes  = 0
+
+        self._pending = []        # (record fields, pcm)
+        self._bytes   = 0
+        self._lock    = threading.Lock()
+        self._seg     = None      # opened lazily on the writer thread
+        self._idx     = None
+
+    def submit(self, turn, speaker, rate, pcm, start, end):
+        """Queue one finished segment. Called from the event loop; never blocks on I/O."""
+        with self._lock:
+            if self.closed:
+                return
+            if self._bytes + len(pcm) > self.writer.max_buffer:
+                self.dropped_bytes += len(pcm)
+                self.writer.dropped_bytes += len(pcm)
+                return
+            self._pending.append(((turn, speaker, rate, start, end), pcm))
+            self._bytes += len(pcm)
+            self.buffered_bytes += len(pcm)
+        self.writer.wake()
+
+    def close(self):
+        with self._lock:
+            self.closed = True
+        self.writer.wake()
+
+    # — writer-thread side —
+
+    def _drain(self):
+        with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, []
+            self._bytes = 0
+        if self._seg is None:
+            self._seg = open(self.path, 'wb')
+            self._idx = open(self.index_path, 'wb')
+            header = np.zeros(1, HEADER)
+            header['magic'], header['version'], header['record_size'] = MAGIC, VERSION, INDEX_DTYPE.itemsize
+            self._idx.write(header.tobytes())
+        records = np.zeros(len(pending), INDEX_DTYPE)
+        for rec, ((turn, speaker, rate, start, end), pcm) in zip(records, pending):
+            data = encode(self.codec, pcm, rate)
+            rec['turn'], rec['speaker'], rec['codec'], rec['rate'] = turn, speaker, self.codec, rate
+            rec['offset'], rec['length'] = self._seg.tell(), len(data)
+            rec['samples'] = len(pcm) // 2
+            rec['start'], rec['end'] = start, end
+            self._seg.write(data)
+            self.written_bytes += len(data)
+        self._seg.flush()
+        # index records only ever point at segment bytes already written
+        self._idx.write(records.tobytes())
+        self._idx.flush()
+
+    def _finish(self):
+        for f in (self._seg, self._idx):
+            if f is not None:
+                f.close()
+        self._seg = self._idx = None
+
+
+class _Speaker:
+    """Collects one speaker's PCM into the currently open segment."""
+
+    def __init__(self, recording, speaker, rate, max_segment_s):
+        self.recording = recording
+        self.speaker   = speaker
+        self.rate      = rate
+        self.max_bytes = int(rate * 2 * max_segment_s)
+        self.turn      = 0
+        self._buf      = bytearray()
+        self._start    = None
+
+    # what the engine calls `wav_in` / `wav_out`
+    def write(self, data):
+        if not self._buf:
+            self._start = time.time() - len(data) / 2 / self.rate
+            self.turn   = self.recording.current_turn(self.speaker)
+        self._buf += data
+        if len(self._buf) >= self.max_bytes:
+            # very long turn: continue in a new segment with the same turn id
+            self.cut()
+
+    def cut(self):
+        if self._buf:
+            self.recording.track.submit(self.turn, self.speaker, self.rate,
+                                        bytes(self._buf), self._start, time.time())
+            self._buf.clear()
+
+    def close(self):
+        self.cut()
+
+
+class SegmentRecording:
+    """
+    Segmented recording of one browser session; a drop-in for
+    recorder.SessionRecording. Model turn N is preceded by user turn N: user
+    audio is cut when a model turn starts, model audio when it ends.
+    """
+
+    def __init__(self, writer, session_id, directory, send_sr, recv_sr, codec=CODEC_ZLIB,
+                 max_segment_s=60.0):
+        # `codec` is an id from pick_codec, resolved once per process
+        self.session_id = session_id
+        os.makedirs(directory, exist_ok=True)
+        self.track    = writer.add(SegmentTrack(writer, os.path.join(directory, session_id),
+                                                codec))
+        self.user_in  = _Speaker(self, USER, send_sr, max_segment_s)
+        self.response = _Speaker(self, MODEL, recv_sr, max_segment_s)
+        self.generation = 0
+
+    def current_turn(self, speaker):
+        return self.generation if speaker == MODEL else self.generation + 1
+
+    def turn_started(self, generation):
+        """First model audio of turn `generation`: the user's turn is over."""
+        self.user_in.cut()
+        self.generation = generation
+
+    def turn_ended(self):
+        self.response.cut()
+
+    def close(self):
+        self.user_in.close()
+        self.response.close()
+        self.track.close()
+
+    def stats(self):
+        return {
+            'written_bytes': self.track.written_bytes,
+            'dropped_bytes': self.track.dropped_bytes,
+        }
+
+
+class SegmentStore:
+    """Read side: memory-maps `<base>.idx` and fetches single segments from `<base>.seg`."""
+
+    def __init__(self, base):
+        if base.endswith(('.seg', '.idx')):
+            base = base[:-4]
+        self.base = base
+        header = np.fromfile(base + '.idx', dtype=HEADER, count=1)
+        if len(header) != 1 or header['magic'][0] != MAGIC:
+            raise ValueError(f'{base}.idx: not a segment index')
+        if header['record_size'][0] != INDEX_DTYPE.itemsize:
+            raise ValueError(f'{base}.idx: unsupported index version {header["version"][0]}')
+        size = os.path.getsize(base + '.idx') - HEADER.itemsize
+        count = size // INDEX_DTYPE.itemsize
+        self.index = np.memmap(base + '.idx', dtype=INDEX_DTYPE, mode='r',
+                               offset=HEADER.itemsize, shape=(count,)) if count else \
+            np.zeros(0, INDEX_DTYPE)
+
+    def __len__(self):
+        return len(self.index)
+
+    def find(self, turn, speaker=None):
+        """Positions of the segments of `turn` (optionally one speaker's), in order."""
+        mask = self.index['turn'] == turn
+        if speaker is not None:
+            mask &= self.index['speaker'] == speaker
+        return np.flatnonzero(mask)
+
+    def read(self, i):
+        """Int16 PCM of segment `i`."""
+        rec = self.index[i]
+        with open(self.base + '.seg', 'rb') as f:
+            f.seek(int(rec['offset']))
+            data = f.read(int(rec['length']))
+        return decode(int(rec['codec']), data)
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description='List or extract turns of a segmented recording')
+    p.add_argument('base', help='recording path without extension, e.g. recordings/<sid>')
+    p.add_argument('--turn', type=int, help='turn to extract')
+    p.add_argument('--speaker', choices=['user', 'model'])
+    p.add_argument('-o', '--output', help='WAV file to write the extracted turn to')
+    args = p.parse_args(argv)
+
+    store = SegmentStore(args.base)
+    if args.turn is None:
+        t0 = store.index['start'].min() if len(store) else 0.0
+        for rec in store.index:
+            print(f'turn {rec["turn"]:4d}  {SPEAKERS[int(rec["speaker"])]:<5}  '
+                  f'+{rec["start"] - t0:8.2f}s  {rec["samples"] / rec["rate"]:6.2f}s  '
+                  f'{CODEC_NAMES[int(rec["codec"])]:<4}  {rec["length"]:8d} bytes')
+        return 0
+
+    speaker = {'user': USER, 'model': MODEL}.get(args.speaker)
+    hits = store.find(args.turn, speaker)
+    if not len(hits):
+        print(f'no segments for turn {args.turn}', file=sys.stderr)
+        return 1
+    rates = {int(store.index[i]['rate']) for i in hits}
+    if len(rates) > 1:
+        p.error('turn has both speakers at different rates; pass --speaker')
+    pcm = b''.join(store.read(i) for i in hits)
+    out = args.output or f'{os.path.basename(store.base)}_turn{args.turn}.wav'
+    with wave.open(out, 'wb') as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rates.pop())
+        w.writeframes(pcm)
+    print(f'wrote {len(pcm) / 2 / int(store.index[hits[0]]["rate"]):.2f}s to {out}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
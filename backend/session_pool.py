@@ -0,0 +1,201 @@
+# session_pool.py
+# -*- coding: utf-8 -*-
+"""
+Pool of pre-connected, idle LiveConnect sessions.
+
+Opening a session (websocket handshake plus the setup message carrying the
+long system instruction) is the biggest part of the delay before the first
+reply. The pool keeps up to `size` sessions per (model, config) open and idle,
+so a handler can check one out immediately; the pool then refills in the
+background.
+
+`client.aio.live.connect()` is an async context manager, so every session
+lives in its own holder task that enters the context, parks until the session
+is released, and then exits it. Idle sessions are evicted once they are older
+than `max_idle`, or would have less than `min_remaining` seconds left before
+the server's `session_limit`.
+
+With `size=0` nothing is pre-connected and `acquire` simply connects on
+demand, which is the same as calling `connect` directly.
+"""
+import asyncio
+import hashlib
+import time
+import traceback
+from collections import deque
+
+
+def config_key(model, config):
+    """Hashable key for a (model, LiveConnectConfig) pair."""
+    if hasattr(config, 'model_dump_json'):
+        body = config.model_dump_json(exclude_none=True)
+    else:
+        body = repr(config)
+    return model, hashlib.sha1(body.encode()).hexdigest()
+
+
+class PooledSession:
+    def __init__(self, key, session):
+        self.key       = key
+        self.session   = session
+        self.created   = time.monotonic()
+        self._released = asyncio.Event()
+
+    @property
+    def age(self):
+        return time.monotonic() - self.created
+
+    def release(self):
+        """Hand the session back for closing. Sessions are never reused."""
+        self._released.set()
+
+
+class SessionPool:
+    def __init__(self, connect, size=0, max_idle=120.0, session_limit=600.0,
+                 min_remaining=300.0, retry_delay=5.0):
+        self.connect       = connect          # client.aio.live.connect
+        self.size          = size
+        self.max_idle      = max_idle
+        self.session_limit = session_limit
+        self.min_remaining = min_remaining
+        self.retry_delay   = retry_delay
+
+        self._idle    = {}       # key -> deque[PooledSession]
+        self._targets = {}       # key -> (model, config) to keep warm
+        self._opening = {}       # key -> sessions being opened for the pool
+        self._holders = set()    # one task per open session
+        self._refills = set()
+
+        self.hits      = 0
+        self.misses    = 0
+        self.evictions = 0
+        self.failures  = 0
+
+    def warm(self, model, config):
+        """Keep `size` idle sessions ready for this (model, config)."""
+        key = config_key(model, config)
+        self._targets[key] = (model, config)
+        self._fill(key)
+
+    async def acquire(self, model, config):
+        """Return a ready PooledSession; the caller must `release()` it."""
+        key  = config_key(model, config)
+        idle = self._idle.get(key)
+        while idle:
+            entry = idle.popleft()
+            if self._fresh(entry):
+                self.hits += 1
+                self._fill(key)
+                return entry
+            self._evict(entry)
+        self.misses += 1
+        self._fill(key)
+        return await self._open(key, model, config)
+
+    async def warmed(self, timeout=None):
+        """Wait up to `timeout` for the sessions being pre-connected."""
+        if self._refills:
+            await asyncio.wait(set(self._refills), timeout=timeout)
+
+    def idle_count(self):
+        return sum(len(q) for q in self._idle.values())
+
+    def stats(self):
+        return {
+            'pool_hits':      self.hits,
+            'pool_misses':    self.misses,
+            'pool_evictions': self.evictions,
+            'pool_failures':  self.failures,
+            'pool_idle':      self.idle_count(),
+        }
+
+    async def run(self, interval=5.0):
+        """Evict stale idle sessions and top the pool up, until cancelled."""
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                for key, idle in self._idle.items():
+                    for entry in [e for e in idle if not self._fresh(e)]:
+                        idle.remove(entry)
+                        self._evict(entry)
+                for key in self._targets:
+                    self._fill(key)
+        finally:
+            self.close()
+
+    def close(self):
+        """Close every idle session and stop refilling."""
+        self._targets.clear()
+        for idle in self._idle.values():
+            while idle:
+                idle.popleft().release()
+        # sessions in use stay open until their handler releases them
+        for t in list(self._refills):
+            t.cancel()
+
+    # — internals —
+
+    def _fresh(self, entry):
+        age = entry.age
+        return age <= self.max_idle and self.session_limit - age >= self.min_remaining
+
+    def _evict(self, entry):
+        self.evictions += 1
+        entry.release()
+
+    @staticmethod
+    def _spawn(tasks, coro):
+        task = asyncio.create_task(coro)
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        return task
+
+    async def _open(self, key, model, config):
+        ready = asyncio.get_running_loop().create_future()
+        self._spawn(self._holders, self._hold(key, model, config, ready))
+        return await ready
+
+    async def _hold(self, key, model, config, ready):
+        try:
+            async with self.connect(model=model, config=config) as session:
+                if ready.cancelled():
+                    # whoever asked for it has gone away
+                    return
+                entry = PooledSession(key, session)
+                ready.set_result(entry)
+                await entry._released.wait()
+        except Exception as e:
+            if not ready.done():
+                ready.set_exception(e)
+            else:
+                traceback.print_exception(e)
+        finally:
+            if not ready.done():
+                ready.cancel()
+
+    def _fill(self, key):
+        if key not in self._targets:
+            return
+        have = len(self._idle.get(key, ())) + self._opening.get(key, 0)
+        for _ in range(self.size - have):
+            self._opening[key] = self._opening.get(key, 0) + 1
+            self._spawn(self._refills, self._refill_one(key))
+
+    async def _refill_one(self, key):
+        model, config = self._targets.get(key, (None, None))
+        if model is None:
+            self._opening[key] -= 1
+            return
+        try:
+            entry = await self._open(key, model, config)
+        except Exception as e:
+            self.failures += 1
+            print(f'[Warning] session pool could not pre-connect: {e}')
+            await asyncio.sleep(self.retry_delay)
+            return
+        finally:
+            self._opening[key] -= 1
+        if key in self._targets:
+            self._idle.setdefault(key, deque()).append(entry)
+        else:
+            entry.release()
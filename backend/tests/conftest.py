@@ -0,0 +1,7 @@
+# conftest.py
+# -*- coding: utf-8 -*-
+"""The backend runs as flat modules from backend/ (see app.py); import them the same way."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
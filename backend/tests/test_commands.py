@@ -0,0 +1,39 @@
+# test_commands.py
+# -*- coding: utf-8 -*-
+import json
+
+import pytest
+
+from commands import Audio, Codec, CommandError, Ping, parse_command
+
+
+def parse(**obj):
+    return parse_command(json.dumps(obj))
+
+
+def test_parses_into_the_command_class():
+    assert parse(cmd='codec', offer=['opus', 'pcm']) == Codec(offer=['opus', 'pcm'])
+    assert parse(cmd='audio', rate=48000) == Audio(rate=48000)
+    assert parse(cmd='ping', id='a', t=1.5) == Ping(id='a', t=1.5)
+
+
+@pytest.mark.parametrize('offer', [[{}], ['opus', 3], [['pcm']], 'pcm', [None]])
+def test_codec_offer_must_be_a_list_of_names(offer):
+    with pytest.raises(CommandError, match='bad offer'):
+        parse(cmd='codec', offer=offer)
+
+
+def test_bool_is_not_an_int():
+    with pytest.raises(CommandError, match='bad rate'):
+        parse(cmd='audio', rate=True)
+
+
+@pytest.mark.parametrize('msg,error', [
+    ('not json', 'not JSON'),
+    ('[1]', 'not a JSON object'),
+    ('{"cmd": "dance"}', 'unknown command'),
+    ('{"cmd": "text"}', 'missing text'),
+])
+def test_invalid_frames(msg, error):
+    with pytest.raises(CommandError, match=error):
+        parse_command(msg)
@@ -0,0 +1,139 @@
+# test_ingest.py
+# -*- coding: utf-8 -*-
+import asyncio
+
+import pytest
+
+import ingest
+from ingest import IngestRing
+
+
+class Clock:
+    """Stands in for time.monotonic inside ingest.py."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = Clock()
+    monkeypatch.setattr(ingest.time, 'monotonic', c)
+    return c
+
+
+def ring(policy, capacity=20, max_age_ms=1000.0):
+    # 1 kHz Int16 = 2 bytes per ms, so capacity_ms = capacity / 2
+    return IngestRing(capacity_ms=capacity / 2, policy=policy, max_age_ms=max_age_ms,
+                      sample_rate=1000)
+
+
+def chunk(byte, n=8):
+    return {'data': bytes([byte]) * n, 'mime_type': 'audio/pcm'}
+
+
+def drain(r):
+    out = []
+    while not r.empty():
+        pkt = r.get_nowait()
+        out.append(pkt['data'] if 'data' in pkt else pkt)
+    return out
+
+
+def test_wraps_around_the_end_of_the_buffer():
+    r = ring('drop-oldest')
+    r.put_nowait(chunk(1))
+    r.put_nowait(chunk(2))
+    assert r.get_nowait()['data'] == bytes([1]) * 8
+    # 4 bytes left at the end: the next chunk goes to the freed front
+    r.put_nowait(chunk(3))
+    assert r.dropped_bytes == 0
+    assert drain(r) == [bytes([2]) * 8, bytes([3]) * 8]
+    assert r.buffered_seconds == 0
+
+
+def test_wrap_keeps_data_intact_over_many_cycles():
+    r = ring('drop-oldest', capacity=30)
+    expected = []
+    for i in range(50):
+        r.put_nowait(chunk(i, n=6 + i % 5))
+        expected.append(bytes([i]) * (6 + i % 5))
+        if i % 2:
+            assert r.get_nowait()['data'] == expected.pop(0)
+            assert r.get_nowait()['data'] == expected.pop(0)
+    assert r.dropped_chunks == 0
+    assert drain(r) == expected
+
+
+def test_drop_oldest_makes_room_and_counts():
+    r = ring('drop-oldest')
+    for i in (1, 2, 3):
+        r.put_nowait(chunk(i))
+    assert r.dropped_chunks == 1
+    assert r.dropped_bytes == 8
+    assert drain(r) == [bytes([2]) * 8, bytes([3]) * 8]
+    assert r.stats() == {'ingest_dropped_bytes': 8, 'ingest_late_bytes': 0, 'ingest_blocked': 0}
+
+
+def test_oversized_chunk_keeps_its_newest_audio():
+    r = ring('drop-oldest')
+    r.put_nowait({'data': bytes(range(30)), 'mime_type': 'audio/pcm'})
+    assert r.dropped_bytes == 10
+    assert drain(r) == [bytes(range(10, 30))]
+
+
+def test_live_edge_discards_audio_older_than_max_age(clock):
+    r = ring('live-edge', max_age_ms=500)
+    r.put_nowait(chunk(1))
+    clock.now += 0.6
+    r.put_nowait(chunk(2))
+    assert drain(r) == [bytes([2]) * 8]
+    assert r.late_chunks == 1
+    assert r.late_bytes == 8
+    assert r.dropped_bytes == 0
+
+
+def test_live_edge_also_drops_oldest_when_full(clock):
+    r = ring('live-edge')
+    for i in (1, 2, 3):
+        r.put_nowait(chunk(i))
+    assert r.dropped_bytes == 8
+    assert r.late_bytes == 0
+    assert drain(r) == [bytes([2]) * 8, bytes([3]) * 8]
+
+
+def test_block_waits_for_room_without_dropping():
+    async def run():
+        r = ring('block')
+        await r.put(chunk(1))
+        await r.put(chunk(2))
+        waiting = asyncio.create_task(r.put(chunk(3)))
+        await asyncio.sleep(0)
+        assert not waiting.done()
+        assert (await r.get())['data'] == bytes([1]) * 8
+        await asyncio.wait_for(waiting, 1)
+        return r
+
+    r = asyncio.run(run())
+    assert r.blocked == 1
+    assert r.dropped_bytes == 0
+    assert drain(r) == [bytes([2]) * 8, bytes([3]) * 8]
+
+
+def test_control_packets_keep_their_place_and_are_not_dropped():
+    r = ring('drop-oldest')
+    end = {'audio_stream_end': True}
+    r.put_nowait(chunk(1))
+    r.put_nowait(end)
+    r.put_nowait(chunk(2))
+    r.put_nowait(chunk(3))
+    assert r.dropped_bytes == 8
+    assert drain(r) == [end, bytes([2]) * 8, bytes([3]) * 8]
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        IngestRing(policy='newest')
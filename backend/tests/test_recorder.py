@@ -0,0 +1,36 @@
+# test_recorder.py
+# -*- coding: utf-8 -*-
+import wave
+
+from recorder import RecordingWriter
+
+
+def test_track_written_and_finalized(tmp_path):
+    writer = RecordingWriter(flush_interval=0.01)
+    t = writer.track(str(tmp_path / 'a.wav'), 16000)
+    t.write(b'\1\0' * 100)
+    t.close()
+    writer.stop(timeout=2)
+    with wave.open(str(tmp_path / 'a.wav')) as w:
+        assert w.getframerate() == 16000
+        assert w.getnframes() == 100
+
+
+def test_failed_drain_still_finalizes_the_header(tmp_path):
+    writer = RecordingWriter(flush_interval=60)    # the thread waits for stop()
+    t = writer.track(str(tmp_path / 'a.wav'), 16000)
+    t.write(b'\1\0' * 100)
+    t._drain()              # opens the file and writes the first batch
+
+    def disk_full(data):
+        raise OSError(28, 'No space left on device')
+
+    wav = t._wav
+    wav.writeframes = disk_full
+    t.write(b'\2\0' * 50)
+    writer.stop(timeout=2)
+    assert not writer._tracks
+    assert t._wav is None
+    assert wav._file is None    # wave.Wave_write.close() ran
+    with wave.open(str(tmp_path / 'a.wav')) as w:
+        assert w.getnframes() == 100
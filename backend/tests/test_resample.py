@@ -0,0 +1,66 @@
+# test_resample.py
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+from resample import Resampler
+
+RATES = [(48000, 16000), (44100, 16000), (24000, 48000)]
+
+
+def tone(rate, seconds=1.0, freq=440.0, amplitude=8000):
+    t = np.arange(int(rate * seconds)) / rate
+    return (amplitude * np.sin(2 * np.pi * freq * t)).astype('<i2').tobytes()
+
+
+def in_chunks(pcm, sizes):
+    """Split PCM bytes into chunks of the given sample counts, cycling."""
+    out, i, k = [], 0, 0
+    while i < len(pcm):
+        n = sizes[k % len(sizes)] * 2
+        out.append(pcm[i:i + n])
+        i += n
+        k += 1
+    return out
+
+
+@pytest.mark.parametrize('in_rate,out_rate', RATES)
+def test_output_length(in_rate, out_rate):
+    r = Resampler(in_rate, out_rate)
+    out = r.process(tone(in_rate))
+    assert len(out) // 2 == out_rate
+
+
+@pytest.mark.parametrize('in_rate,out_rate', RATES)
+def test_chunk_boundaries_are_seamless(in_rate, out_rate):
+    pcm = tone(in_rate)
+    whole = Resampler(in_rate, out_rate).process(pcm)
+    r = Resampler(in_rate, out_rate)
+    # odd sizes, including chunks too short to produce any output
+    pieces = b''.join(r.process(c) for c in in_chunks(pcm, [2048, 1, 441, 3, 960, 127]))
+    assert pieces == whole
+
+
+@pytest.mark.parametrize('in_rate,out_rate', RATES)
+def test_keeps_level_and_pitch(in_rate, out_rate):
+    y = np.frombuffer(Resampler(in_rate, out_rate).process(tone(in_rate)), dtype='<i2')
+    steady = y[len(y) // 4:].astype(np.float64)      # past the filter's start-up
+    rms = np.sqrt(np.mean(steady ** 2))
+    assert rms == pytest.approx(8000 / np.sqrt(2), rel=0.02)
+    spectrum = np.abs(np.fft.rfft(steady))
+    peak = np.argmax(spectrum) * out_rate / len(steady)
+    assert peak == pytest.approx(440, abs=out_rate / len(steady))
+
+
+def test_reset_starts_a_new_stream():
+    pcm = tone(48000, seconds=0.1)
+    r = Resampler(48000, 16000)
+    first = r.process(pcm)
+    r.process(pcm)
+    r.reset()
+    assert r.process(pcm) == first
+
+
+def test_same_rate_passes_through():
+    pcm = tone(16000, seconds=0.1)
+    assert Resampler(16000, 16000).process(pcm) is pcm
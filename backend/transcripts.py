@@ -0,0 +1,79 @@
+# transcripts.py
+# -*- coding: utf-8 -*-
+"""
+Per-session transcript log, one JSON object per line.
+
+With transcription on, Gemini sends the text of the learner's and the
+tutor's audio in small fragments. Each fragment becomes one line
+
+    {"t": 1760650000.12, "role": "model", "turn": 3, "text": " Good", "final": false}
+
+in `<sid>.transcript.jsonl`. Like the audio tracks (see recorder.py), the
+event loop only appends the encoded line to an in-memory buffer. The
+recorder's writer thread writes the lines in batches: every
+`flush_interval`, as soon as `flush_bytes` are waiting, and at session end.
+"""
+import json
+import threading
+import time
+
+
+class TranscriptLog:
+    """A session's JSONL transcript, fed from the event loop and written by the writer thread."""
+
+    def __init__(self, writer, path):
+        self.writer = writer
+        self.path   = path
+        self.closed = False
+
+        self.lines          = 0
+        self.buffered_bytes = 0
+        self.written_bytes  = 0
+        self.dropped_bytes  = 0
+
+        self._buf  = bytearray()
+        self._lock = threading.Lock()
+        self._file = None   # opened lazily on the writer thread
+
+    def append(self, role, text, turn, final):
+        """Queue one fragment. Called from the event loop; never blocks on I/O."""
+        line = json.dumps({'t': round(time.time(), 3), 'role': role, 'turn': turn,
+                           'text': text, 'final': final}, ensure_ascii=False)
+        data = (line + '\n').encode()
+        with self._lock:
+            if self.closed:
+                return
+            if len(self._buf) + len(data) > self.writer.max_buffer:
+                self.dropped_bytes += len(data)
+                self.writer.dropped_bytes += len(data)
+                return
+            self._buf += data
+            self.lines += 1
+            self.buffered_bytes += len(data)
+            full = len(self._buf) >= self.writer.flush_bytes
+        if full:
+            self.writer.wake()
+
+    def close(self):
+        """Stop accepting fragments; the writer flushes the rest and closes the file."""
+        with self._lock:
+            self.closed = True
+        self.writer.wake()
+
+    # — writer-thread side —
+
+    def _drain(self):
+        with self._lock:
+            if not self._buf:
+                return
+            data, self._buf = self._buf, bytearray()
+        if self._file is None:
+            self._file = open(self.path, 'ab')
+        self._file.write(data)
+        self._file.flush()
+        self.written_bytes += len(data)
+
+    def _finish(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,133 @@
+# vad.py
+# -*- coding: utf-8 -*-
+"""
+Server-side voice activity gating for mic audio headed to Gemini.
+
+Each incoming Int16 chunk is split into short frames and classified in one
+vectorized pass: a frame is speech when its RMS level clears the threshold,
+or when it is only slightly quieter but has the high zero-crossing rate of
+unvoiced consonants ("s", "f", "th"). The threshold follows an adaptive noise
+floor (tracked from the quietest frames) so a noisy room doesn't keep the
+gate open.
+
+While the gate is closed, chunks are held in a short pre-roll buffer instead
+of being sent; on speech onset the pre-roll goes out first so word starts are
+not clipped. After the last speech frame the gate stays open for `hangover_ms`
+so Gemini still hears the trailing silence it uses to detect end of turn.
+"""
+from collections import deque
+
+import numpy as np
+
+
+class VoiceGate:
+    def __init__(self, sample_rate=16000, frame_ms=20, threshold_db=-45.0,
+                 margin_db=10.0, zcr_min=0.25, hangover_ms=600, preroll_ms=300,
+                 mode='suppress', thin_keep=8):
+        self.sample_rate  = sample_rate
+        self.frame_len    = max(1, int(sample_rate * frame_ms / 1000))
+        self.threshold_db = threshold_db
+        self.margin_db    = margin_db
+        self.zcr_min      = zcr_min
+        self.hangover     = int(sample_rate * hangover_ms / 1000)   # samples
+        self.preroll      = int(sample_rate * preroll_ms / 1000)    # samples
+        self.mode         = mode          # 'suppress' or 'thin'
+        self.thin_keep    = thin_keep     # in 'thin' mode, forward 1 of every N silent chunks
+
+        self.noise_db   = threshold_db - margin_db
+        self.open       = False
+        self.last_speech = False      # did the latest chunk contain speech
+        self._since     = 0           # samples since the last speech frame
+        self._pre       = deque()     # held-back chunks (pre-roll)
+        self._pre_len   = 0
+        self._silent_n  = 0
+
+        self.in_bytes         = 0
+        self.forwarded_bytes  = 0
+        self.onsets           = 0
+
+    @property
+    def suppressed_fraction(self):
+        if not self.in_bytes:
+            return 0.0
+        return 1.0 - self.forwarded_bytes / self.in_bytes
+
+    def speech_frames(self, pcm):
+        """Boolean speech mask, one entry per frame of `pcm` (Int16 bytes)."""
+        x = np.frombuffer(pcm, dtype=np.int16)
+        n = len(x) // self.frame_len
+        if n == 0:
+            x = np.pad(x, (0, self.frame_len - len(x)))
+            n = 1
+        frames = x[:n * self.frame_len].reshape(n, self.frame_len).astype(np.float32) / 32768.0
+
+        rms_db = 10.0 * np.log10(np.mean(frames * frames, axis=1) + 1e-10)
+        signs  = np.signbit(frames)
+        zcr    = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (self.frame_len - 1)
+
+        thr = max(self.threshold_db, self.noise_db + self.margin_db)
+        speech = (rms_db >= thr) | ((rms_db >= thr - 6.0) & (zcr >= self.zcr_min))
+
+        # track the noise floor from the quietest frame: fall fast, rise slowly
+        level = float(rms_db.min())
+        self.noise_db += (0.3 if level < self.noise_db else 0.02) * (level - self.noise_db)
+        return speech
+
+    def process(self, pcm):
+        """
+        Feed one mic chunk. Returns `(chunks, closed)`: the chunks to forward
+        now, in order, and whether the gate just closed (end of an utterance).
+        """
+        self.in_bytes += len(pcm)
+        samples = len(pcm) // 2
+        speech  = self.speech_frames(pcm)
+        self.last_speech = bool(speech.any())
+
+        if self.last_speech:
+            # samples after the last speech frame in this chunk
+            tail = samples - (int(np.flatnonzero(speech)[-1]) + 1) * self.frame_len
+            self._since = max(0, tail)
+            if not self.open:
+                self.open = True
+                self.onsets += 1
+                out = list(self._pre) + [pcm]
+                self._pre.clear()
+                self._pre_len = 0
+                return self._forward(out), False
+            return self._forward([pcm]), False
+
+        if self.open:
+            self._since += samples
+            if self._since <= self.hangover:
+                return self._forward([pcm]), False
+            self.open = False
+            self._hold(pcm)
+            return [], True
+
+        if self.mode == 'thin':
+            self._silent_n += 1
+            if self._silent_n % self.thin_keep == 0:
+                # anything held is older than this chunk and must not follow it
+                self._pre.clear()
+                self._pre_len = 0
+                return self._forward([pcm]), False
+        self._hold(pcm)
+        return [], False
+
+    def _hold(self, pcm):
+        self._pre.append(pcm)
+        self._pre_len += len(pcm) // 2
+        while self._pre and self._pre_len - len(self._pre[0]) // 2 >= self.preroll:
+            self._pre_len -= len(self._pre.popleft()) // 2
+
+    def _forward(self, chunks):
+        for c in chunks:
+            self.forwarded_bytes += len(c)
+        return chunks
+
+    def stats(self):
+        return {
+            'vad_in_bytes':        self.in_bytes,
+            'vad_forwarded_bytes': self.forwarded_bytes,
+            'vad_onsets':          self.onsets,
+        }
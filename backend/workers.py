@@ -0,0 +1,182 @@
+# workers.py
+# -*- coding: utf-8 -*-
+"""
+Multi-process worker mode for the websocket server.
+
+The supervisor starts N worker processes. Each one imports app.py afresh
+(spawn start method), so it has its own event loop and genai client, and binds
+the listening port with SO_REUSEPORT so the kernel spreads new connections
+across workers. Crashed workers are restarted with exponential backoff, and
+the stats snapshots workers push over a queue are combined into one report
+(counters summed, maxima maxed).
+
+SIGHUP restarts the workers one at a time, `roll_interval` apart: each gets
+a fresh process before the old one is sent SIGTERM to drain, so the port
+always has listeners and the old processes' clients reconnect in waves
+rather than all at once.
+"""
+import multiprocessing
+import queue
+from collections import deque
+import signal
+import socket
+import time
+
+HAS_REUSEPORT = hasattr(socket, 'SO_REUSEPORT')
+
+
+class Worker:
+    def __init__(self, worker_id):
+        self.worker_id = worker_id
+        self.process   = None
+        self.restarts  = 0
+        self.backoff   = 0.0
+        self.due       = 0.0     # monotonic time of the next (re)start
+        self.started   = 0.0
+        self.stats     = {}
+
+
+class WorkerSupervisor:
+    """
+    Run `target(worker_id, stats_q)` in `workers` processes and keep them alive.
+
+    `target` must be a module-level function. It should push dict snapshots of
+    numeric counters into `stats_q` as `(worker_id, pid, stats)` tuples; the
+    pid tells the current process of a slot from one retired by a SIGHUP roll,
+    whose snapshots are ignored while it drains.
+    """
+
+    def __init__(self, target, workers, stats_interval=10.0,
+                 min_backoff=0.5, max_backoff=30.0, stable_after=60.0,
+                 stop_timeout=10.0, roll_interval=5.0):
+        self.target         = target
+        self.workers        = [Worker(i) for i in range(workers)]
+        self.stats_interval = stats_interval
+        self.min_backoff    = min_backoff
+        self.max_backoff    = max_backoff
+        self.stable_after   = stable_after
+        self.stop_timeout   = stop_timeout     # for a worker to drain after SIGTERM
+        self.roll_interval  = roll_interval
+
+        self._ctx      = multiprocessing.get_context('spawn')
+        self._stats_q  = self._ctx.Queue()
+        self._stopping = False
+        self._rolling  = deque()   # workers still to restart after SIGHUP
+        self._next_roll = 0.0
+        self._retired  = []        # replaced processes, draining
+
+    def run(self):
+        """Supervise until SIGINT/SIGTERM, then terminate the workers."""
+        signal.signal(signal.SIGINT, self._request_stop)
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGHUP, self._request_restart)
+
+        for w in self.workers:
+            self._start(w)
+        next_report = time.monotonic() + self.stats_interval
+        try:
+            while not self._stopping:
+                self._drain_stats(timeout=0.5)
+                self._check_workers()
+                self._roll()
+                if self.stats_interval and time.monotonic() >= next_report:
+                    print(f'[Workers] {self.combined_stats()}')
+                    next_report += self.stats_interval
+        finally:
+            self._shutdown()
+
+    def combined_stats(self):
+        """
+        Combine the latest stats snapshot of every worker: counters are
+        summed, per-worker maxima (keys with `_max`) take the largest.
+        """
+        total = {}
+        for w in self.workers:
+            for key, value in w.stats.items():
+                if not isinstance(value, (int, float)):
+                    continue
+                if '_max' in key:
+                    total[key] = max(total.get(key, value), value)
+                else:
+                    total[key] = total.get(key, 0) + value
+        total['workers_alive'] = sum(1 for w in self.workers if w.process and w.process.is_alive())
+        total['worker_restarts'] = sum(w.restarts for w in self.workers)
+        return total
+
+    def _request_stop(self, signum, frame):
+        self._stopping = True
+
+    def _request_restart(self, signum, frame):
+        self._rolling = deque(self.workers)
+
+    def _roll(self):
+        if not self._rolling or time.monotonic() < self._next_roll:
+            return
+        w = self._rolling.popleft()
+        old = w.process
+        self._start(w)
+        if old and old.is_alive():
+            old.terminate()
+            self._retired.append(old)
+        self._next_roll = time.monotonic() + self.roll_interval
+
+    def _start(self, w):
+        w.process = self._ctx.Process(
+            target=self.target,
+            args=(w.worker_id, self._stats_q),
+            name=f'ws-worker-{w.worker_id}',
+            daemon=True,
+        )
+        w.process.start()
+        w.started = time.monotonic()
+        w.stats   = {}
+        print(f'[Workers] worker {w.worker_id} started (pid {w.process.pid})')
+
+    def _check_workers(self):
+        now = time.monotonic()
+        for p in [p for p in self._retired if not p.is_alive()]:
+            p.join()
+            self._retired.remove(p)
+        for w in self.workers:
+            if w.process is None:
+                if now >= w.due:
+                    w.restarts += 1
+                    self._start(w)
+                continue
+            if w.process.is_alive():
+                continue
+            code = w.process.exitcode
+            w.process.join()
+            w.process = None
+            # reset the backoff if the worker had been up for a while
+            if now - w.started >= self.stable_after:
+                w.backoff = 0.0
+            w.backoff = min(self.max_backoff, max(self.min_backoff, w.backoff * 2))
+            w.due     = now + w.backoff
+            print(f'[Workers] worker {w.worker_id} exited with {code}; restarting in {w.backoff:.1f}s')
+
+    def _drain_stats(self, timeout):
+        try:
+            worker_id, pid, stats = self._stats_q.get(timeout=timeout)
+        except queue.Empty:
+            return
+        while True:
+            w = self.workers[worker_id]
+            if w.process is not None and w.process.pid == pid:
+                w.stats = stats
+            try:
+                worker_id, pid, stats = self._stats_q.get_nowait()
+            except queue.Empty:
+                return
+
+    def _shutdown(self):
+        processes = [w.process for w in self.workers if w.process] + self._retired
+        for p in processes:
+            if p.is_alive():
+                p.terminate()
+        deadline = time.monotonic() + self.stop_timeout
+        for p in processes:
+            p.join(max(0.0, deadline - time.monotonic()))
+            if p.is_alive():
+                p.kill()
+        print(f'[Workers] stopped; final stats {self.combined_stats()}')
@@ -6,8 +6,8 @@ const constraints = {
 };
 
 let socket;
-let recContext;    // capture context @16kHz
-let playContext;   // playback context @24kHz
+let recContext;    // capture context at the device's native rate
+let playContext;   // playback context @24kHz, or native with ?playback=native
 let nextStartTime;
 let mediaStream;   // the getUserMedia stream
 let processor;     // ScriptProcessorNode
@@ -15,6 +15,85 @@ let isStreaming = false;            // CHANGE: gate message handler
 let wsMessageHandler = null;        // CHANGE: named handler for removal  
 let scheduledSources = [];          // CHANGE: track scheduled BufferSources
 
+// Every audio frame from the backend starts with a uint32 (LE) generation;
+// after an interruption, frames from older generations are discarded
+const FRAME_HEADER_BYTES = 4;
+let minGeneration = 0;
+let bargeIn = null;                 // { cutMs, dropped } for the last interruption
+
+// Timestamped frames (backend/framing.py, version 1), asked for after the
+// codec: a 24-byte header with generation, sequence number, sample count and
+// a timestamp on audio frames both ways. Pings measure the clock offset
+// (CLOCK_PINGS at the start, again every CLOCK_RESYNC_MS), and the first
+// frame of every reply is reported back with when it will be heard, so the
+// backend can tell one-way delay and mouth-to-ear latency.
+const FRAME_VERSION = 1;
+const FRAME_V1_HEADER_BYTES = 24;
+const CLOCK_PINGS = 5;
+const CLOCK_RESYNC_MS = 30000;
+let frameVersion = 0;
+let upSeq = 0;
+let heardGeneration = 0;            // newest reply reported as played
+let pendingPlayed = null;           // report for a reply's first frame, sent once scheduled
+let clockTimer = null;
+let pingId = 0;
+let opusCaptureOrigin = null;       // wall time (s) at opusTimestamp 0
+
+// Lesson scenario, e.g. ?lesson=restaurant ; the backend's default otherwise.
+// It has to be the first message: the backend connects to Gemini with it.
+// The backend closes with 1012 when it restarts or shuts down; a replacement
+// is already listening. Reconnect after a random delay up to this long, so
+// every learner doesn't arrive at the same moment.
+const RECONNECT_JITTER_MS = 3000;
+const RESTART_CLOSE_CODE = 1012;
+
+const LESSON = new URLSearchParams(location.search).get('lesson');
+
+// Audio codec for the websocket, negotiated with the backend after connect.
+// Offer compressed codecs with e.g. ?codec=opus,mulaw ; raw PCM is the default.
+const CODEC_OFFER = (new URLSearchParams(location.search).get('codec') || 'pcm')
+  .split(',').concat('pcm');
+let codec = 'pcm';
+let opusEncoder = null;
+let opusDecoder = null;
+let opusTimestamp = 0;              // µs, fed to WebCodecs
+const OPUS_DECODER_CONFIG = { codec: 'opus', sampleRate: 24000, numberOfChannels: 1 };
+const OPUS_ENCODER_CONFIG = { codec: 'opus', numberOfChannels: 1, bitrate: 24000 };
+
+// Audio is captured at the device's native rate and resampled by the backend,
+// which is told the rate with {cmd: 'audio', rate}. Model PCM arrives at 24 kHz
+// unless ?playback=native asks the backend to resample it to the output rate.
+const NATIVE_PLAYBACK = new URLSearchParams(location.search).get('playback') === 'native';
+const SERVER_OUTPUT_RATE = 24000;
+let captureRate = 16000;
+let playbackRate = SERVER_OUTPUT_RATE;
+
+// G.711 µ-law: code word -> Int16
+const MULAW_TABLE = new Int16Array(256).map((_, i) => {
+  const u = ~i & 0xFF;
+  const exp = (u >> 4) & 0x07;
+  const mag = ((((u & 0x0F) << 3) + 0x84) << exp) - 0x84;
+  return (u & 0x80) ? -mag : mag;
+});
+
+// G.711 µ-law: Int16 -> code word (ITU reference, top 14 bits)
+function mulawEncode(sample) {
+  let x = sample >> 2;
+  let mask = 0xFF;
+  if (x < 0) { x = -x; mask = 0x7F; }
+  if (x > 8159) x = 8159;
+  x += 0x21;
+  let seg = 0;
+  for (let v = x >> 6; v; v >>= 1) seg++;
+  if (seg > 7) return 0x7F ^ mask;
+  return ((seg << 4) | ((x >> (seg + 1)) & 0x0F)) ^ mask;
+}
+
+// Wall-clock time in seconds, the unit of frame timestamps
+function nowS() {
+  return (performance.timeOrigin + performance.now()) / 1000;
+}
+
 // Wait until WebSocket is open
 function socketReady(ws) {
   return new Promise(res => {
@@ -23,15 +102,242 @@ function socketReady(ws) {
   });
 }
 
-// Schedule a PCM chunk via Web Audio
-function handlePlaybackChunk(arrayBuffer) {
+function setStatus(text) {
+  const status = document.getElementById('status');
+  if (status) status.textContent = text;
+}
+
+// The backend admits a limited number of sessions at once. Resolve once we
+// have a slot, showing our place while queued; reject if turned away.
+function waitForAdmission(ws) {
+  return new Promise((resolve, reject) => {
+    const done = () => {
+      ws.removeEventListener('message', onMessage);
+      ws.removeEventListener('close', onClose);
+    };
+    const onMessage = ev => {
+      if (typeof ev.data !== 'string') return;
+      let msg;
+      try { msg = JSON.parse(ev.data); } catch { return; }
+      if (msg.queue) {
+        setStatus(`대기 중입니다 (${msg.queue.position}번째)`);
+      } else if (msg.rejected) {
+        done();
+        reject(new Error(msg.rejected));
+      } else if (msg.admitted) {
+        done();
+        resolve();
+      }
+    };
+    const onClose = () => { done(); reject(new Error('closed')); };
+    ws.addEventListener('message', onMessage);
+    ws.addEventListener('close', onClose);
+  });
+}
+
+// Start a new session once the audio already received has played out
+function reconnectLater(status = '서버를 다시 시작합니다. 곧 다시 연결됩니다.') {
+  setStatus(status);
+  const queued = playContext ? Math.max(0, nextStartTime - playContext.currentTime) : 0;
+  setTimeout(() => {
+    if (!isStreaming) return;    // stopped meanwhile
+    stopStreaming();
+    startStreaming();
+  }, queued * 1000 + Math.random() * RECONNECT_JITTER_MS);
+}
+
+// Drop codecs this browser can't handle from the offer
+async function usableCodecs() {
+  const usable = [];
+  for (const name of CODEC_OFFER) {
+    if (usable.includes(name)) continue;
+    if (name === 'opus') {
+      if (!('AudioEncoder' in window && 'AudioDecoder' in window)) continue;
+      try {
+        // the rate configureOpusEncoder will use
+        const enc = await AudioEncoder.isConfigSupported({ ...OPUS_ENCODER_CONFIG, sampleRate: captureRate });
+        const dec = await AudioDecoder.isConfigSupported(OPUS_DECODER_CONFIG);
+        if (!enc.supported || !dec.supported) continue;
+      } catch { continue; }
+    }
+    usable.push(name);
+  }
+  return usable;
+}
+
+// Send a command and wait for the backend's answer under `key`
+// (`fallback` if it doesn't answer)
+function askBackend(ws, command, key, fallback) {
+  return new Promise(resolve => {
+    const done = value => {
+      clearTimeout(timer);
+      ws.removeEventListener('message', onMessage);
+      resolve(value);
+    };
+    const onMessage = ev => {
+      if (typeof ev.data !== 'string') return;
+      let msg;
+      try { msg = JSON.parse(ev.data); } catch { return; }
+      if (key in msg) done(msg[key]);
+    };
+    const timer = setTimeout(() => done(fallback), 2000);
+    ws.addEventListener('message', onMessage);
+    ws.send(JSON.stringify(command));
+  });
+}
+
+// Offer codecs and wait for the backend's choice (raw PCM if it doesn't answer)
+function negotiateCodec(ws, offer) {
+  if (offer.length === 1 && offer[0] === 'pcm') return Promise.resolve('pcm');
+  return askBackend(ws, { cmd: 'codec', offer }, 'codec', 'pcm');
+}
+
+// Ask for timestamped frames; an older backend doesn't answer: bare frames
+async function negotiateFrames(ws) {
+  const version = await askBackend(ws, { cmd: 'frames', version: FRAME_VERSION }, 'frames', 0);
+  return version === FRAME_VERSION ? version : 0;
+}
+
+// A few pings now and one now and then; each pong becomes a clock sample
+function startClockSync() {
+  const ping = () => {
+    if (socket && socket.readyState === WebSocket.OPEN) {
+      socket.send(JSON.stringify({ cmd: 'ping', id: ++pingId, t: nowS() }));
+    }
+  };
+  for (let i = 0; i < CLOCK_PINGS; i++) setTimeout(ping, i * 100);
+  clockTimer = setInterval(ping, CLOCK_RESYNC_MS);
+}
+
+// Send one audio frame, with a header if the backend asked for timestamps.
+// `capturedAt` is the wall time (s) of its first sample.
+function sendFrame(payload, samples, capturedAt) {
+  if (!socket || socket.readyState !== WebSocket.OPEN) return;
+  if (frameVersion) {
+    const frame = new Uint8Array(FRAME_V1_HEADER_BYTES + payload.byteLength);
+    const view = new DataView(frame.buffer);
+    view.setUint8(0, FRAME_VERSION);
+    view.setUint32(8, upSeq++, true);
+    view.setUint32(12, samples, true);
+    view.setFloat64(16, capturedAt, true);
+    frame.set(new Uint8Array(payload), FRAME_V1_HEADER_BYTES);
+    payload = frame.buffer;
+  }
+  socket.send(payload);
+}
+
+function setupOpus() {
+  opusTimestamp = 0;
+  opusDecoder = new AudioDecoder({
+    output: data => {
+      const float32 = new Float32Array(data.numberOfFrames);
+      data.copyTo(float32, { planeIndex: 0, format: 'f32-planar' });
+      schedulePlayback(float32, data.sampleRate);
+      data.close();
+    },
+    error: e => console.error('Opus decoder', e),
+  });
+  opusDecoder.configure(OPUS_DECODER_CONFIG);
+
+  opusEncoder = new AudioEncoder({
+    output: chunk => {
+      const buf = new ArrayBuffer(chunk.byteLength);
+      chunk.copyTo(buf);
+      sendFrame(buf, Math.round(chunk.duration * captureRate / 1e6),
+                opusCaptureOrigin + chunk.timestamp / 1e6);
+    },
+    error: e => console.error('Opus encoder', e),
+  });
+}
+
+// Called once the capture rate is known
+function configureOpusEncoder() {
+  opusEncoder.configure({ ...OPUS_ENCODER_CONFIG, sampleRate: captureRate });
+}
+
+function closeOpus() {
+  for (const c of [opusEncoder, opusDecoder]) {
+    if (c && c.state !== 'closed') c.close();
+  }
+  opusEncoder = null;
+  opusDecoder = null;
+  opusCaptureOrigin = null;
+}
+
+// Encode one captured buffer in the negotiated codec and send it
+function sendCaptured(float32, capturedAt) {
+  if (codec === 'opus') {
+    if (opusCaptureOrigin === null) opusCaptureOrigin = capturedAt - opusTimestamp / 1e6;
+    const frame = new AudioData({
+      format: 'f32-planar', sampleRate: captureRate, numberOfChannels: 1,
+      numberOfFrames: float32.length, timestamp: opusTimestamp, data: float32,
+    });
+    opusTimestamp += float32.length * 1e6 / captureRate;
+    opusEncoder.encode(frame);   // sent from the encoder's output callback
+    frame.close();
+    return;
+  }
+  const int16 = new Int16Array(float32.length);
+  for (let i = 0; i < float32.length; i++) {
+    int16[i] = Math.max(-1, Math.min(1, float32[i])) * 0x7FFF;
+  }
+  let payload = int16.buffer;
+  if (codec === 'mulaw') {
+    const u8 = new Uint8Array(int16.length);
+    for (let i = 0; i < int16.length; i++) u8[i] = mulawEncode(int16[i]);
+    payload = u8.buffer;
+  }
+  sendFrame(payload, int16.length, capturedAt);
+}
+
+// Decode one frame from the backend and schedule it
+function handlePlaybackChunk(frame) {
   if (!isStreaming) return;          // CHANGE: ignore chunks once stopped
-  const pcm16 = new Int16Array(arrayBuffer);
-  const float32 = new Float32Array(pcm16.length);
-  for (let i = 0; i < pcm16.length; i++) {
-    float32[i] = pcm16[i] / 0x7FFF;
+  const view = new DataView(frame);
+  const headerBytes = frameVersion ? FRAME_V1_HEADER_BYTES : FRAME_HEADER_BYTES;
+  const generation = view.getUint32(frameVersion ? 4 : 0, true);
+  if (generation < minGeneration) {
+    // still in flight from an interrupted turn
+    if (bargeIn) bargeIn.dropped++;
+    return;
   }
-  const buffer = playContext.createBuffer(1, float32.length, 24000);
+  if (bargeIn) {
+    console.debug(`Barge-in: cut ${bargeIn.cutMs} ms of queued audio, `
+      + `dropped ${bargeIn.dropped} stale frames`);
+    bargeIn = null;
+  }
+  if (frameVersion && generation > heardGeneration) {
+    // first frame of a reply; reported once we know when it plays
+    heardGeneration = generation;
+    pendingPlayed = { cmd: 'played', generation, sent: view.getFloat64(16, true), received: nowS() };
+  }
+  const arrayBuffer = frame.slice(headerBytes);
+  if (codec === 'opus') {
+    // one Opus packet per frame; output is scheduled from the decoder callback
+    opusDecoder.decode(new EncodedAudioChunk({ type: 'key', timestamp: 0, data: arrayBuffer }));
+    return;
+  }
+  let float32;
+  if (codec === 'mulaw') {
+    const u8 = new Uint8Array(arrayBuffer);
+    float32 = new Float32Array(u8.length);
+    for (let i = 0; i < u8.length; i++) {
+      float32[i] = MULAW_TABLE[u8[i]] / 0x7FFF;
+    }
+  } else {
+    const pcm16 = new Int16Array(arrayBuffer);
+    float32 = new Float32Array(pcm16.length);
+    for (let i = 0; i < pcm16.length; i++) {
+      float32[i] = pcm16[i] / 0x7FFF;
+    }
+  }
+  schedulePlayback(float32, playbackRate);
+}
+
+// Schedule a PCM chunk via Web Audio
+function schedulePlayback(float32, sampleRate) {
+  if (!isStreaming) return;
+  const buffer = playContext.createBuffer(1, float32.length, sampleRate);
   buffer.copyToChannel(float32, 0);
 
   const src = playContext.createBufferSource();
@@ -46,6 +352,13 @@ function handlePlaybackChunk(arrayBuffer) {
   if (nextStartTime < minStart) nextStartTime = minStart;
 
   src.start(nextStartTime);
+  if (pendingPlayed) {
+    const wait = nextStartTime - now + (playContext.outputLatency || 0);
+    if (socket && socket.readyState === WebSocket.OPEN) {
+      socket.send(JSON.stringify({ ...pendingPlayed, played: nowS() + wait }));
+    }
+    pendingPlayed = null;
+  }
   nextStartTime += buffer.duration;
 }
 
@@ -56,28 +369,80 @@ function flushPlaybackBuffers() {
     try { src.stop(); } catch (e) { /* already stopped */ }
   });
   scheduledSources = [];
+  if (opusDecoder && opusDecoder.state === 'configured') {
+    // drop packets still being decoded
+    opusDecoder.reset();
+    opusDecoder.configure(OPUS_DECODER_CONFIG);
+  }
   if (playContext) {
     nextStartTime = playContext.currentTime + 0.1;  // reset playhead
   }
 }
 
+// Append a transcript fragment to the line of its speaker and turn
+// (the backend only sends these when TRANSCRIBE is on)
+function showTranscript({ role, text, turn }) {
+  const box = document.getElementById('transcript');
+  if (!box) return;
+  const id = `transcript-${role}-${turn}`;
+  let line = document.getElementById(id);
+  if (!line) {
+    line = document.createElement('p');
+    line.id = id;
+    line.className = role;
+    box.appendChild(line);
+  }
+  line.textContent += text;
+}
+
 // Start streaming
 async function startStreaming() {
   isStreaming = true;            // ← turn playback on
+  const transcript = document.getElementById('transcript');
+  if (transcript) transcript.textContent = '';   // turn numbers restart per session
+  // Capture context at the native rate: no resampling on the audio thread.
+  // Made first so the codec offer can check Opus at this rate
+  recContext = new AudioContext();
+  captureRate = recContext.sampleRate;
   // 1) Open WS
   socket = new WebSocket(WS_URL);
   socket.binaryType = 'arraybuffer';
   await socketReady(socket);
-  
-  // —— NEW: send initial text turn to wake Gemini —— 
-  const startupMsg = JSON.stringify({ cmd: 'text', text: "Let's begin!" });
-  socket.send(startupMsg);
-  // ———————————————————————————————————————————————
+  try {
+    await waitForAdmission(socket);
+  } catch (e) {
+    console.warn('Not admitted:', e.message);
+    if (e.message === 'server restarting') {
+      reconnectLater();
+      return;
+    }
+    stopStreaming();
+    setStatus('사용자가 많습니다. 잠시 후 다시 시도해 주세요.');
+    return;
+  }
+  setStatus('');
+  const ws = socket;
+  ws.addEventListener('close', ev => {
+    if (ev.code === RESTART_CLOSE_CODE && socket === ws) reconnectLater();
+  });
+  if (LESSON) socket.send(JSON.stringify({ cmd: 'lesson', name: LESSON }));
+
+  // Agree on the audio codec before any audio flows
+  codec = await negotiateCodec(socket, await usableCodecs());
+  if (codec === 'opus') setupOpus();
+  frameVersion = await negotiateFrames(socket);
 
   // 2) Playback context
-  playContext = new AudioContext({ sampleRate: 24000 });
+  playContext = NATIVE_PLAYBACK
+    ? new AudioContext()
+    : new AudioContext({ sampleRate: SERVER_OUTPUT_RATE });
   if (playContext.state === 'suspended') await playContext.resume();
   nextStartTime = playContext.currentTime + 0.1;
+  if (NATIVE_PLAYBACK && codec !== 'opus') {
+    // the backend resamples model audio to our output rate
+    playbackRate = playContext.sampleRate;
+    socket.send(JSON.stringify({ cmd: 'audio', output_rate: playbackRate }));
+  }
   // CHANGE: store named handler so we can remove it later
   wsMessageHandler = ev => {
     // 1) If it's text, parse JSON for an interrupt signal:
@@ -85,35 +450,51 @@ async function startStreaming() {
       let msg;
       try { msg = JSON.parse(ev.data); } catch { return; }
       if (msg.interrupted) {
+        minGeneration = Math.max(minGeneration, msg.generation || 0);
+        const queued = playContext ? nextStartTime - playContext.currentTime : 0;
+        bargeIn = { cutMs: Math.max(0, Math.round(queued * 1000)), dropped: 0 };
         flushPlaybackBuffers();      // flush on VAD interrupt
       }
+      if (msg.pong && frameVersion) {
+        socket.send(JSON.stringify({
+          cmd: 'clock', t0: msg.pong.t, server_t: msg.pong.server_t, t1: nowS(),
+        }));
+      }
+      if (msg.transcript) showTranscript(msg.transcript);
+      if (msg.draining) setStatus('서버를 다시 시작합니다. 지금 답변이 끝나면 다시 연결됩니다.');
+      // the backend's Gemini session dropped; it resumes it, or gives up
+      if (msg.reconnecting) setStatus('연결이 끊겼습니다. 다시 연결하는 중입니다.');
+      if (msg.reconnected) setStatus('');
+      if (msg.reconnect_failed) reconnectLater('연결이 끊겼습니다. 새 세션을 시작합니다.');
       return;
     }
 
-    // 2) Else it's an ArrayBuffer of Int16 PCM → schedule it
+    // 2) Else it's a generation-tagged audio frame → schedule it
     handlePlaybackChunk(ev.data);
   };
   socket.addEventListener('message', wsMessageHandler);  // attach named listener
+  if (frameVersion) startClockSync();
 
-  // 3) Capture context
+  // —— NEW: send initial text turn to wake Gemini —— 
+  const startupMsg = JSON.stringify({ cmd: 'text', text: "Let's begin!" });
+  socket.send(startupMsg);
+  // ———————————————————————————————————————————————
+
+  // 3) Mic into the capture context
   mediaStream = await navigator.mediaDevices.getUserMedia(constraints);
-  recContext = new AudioContext({ sampleRate: 16000 });
+  socket.send(JSON.stringify({ cmd: 'audio', rate: captureRate }));
+  if (codec === 'opus') configureOpusEncoder();
   const source = recContext.createMediaStreamSource(mediaStream);
 
-  // 4) Processor node (ScriptProcessor)
-  processor = recContext.createScriptProcessor(4096, 1, 1);
+  // 4) Processor node (ScriptProcessor); ~43 ms per buffer at 48 kHz
+  processor = recContext.createScriptProcessor(2048, 1, 1);
   source.connect(processor);
   processor.connect(recContext.destination); // needed to fire onaudioprocess
 
   processor.onaudioprocess = e => {
     const float32 = e.inputBuffer.getChannelData(0);
-    const int16 = new Int16Array(float32.length);
-    for (let i = 0; i < float32.length; i++) {
-      int16[i] = Math.max(-1, Math.min(1, float32[i])) * 0x7FFF;
-    }
-    if (socket.readyState === WebSocket.OPEN) {
-      socket.send(int16.buffer);
-    }
+    // the buffer's last sample was captured just now
+    sendCaptured(float32, nowS() - float32.length / captureRate);
   };
 
   // Enable/disable buttons
@@ -150,6 +531,18 @@ function stopStreaming() {
   }
   // 5) Immediately halt any queued or playing audio
   flushPlaybackBuffers();
+  closeOpus();
+  codec = 'pcm';
+  captureRate = 16000;
+  playbackRate = SERVER_OUTPUT_RATE;
+  minGeneration = 0;
+  bargeIn = null;
+  clearInterval(clockTimer);
+  clockTimer = null;
+  frameVersion = 0;
+  upSeq = 0;
+  heardGeneration = 0;
+  pendingPlayed = null;
 
   // 6) Tear down the playback context itself
   if (playContext) {